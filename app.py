@@ -1,20 +1,37 @@
 import os
 import time
+import sqlite3
+import uuid
 import threading
-import telebot 
-import pyotp
-import qrcode
 from io import BytesIO
 import base64
-from telebot import types
-from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_from_directory, flash, redirect, url_for, send_file
+from datetime import datetime, date, timedelta
+import calendar
+import json
+import re
+import tempfile
+import hashlib
+import hmac
+import click
+from functools import wraps, lru_cache, partial
+from collections import OrderedDict
+import contextvars
+from contextlib import contextmanager
+from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, send_file, Response, stream_with_context, g
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.utils import secure_filename
-from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import func
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from sqlalchemy import func, tuple_, text, inspect, MetaData, or_, event, case, table, column, literal_column
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, declared_attr, with_loader_criteria
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from dotenv import load_dotenv
+from comprovantes import ArmazemComprovantes
+from servidor import threads_web, feeds_por_processo, FOLGA_CONEXOES
+from metricas import Registro, Medicao, registrar_consulta, LIMITES_CONSULTAS, PERFIS
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+# importacao, exportacao, backup, recorrencia (NumPy), pyotp e qrcode (Pillow) são importados
+# nas funções que os usam: a partida do processo não paga por eles (ver scripts/bench_partida.py)
 
 load_dotenv()
 
@@ -25,16 +42,25 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 db_path = os.path.join(basedir, 'dados', 'financeiro.db') 
 
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev_key') 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///' + db_path)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Um pool por processo: uma conexão por thread do worker e uma folga (ver servidor.py)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': threads_web(),
+    'max_overflow': FOLGA_CONEXOES,
+    'pool_timeout': 30,
+    'connect_args': {'timeout': 15, 'check_same_thread': False},
+}
 app.config['UPLOAD_FOLDER'] = os.path.join(basedir, 'uploads')
 
-if not os.path.exists(app.config['UPLOAD_FOLDER']):
-    os.makedirs(app.config['UPLOAD_FOLDER'])
+# Comprovantes endereçados por sha256; miniaturas geradas por um pool de threads
+armazem = ArmazemComprovantes(app.config['UPLOAD_FOLDER'], int(os.getenv('MINIATURAS_THREADS', 2)))
 
 dados_dir = os.path.join(basedir, 'dados')
-if not os.path.exists(dados_dir):
-    os.makedirs(dados_dir)
+
+# Snapshots automáticos (worker.py) e arquivos temporários de backup/restore
+app.config['BACKUP_FOLDER'] = os.getenv('BACKUP_DIR', os.path.join(dados_dir, 'backups'))
+app.config['BACKUP_MANTER'] = int(os.getenv('BACKUP_MANTER', 7))
 
 # --- LOGIN ---
 login_manager = LoginManager()
@@ -42,19 +68,71 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = "Por favor, faça login para acessar."
 
-TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
-bot = telebot.TeleBot(TELEGRAM_TOKEN) if TELEGRAM_TOKEN else None
 
 db = SQLAlchemy(app)
 
+# --- SQLITE: PRAGMAS POR CONEXÃO ---
+# WAL deixa leitores e o escritor trabalharem em paralelo; busy_timeout faz a conexão
+# esperar o lock em vez de falhar com "database is locked".
+@event.listens_for(Engine, "connect")
+def configurar_sqlite(conexao, _):
+    if not isinstance(conexao, sqlite3.Connection): return
+    cur = conexao.cursor()
+    cur.execute('PRAGMA journal_mode=WAL')
+    cur.execute('PRAGMA synchronous=NORMAL')
+    cur.execute('PRAGMA busy_timeout=15000')
+    cur.execute('PRAGMA mmap_size=268435456')  # 256 MB
+    cur.execute('PRAGMA cache_size=-32000')    # ~32 MB
+    cur.execute('PRAGMA temp_store=MEMORY')
+    cur.close()
+
+# --- MÉTRICAS DE DESEMPENHO (ver metricas.py) ---
+# Cada processo grava as suas em METRICAS_DIR; /metrics soma as de todos (web e bot)
+registro = Registro('web', os.getenv('METRICAS_DIR', os.path.join(dados_dir, 'metricas')), int(os.getenv('METRICAS_INTERVALO', 10)))
+registro.histograma('financeiro_requisicao_segundos', 'Latência das requisições por rota', ('rota', 'metodo'))
+registro.contador('financeiro_requisicoes_total', 'Requisições por rota e status', ('rota', 'metodo', 'status'))
+registro.histograma('financeiro_requisicao_consultas_sql', 'Comandos SQL por requisição', ('rota',), LIMITES_CONSULTAS)
+registro.histograma('financeiro_requisicao_sql_segundos', 'Tempo em comandos SQL por requisição', ('rota',))
+registro.contador('financeiro_requisicoes_acima_orcamento_total', 'Requisições com mais comandos SQL que METRICAS_ORCAMENTO_SQL', ('rota',))
+registro.histograma('financeiro_sql_segundos', 'Duração de cada comando SQL, inclusive a espera por lock do SQLite', ('processo',))
+registro.histograma('financeiro_bot_segundos', 'Latência dos handlers e tarefas agendadas do bot', ('handler',))
+registro.histograma('financeiro_bot_consultas_sql', 'Comandos SQL por handler ou tarefa do bot', ('handler',), LIMITES_CONSULTAS)
+
+# Acima disso a requisição é registrada no log (sinal de N+1)
+ORCAMENTO_SQL = int(os.getenv('METRICAS_ORCAMENTO_SQL', 25))
+# Perfil de uma requisição (?_perfil=cprofile ou ?_perfil=pilhas, só administradores)
+PERFIL_HABILITADO = os.getenv('PERFIL_REQUISICOES', '').lower() in ('1', 'true', 'sim')
+app.config['PERFIL_FOLDER'] = os.path.join(dados_dir, 'perfis')
+# O SSE fica aberto por minutos: distorceria os histogramas de latência
+ROTAS_SEM_METRICA = {'stream_eventos'}
+
+# O tempo vai do execute até o SQLite entregar a primeira linha (o fetch das demais fica de fora)
+@event.listens_for(Engine, "before_cursor_execute")
+def iniciar_comando(conn, cursor, statement, parameters, context, executemany):
+    conn.info['inicio_comando'] = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def medir_comando(conn, cursor, statement, parameters, context, executemany):
+    segundos = time.perf_counter() - conn.info.pop('inicio_comando', time.perf_counter())
+    registrar_consulta(segundos); registro.observar('financeiro_sql_segundos', segundos, processo=registro.papel)
+
 # --- MODELOS ---
 class User(UserMixin, db.Model):
+    __table_args__ = (db.Index('ux_user_telegram', 'telegram_chat_id', unique=True),)
+
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(100), unique=True, nullable=False)
     password_hash = db.Column(db.String(200), nullable=False)
     email = db.Column(db.String(100), nullable=True) 
     is_admin = db.Column(db.Boolean, default=False)
     totp_secret = db.Column(db.String(32), nullable=True)
+    # Família: quem tem titular vê e grava os dados do titular
+    titular_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    # Chat do Telegram que recebe os alertas e pode consultar o bot
+    telegram_chat_id = db.Column(db.String(50), nullable=True)
+
+    @property
+    def dono_id(self): return self.titular_id or self.id
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -63,32 +141,150 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
     def get_totp_uri(self):
+        import pyotp
         return pyotp.totp.TOTP(self.totp_secret).provisioning_uri(
             name=self.username, 
             issuer_name='Financas do Cris'
         )
 
     def verify_totp(self, token):
+        import pyotp
         return pyotp.totp.TOTP(self.totp_secret).verify(token)
 
 @login_manager.user_loader
 def load_user(user_id):
     return db.session.get(User, int(user_id))
 
+# --- DONO DOS DADOS (MULTIUSUÁRIO) ---
+# As tabelas de dados têm usuario_id (o dono: o próprio usuário ou o titular da família).
+# Toda consulta ORM feita pela sessão recebe o filtro do dono corrente (escopo_usuario) e
+# todo objeto novo recebe o dono no flush (definir_dono). Nas requisições o dono vem do
+# login; no CLI e no worker, de como_usuario(). Sem dono definido nada é filtrado (tarefas
+# de manutenção sobre todos os usuários). Inserts em lote e SQL textual informam o dono.
+usuario_contexto = contextvars.ContextVar('usuario_contexto', default=None)
+
+def usuario_atual(): return usuario_contexto.get()
+
+@contextmanager
+def como_usuario(usuario_id):
+    token = usuario_contexto.set(usuario_id)
+    try: yield
+    finally: usuario_contexto.reset(token)
+
+class DoUsuario:
+    @declared_attr
+    def usuario_id(cls): return db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+
+@lru_cache(maxsize=1024)
+def criterio_dono(uid):
+    # Um objeto por dono: o SQLAlchemy reaproveita a análise do lambda a cada consulta
+    return with_loader_criteria(DoUsuario, lambda cls: cls.usuario_id == uid, include_aliases=True)
+
+@event.listens_for(Session, 'do_orm_execute')
+def escopo_usuario(estado):
+    uid = usuario_contexto.get()
+    if uid is None or estado.is_column_load or estado.is_relationship_load or estado.execution_options.get('sem_escopo'): return
+    if estado.is_select or estado.is_update or estado.is_delete:
+        estado.statement = estado.statement.options(criterio_dono(uid))
+
+@event.listens_for(Session, 'before_flush')
+def definir_dono(sessao, contexto, instancias):
+    uid = usuario_contexto.get()
+    if uid is None: return
+    for obj in sessao.new:
+        if isinstance(obj, DoUsuario) and obj.usuario_id is None: obj.usuario_id = uid
+
+# O banco não é preparado no import: a primeira requisição do processo confere o schema
+@app.before_request
+def preparar_banco(): garantir_banco()
+
+@app.before_request
+def abrir_escopo():
+    if current_user.is_authenticated: g.escopo = usuario_contexto.set(current_user.dono_id)
+
+@app.teardown_request
+def fechar_escopo(_):
+    # As threads do gunicorn atendem várias requisições: o dono não pode passar para a próxima
+    if 'escopo' in g: usuario_contexto.reset(g.pop('escopo'))
+
+@app.before_request
+def iniciar_medicao():
+    if request.endpoint in ROTAS_SEM_METRICA: return
+    g.medicao = Medicao()
+    modo = request.args.get('_perfil')
+    if PERFIL_HABILITADO and modo in PERFIS and current_user.is_authenticated and current_user.is_admin:
+        g.perfil = PERFIS[modo]()
+        g.perfil_destino = os.path.join(app.config['PERFIL_FOLDER'], f"{datetime.now():%Y%m%d-%H%M%S}_{request.endpoint}")
+
+@app.after_request
+def anotar_medicao(resp):
+    g.status = resp.status_code
+    if 'perfil' in g: resp.headers['X-Perfil'] = os.path.basename(g.perfil_destino)
+    if 'medicao' in g and resp.is_streamed and not resp.direct_passthrough:
+        # O gerador de stream_with_context só roda depois do teardown: a medição acompanha o
+        # corpo (envolver) e é registrada quando o servidor fecha a resposta, com o SQL do gerador
+        medicao = g.pop('medicao'); medicao.sair()
+        resp.response = medicao.envolver(resp.response)
+        resp.call_on_close(partial(registrar_medicao, medicao, *dados_requisicao(), g.pop('perfil', None), g.get('perfil_destino')))
+    return resp
+
+@app.teardown_request
+def encerrar_medicao(_):
+    medicao = g.pop('medicao', None)
+    if medicao is None: return
+    registrar_medicao(medicao, *dados_requisicao(), g.pop('perfil', None), g.get('perfil_destino'))
+
+def dados_requisicao():
+    """(rota, método, status, caminho) da requisição atual, para registrar_medicao."""
+    rota = request.url_rule.rule if request.url_rule else 'desconhecida'
+    return rota, request.method, g.get('status', 500), request.full_path.rstrip('?')
+
+def registrar_medicao(medicao, rota, metodo, status, caminho, perfil=None, destino=None):
+    segundos = medicao.encerrar()
+    registro.observar('financeiro_requisicao_segundos', segundos, rota=rota, metodo=metodo)
+    registro.incrementar('financeiro_requisicoes_total', rota=rota, metodo=metodo, status=status)
+    registro.observar('financeiro_requisicao_consultas_sql', medicao.consultas, rota=rota)
+    registro.observar('financeiro_requisicao_sql_segundos', medicao.sql, rota=rota)
+    if medicao.consultas > ORCAMENTO_SQL:
+        registro.incrementar('financeiro_requisicoes_acima_orcamento_total', rota=rota)
+        app.logger.warning("%s %s: %d comandos SQL (orçamento %d), %.1f ms em SQL de %.1f ms",
+                           metodo, caminho, medicao.consultas, ORCAMENTO_SQL, medicao.sql * 1000, segundos * 1000)
+    if perfil is not None:
+        os.makedirs(app.config['PERFIL_FOLDER'], exist_ok=True)
+        app.logger.warning("Perfil de %s gravado em %s", caminho, perfil.encerrar(destino))
+
+# --- VALORES MONETÁRIOS ---
+# Dinheiro é gravado em centavos inteiros; a API continua recebendo/enviando reais.
+def centavos(valor):
+    try:
+        d = Decimal(str(valor))
+        if not d.is_finite(): raise InvalidOperation
+        return int((d * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    # Mesma mensagem do float() que as rotas usavam antes dos centavos ("10,5", "abc", "nan")
+    except InvalidOperation: raise ValueError(f"could not convert string to float: {str(valor)!r}") from None
+
+def reais(valor_centavos):
+    return (valor_centavos or 0) / 100
+
 # --- NOVO MODELO: CONTA ---
-class Conta(db.Model):
+class Conta(DoUsuario, db.Model):
+    __table_args__ = (db.Index('ix_conta_usuario', 'usuario_id'),)
+
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(50), nullable=False)
     # Tipo: 'banco', 'carteira', 'cartao_credito', 'investimento', 'vale'
     tipo = db.Column(db.String(20), default='banco') 
-    saldo_inicial = db.Column(db.Float, default=0.0)
+    saldo_inicial_centavos = db.Column(db.Integer, default=0)
+    # Cartão de crédito: dia em que a fatura fecha (vazio = último dia do mês)
+    dia_fechamento = db.Column(db.Integer, nullable=True)
 
     def to_dict(self):
         return {
             "id": self.id, 
             "nome": self.nome, 
             "tipo": self.tipo,
-            "saldo_inicial": self.saldo_inicial
+            "saldo_inicial": reais(self.saldo_inicial_centavos),
+            "dia_fechamento": self.dia_fechamento
         }
 
 class Tipo(db.Model):
@@ -96,21 +292,38 @@ class Tipo(db.Model):
     nome = db.Column(db.String(50), nullable=False)
     def to_dict(self): return {"id": self.id, "nome": self.nome}
 
-class Subtipo(db.Model):
+class Subtipo(DoUsuario, db.Model):
+    __table_args__ = (db.Index('ix_subtipo_usuario', 'usuario_id', 'tipo_id'),)
+
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(50), nullable=False)
     tipo_id = db.Column(db.Integer, db.ForeignKey('tipo.id'), nullable=False)
     def to_dict(self): return {"id": self.id, "nome": self.nome, "tipo_id": self.tipo_id}
 
-class Categoria(db.Model):
+class Categoria(DoUsuario, db.Model):
+    __table_args__ = (db.Index('ix_categoria_usuario', 'usuario_id', 'subtipo_id'),)
+
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(50), nullable=False)
     subtipo_id = db.Column(db.Integer, db.ForeignKey('subtipo.id'), nullable=False)
     def to_dict(self): return {"id": self.id, "nome": self.nome, "subtipo_id": self.subtipo_id}
 
-class Lancamento(db.Model):
+class Lancamento(DoUsuario, db.Model):
+    # Índices compostos para as consultas paginadas por período/conta (ver filtrar_lancamentos).
+    # Os por período começam pelo dono: cada usuário lê só a sua faixa do índice, por
+    # maior que seja o banco (as contas já são de um dono só)
+    __table_args__ = (
+        db.Index('ix_lancamento_usuario_data', 'usuario_id', 'data'),
+        db.Index('ix_lancamento_conta_data', 'conta_id', 'data'),
+        db.Index('ux_lancamento_usuario_hash', 'usuario_id', 'hash_importacao', unique=True),
+        # Contagem de referências dos comprovantes (um arquivo pode servir a vários lançamentos)
+        db.Index('ix_lancamento_comprovante', 'comprovante'),
+        # Um lançamento por vencimento e mês: a geração das recorrências pode rodar de novo sem duplicar
+        db.Index('ux_lancamento_recorrencia', 'vencimento_id', 'competencia', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    data = db.Column(db.String(10), nullable=False)
+    data = db.Column(db.Date, nullable=False)
     descricao = db.Column(db.String(100), nullable=False)
     tipo_id = db.Column(db.Integer, db.ForeignKey('tipo.id'), nullable=False)
     subtipo_id = db.Column(db.Integer, db.ForeignKey('subtipo.id'), nullable=False)
@@ -119,78 +332,509 @@ class Lancamento(db.Model):
     # --- CAMPO NOVO: Vínculo com a Conta ---
     conta_id = db.Column(db.Integer, db.ForeignKey('conta.id'), nullable=True)
 
-    valor = db.Column(db.Float, nullable=False)
+    valor_centavos = db.Column(db.Integer, nullable=False)
     efetivado = db.Column(db.Boolean, default=False)
     comprovante = db.Column(db.String(200), nullable=True)
+    # Impressão digital das linhas importadas de extratos (evita importar a mesma linha duas vezes)
+    hash_importacao = db.Column(db.String(40), nullable=True)
+    # Lançamentos gerados por um vencimento recorrente: qual vencimento e de que mês (dia 1)
+    vencimento_id = db.Column(db.Integer, db.ForeignKey('vencimento.id'), nullable=True)
+    competencia = db.Column(db.Date, nullable=True)
+
+    @property
+    def valor(self): return reais(self.valor_centavos)
+
+    @valor.setter
+    def valor(self, v): self.valor_centavos = centavos(v)
 
     def to_dict(self):
-        t = db.session.get(Tipo, self.tipo_id)
-        s = db.session.get(Subtipo, self.subtipo_id)
-        c = db.session.get(Categoria, self.categoria_id)
-        conta = db.session.get(Conta, self.conta_id) # Busca a conta
-        
-        return {
-            "id": self.id, "data": self.data, "descricao": self.descricao,
-            "tipo": t.nome if t else "N/A", "subtipo": s.nome if s else "N/A",
-            "categoria": c.nome if c else "-", 
-            "conta": conta.nome if conta else "Padrão", # Retorna o nome da conta
-            "conta_id": self.conta_id,
-            "valor": self.valor,
-            "efetivado": self.efetivado, "comprovante": self.comprovante
-        }
+        return serializar_linha((self.id, self.data, self.descricao, self.tipo_id, self.subtipo_id, self.categoria_id,
+                                 self.conta_id, self.valor_centavos, self.efetivado, self.comprovante))
+
+# --- CACHE DE DIMENSÕES ---
+# Tipo/Subtipo/Categoria/Conta quase nunca mudam: ficam em memória no processo.
+# A versão fica gravada no banco (Metadado), então uma escrita feita por outro
+# processo (outro worker, o bot) também invalida o cache deste. As versões de
+# dimensões e saldos são por dono ('dimensoes:<id>'): a escrita de um usuário não
+# invalida o cache dos outros.
+class Metadado(db.Model):
+    chave = db.Column(db.String(50), primary_key=True)
+    valor = db.Column(db.String(32), nullable=False)
+
+def trocar_versao(chave):
+    """Gera uma nova versão para `chave`. Deve ser chamada antes do commit da escrita."""
+    m = db.session.get(Metadado, chave)
+    if not m: m = Metadado(chave=chave); db.session.add(m)
+    m.valor = uuid.uuid4().hex
+
+def ler_versao(chave):
+    return db.session.query(Metadado.valor).filter_by(chave=chave).scalar()
+
+def chave_usuario(chave, usuario_id=None):
+    if usuario_id is None: usuario_id = usuario_atual()
+    return f"{chave}:{usuario_id}" if usuario_id is not None else chave
+
+def invalidar_dimensoes(): trocar_versao(chave_usuario('dimensoes'))
+
+# Lida pelo índice de vencimentos do worker do bot (worker.py)
+def invalidar_vencimentos(): trocar_versao('vencimentos')
+
+class CacheDimensoes:
+    """Dimensões por dono; guarda os `maximo` donos usados mais recentemente (LRU)."""
+
+    def __init__(self, maximo=256):
+        self._lock = threading.Lock()
+        self.maximo = maximo
+        self.donos = OrderedDict()  # usuario_id -> dados
+
+    def obter(self):
+        # Uma leitura por chave primária por requisição no lugar de quatro SELECTs completos
+        uid = usuario_atual(); chave_g = f'dimensoes_{uid}'
+        if chave_g in g: return g.get(chave_g)
+        versao = ler_versao(chave_usuario('dimensoes', uid))
+        with self._lock:
+            dados = self.donos.get(uid)
+            if dados is None or versao != dados["versao"]:
+                # As consultas já saem filtradas pelo dono (escopo_usuario); Tipo é comum a todos
+                dados = {
+                    "versao": versao,
+                    "tipos": {t.id: t.to_dict() for t in Tipo.query.all()},
+                    "subtipos": {s.id: s.to_dict() for s in Subtipo.query.all()},
+                    "categorias": {c.id: c.to_dict() for c in Categoria.query.all()},
+                    "contas": {c.id: c.to_dict() for c in Conta.query.all()},
+                }
+            self.donos[uid] = dados; self.donos.move_to_end(uid)
+            while len(self.donos) > self.maximo: self.donos.popitem(last=False)
+        setattr(g, chave_g, dados)
+        return dados
+
+cache_dimensoes = CacheDimensoes(int(os.getenv('CACHE_DIMENSOES_DONOS', 256)))
+
+def pertence(dim, id_):
+    """O id (opcional) é de uma dimensão do dono corrente? O cache já vem filtrado por dono."""
+    return id_ is None or id_ in cache_dimensoes.obter()[dim]
+
+def nome_dim(dim, id_, padrao, dims=None):
+    item = (dims or cache_dimensoes.obter())[dim].get(id_)
+    return item["nome"] if item else padrao
+
+# --- SERIALIZAÇÃO EM LOTE ---
+# Os nomes de Tipo/Subtipo/Categoria/Conta vêm do cache de dimensões,
+# em vez de quatro db.session.get por linha. Nas respostas em streaming as dimensões são
+# lidas na view e passadas adiante: o gerador roda depois do teardown da requisição, já
+# sem o dono em usuario_contexto (o cache leria as dimensões de todos os donos).
+def consulta_serializada(query):
+    """Recebe uma query de Lancamento (já filtrada/ordenada) e devolve só as colunas da API."""
+    return query.with_entities(
+        Lancamento.id, Lancamento.data, Lancamento.descricao, Lancamento.tipo_id, Lancamento.subtipo_id,
+        Lancamento.categoria_id, Lancamento.conta_id, Lancamento.valor_centavos, Lancamento.efetivado, Lancamento.comprovante)
+
+def serializar_linha(r, dims=None):
+    id_, data, descricao, tipo_id, subtipo_id, categoria_id, conta_id, valor_centavos, efetivado, comprovante = r
+    dims = dims or cache_dimensoes.obter()
+    return {
+        "id": id_, "data": data.isoformat(), "descricao": descricao,
+        "tipo": nome_dim("tipos", tipo_id, "N/A", dims), "subtipo": nome_dim("subtipos", subtipo_id, "N/A", dims),
+        "categoria": nome_dim("categorias", categoria_id, "-", dims),
+        "conta": nome_dim("contas", conta_id, "Padrão", dims),
+        "conta_id": conta_id,
+        "valor": reais(valor_centavos),
+        "efetivado": efetivado, "comprovante": comprovante
+    }
+
+def stream_json_lista(linhas, dims, chave="itens", rodape=None):
+    """Gera um objeto JSON {chave: [...], **rodape()} linha a linha, sem montar a lista em memória."""
+    yield '{"%s": [' % chave
+    for i, linha in enumerate(linhas):
+        yield (',' if i else '') + json.dumps(serializar_linha(linha, dims), ensure_ascii=False)
+    yield ']'
+    for k, v in (rodape() if rodape else {}).items():
+        yield ', %s: %s' % (json.dumps(k), json.dumps(v))
+    yield '}'
+
+# --- FEED DE ALTERAÇÕES (SSE) ---
+# Cada escrita grava um evento compacto (a linha alterada, não a lista) na mesma transação:
+# se a gravação for desfeita, o evento também some. /api/eventos entrega os eventos em
+# ordem de id, e o navegador aplica cada um no lugar em vez de recarregar tudo.
+# Guardados por dono (e os sem dono à parte): um dono movimentado não apaga os eventos dos outros
+MANTER_EVENTOS = 1000
+
+class Evento(DoUsuario, db.Model):
+    __table_args__ = (db.Index('ix_evento_usuario', 'usuario_id', 'id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False)
+    dados = db.Column(db.Text, nullable=False)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+aviso_eventos = threading.Condition()
+
+def chave_descartados(usuario_id):
+    """Metadado com o maior id de evento já descartado do dono (ou dos eventos sem dono)."""
+    return f"eventos_descartados:{usuario_id}" if usuario_id is not None else "eventos_descartados"
+
+def publicar(tipo, usuario_id=None, **dados):
+    """Registra o evento na transação corrente; os do mesmo dono além de MANTER_EVENTOS são descartados.
+
+    O evento vai para o dono corrente (ou `usuario_id`); sem nenhum dos dois, para todos. O maior
+    id descartado fica em chave_descartados: o stream manda recarregar quem ficou antes dele.
+    """
+    if usuario_id is None: usuario_id = usuario_atual()
+    db.session.execute(db.insert(Evento).values(tipo=tipo, usuario_id=usuario_id, dados=json.dumps(dados, ensure_ascii=False, default=str)))
+    corte = db.session.execute(text('SELECT id FROM evento WHERE usuario_id IS :uid ORDER BY id DESC LIMIT 1 OFFSET :manter'),
+                               {"uid": usuario_id, "manter": MANTER_EVENTOS}).scalar()
+    if corte is not None:
+        db.session.execute(text('DELETE FROM evento WHERE usuario_id IS :uid AND id <= :corte'), {"uid": usuario_id, "corte": corte})
+        db.session.execute(text('INSERT INTO metadado (chave, valor) VALUES (:chave, :corte) ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor'),
+                           {"chave": chave_descartados(usuario_id), "corte": str(corte)})
+    db.session.info['eventos'] = True
+
+@event.listens_for(Session, 'after_commit')
+def avisar_eventos(sessao):
+    # Acorda na hora os streams deste processo; os de outros processos percebem na próxima consulta
+    if sessao.info.pop('eventos', False):
+        with aviso_eventos: aviso_eventos.notify_all()
+
+@event.listens_for(Session, 'after_rollback')
+def descartar_aviso(sessao): sessao.info.pop('eventos', None)
+
+def meses_de(datas): return sorted({d.strftime('%Y-%m') for d in datas})
+
+class Vencimento(DoUsuario, db.Model):
+    __table_args__ = (db.Index('ix_vencimento_usuario', 'usuario_id', 'ativo', 'data_vencimento'),)
 
-class Vencimento(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     descricao = db.Column(db.String(100), nullable=False)
     tipo = db.Column(db.String(50), nullable=False)
     dia = db.Column(db.Integer, nullable=True)
-    data_vencimento = db.Column(db.String(10), nullable=True)
+    data_vencimento = db.Column(db.Date, nullable=True)
     ativo = db.Column(db.Boolean, default=False) 
+    # Com valor e subtipo, o vencimento vira lançamentos pendentes (ver projetar_vencimentos)
+    valor_centavos = db.Column(db.Integer, nullable=True)
+    tipo_id = db.Column(db.Integer, db.ForeignKey('tipo.id'), nullable=True)
+    subtipo_id = db.Column(db.Integer, db.ForeignKey('subtipo.id'), nullable=True)
+    categoria_id = db.Column(db.Integer, db.ForeignKey('categoria.id'), nullable=True)
+    conta_id = db.Column(db.Integer, db.ForeignKey('conta.id'), nullable=True)
+    # Último mês (dia 1) já gerado: um lançamento gerado e depois apagado não volta
+    gerado_ate = db.Column(db.Date, nullable=True)
+
+    @property
+    def recorrente(self): return self.valor_centavos is not None and self.subtipo_id is not None
+
     def to_dict(self):
-        return {"id": self.id, "descricao": self.descricao, "tipo": self.tipo, "dia": self.dia, "data_vencimento": self.data_vencimento, "ativo": self.ativo}
+        return {"id": self.id, "descricao": self.descricao, "tipo": self.tipo, "dia": self.dia, "data_vencimento": self.data_vencimento.isoformat() if self.data_vencimento else None, "ativo": self.ativo,
+                "valor": reais(self.valor_centavos) if self.valor_centavos is not None else None, "tipo_id": self.tipo_id, "subtipo_id": self.subtipo_id,
+                "categoria_id": self.categoria_id, "conta_id": self.conta_id, "gerado_ate": self.gerado_ate.isoformat() if self.gerado_ate else None}
 
-def inicializar_banco():
-    with app.app_context():
-        db.create_all()
+# --- RESUMO MENSAL (agregados mantidos a cada escrita) ---
+# Uma linha por (dono, ano, mês, tipo, subtipo, categoria, conta, efetivado). Categoria e conta
+# ausentes viram 0 para que a chave única funcione (no SQLite NULLs não colidem).
+class ResumoMensal(DoUsuario, db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('usuario_id', 'ano', 'mes', 'tipo_id', 'subtipo_id', 'categoria_id', 'conta_id', 'efetivado', name='uq_resumo_chave'),
+        db.Index('ix_resumo_conta_mes', 'conta_id', 'ano', 'mes'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    ano = db.Column(db.Integer, nullable=False)
+    mes = db.Column(db.Integer, nullable=False)
+    tipo_id = db.Column(db.Integer, nullable=False)
+    subtipo_id = db.Column(db.Integer, nullable=False)
+    categoria_id = db.Column(db.Integer, nullable=False, default=0)
+    conta_id = db.Column(db.Integer, nullable=False, default=0)
+    efetivado = db.Column(db.Boolean, nullable=False)
+    total_centavos = db.Column(db.Integer, nullable=False, default=0)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+
+# --- SALDOS POR CONTA ---
+# Ponto de controle por conta e mês: soma dos lançamentos efetivados até o fim do mês
+# (sem o saldo inicial, que pode ser editado sem invalidar nada). Uma alteração num mês
+# apaga os pontos dele em diante; a próxima consulta refaz só esse trecho.
+class SaldoMensal(db.Model):
+    __table_args__ = (db.UniqueConstraint('conta_id', 'ano', 'mes', name='uq_saldo_conta_mes'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    conta_id = db.Column(db.Integer, nullable=False)
+    ano = db.Column(db.Integer, nullable=False)
+    mes = db.Column(db.Integer, nullable=False)
+    acumulado_centavos = db.Column(db.Integer, nullable=False)
+
+CHAVE_RESUMO = ('usuario_id', 'ano', 'mes', 'tipo_id', 'subtipo_id', 'categoria_id', 'conta_id', 'efetivado')
+
+def chave_resumo(data, tipo_id, subtipo_id, categoria_id, conta_id, efetivado, usuario_id=None):
+    if usuario_id is None: usuario_id = usuario_atual()
+    return (usuario_id, data.year, data.month, tipo_id, subtipo_id, categoria_id or 0, conta_id or 0, bool(efetivado))
+
+def acumular_resumo_lote(deltas):
+    """Aplica {chave_resumo: [total_centavos, quantidade]} ao resumo com um único executemany."""
+    if not deltas: return
+    stmt = sqlite_insert(ResumoMensal)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(CHAVE_RESUMO),
+        set_={"total_centavos": ResumoMensal.total_centavos + stmt.excluded.total_centavos, "quantidade": ResumoMensal.quantidade + stmt.excluded.quantidade})
+    db.session.execute(stmt, [dict(zip(CHAVE_RESUMO, k), total_centavos=t, quantidade=q) for k, (t, q) in deltas.items()])
+    # Só lançamentos efetivados mexem no saldo: invalida a partir do mês mais antigo alterado em cada conta
+    primeiro_mes = {}
+    for usuario_id, ano, mes, _, _, _, conta_id, efetivado in deltas:
+        if efetivado and conta_id:
+            chave = (usuario_id, conta_id); primeiro_mes[chave] = min(primeiro_mes.get(chave, (ano, mes)), (ano, mes))
+    invalidar_saldos(primeiro_mes)
+
+def invalidar_saldos(primeiro_mes):
+    """Apaga os pontos de controle de {(usuario_id, conta_id): (ano, mes)} em diante, na transação corrente.
+
+    A troca da versão 'saldos' do dono impede que uma consulta concorrente, que calculou o saldo
+    antes desta gravação, salve um ponto de controle já desatualizado (ver gravar_pontos_saldo).
+    """
+    if not primeiro_mes: return
+    for (_, conta_id), inicio in primeiro_mes.items():
+        SaldoMensal.query.filter(SaldoMensal.conta_id == conta_id, tuple_(SaldoMensal.ano, SaldoMensal.mes) >= inicio).delete(synchronize_session=False)
+    for usuario_id in {u for u, _ in primeiro_mes}: trocar_versao(chave_usuario('saldos', usuario_id))
+
+def acumular_resumo(l, sinal):
+    """Soma (sinal=1) ou subtrai (sinal=-1) o lançamento no resumo, na transação corrente."""
+    chave = chave_resumo(l.data, l.tipo_id, l.subtipo_id, l.categoria_id, l.conta_id, l.efetivado, l.usuario_id)
+    acumular_resumo_lote({chave: [sinal * l.valor_centavos, sinal]})
+    if sinal < 0:
+        ResumoMensal.query.filter_by(quantidade=0, **dict(zip(CHAVE_RESUMO, chave))).delete()
+
+def reconstruir_resumo(usuario_id=None):
+    """Recalcula o resumo a partir dos lançamentos (carga inicial / correção): de todos, ou só de `usuario_id`."""
+    do_dono = lambda modelo: [modelo.usuario_id == usuario_id] if usuario_id else []
+    ResumoMensal.query.filter(*do_dono(ResumoMensal)).delete(synchronize_session=False)
+    SaldoMensal.query.filter(*([SaldoMensal.conta_id.in_(db.select(Conta.id).filter(*do_dono(Conta)))] if usuario_id else [])).delete(synchronize_session=False)
+    for uid in [usuario_id] if usuario_id else [u for (u,) in db.session.query(User.id)]: trocar_versao(chave_usuario('saldos', uid))
+    ano = func.cast(func.strftime('%Y', Lancamento.data), db.Integer)
+    mes = func.cast(func.strftime('%m', Lancamento.data), db.Integer)
+    cat = func.coalesce(Lancamento.categoria_id, 0); conta = func.coalesce(Lancamento.conta_id, 0)
+    grupo = (Lancamento.usuario_id, ano, mes, Lancamento.tipo_id, Lancamento.subtipo_id, cat, conta, Lancamento.efetivado)
+    # O INSERT ... SELECT não passa pelo escopo automático: o filtro do dono vai explícito
+    origem = db.select(*grupo, func.sum(Lancamento.valor_centavos), func.count()).filter(*do_dono(Lancamento)).group_by(*grupo)
+    db.session.execute(db.insert(ResumoMensal).from_select([*CHAVE_RESUMO, 'total_centavos', 'quantidade'], origem))
+
+# --- BUSCA TEXTUAL (FTS5) ---
+# Índice invertido de descrição + subtipo/categoria de cada lançamento (rowid = lancamento.id),
+# mantido por gatilhos: vale para o ORM, as inserções em lote e o SQL puro. O tokenizador
+# ignora maiúsculas e acentos ("aluguél" acha "Aluguel") e o índice de prefixos de 2 e 3
+# letras atende a busca enquanto se digita. O dono não entra no índice: a busca junta com
+# lancamento, que passa pelo escopo do usuário como as demais consultas.
+def classificacao_sql(l):
+    return (f"COALESCE((SELECT nome FROM subtipo WHERE id = {l}.subtipo_id), '') || ' ' || "
+            f"COALESCE((SELECT nome FROM categoria WHERE id = {l}.categoria_id), '')")
+
+DDL_BUSCA = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS lancamento_busca USING fts5(
+        descricao, classificacao, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')""",
+    f"""CREATE TRIGGER IF NOT EXISTS lancamento_busca_insert AFTER INSERT ON lancamento BEGIN
+        INSERT INTO lancamento_busca (rowid, descricao, classificacao) VALUES (new.id, new.descricao, {classificacao_sql('new')});
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS lancamento_busca_delete AFTER DELETE ON lancamento BEGIN
+        DELETE FROM lancamento_busca WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS lancamento_busca_update AFTER UPDATE OF descricao, subtipo_id, categoria_id ON lancamento BEGIN
+        UPDATE lancamento_busca SET descricao = new.descricao, classificacao = {classificacao_sql('new')} WHERE rowid = new.id;
+    END""",
+    # Renomear um subtipo/categoria reindexa só os lançamentos dele (pelo índice do dono)
+    *(f"""CREATE TRIGGER IF NOT EXISTS lancamento_busca_{dim} AFTER UPDATE OF nome ON {dim} BEGIN
+        UPDATE lancamento_busca SET classificacao = (SELECT {classificacao_sql('l')} FROM lancamento l WHERE l.id = lancamento_busca.rowid)
+        WHERE rowid IN (SELECT id FROM lancamento WHERE usuario_id = new.usuario_id AND {dim}_id = new.id);
+    END""" for dim in ('subtipo', 'categoria')),
+    # "rank" = bm25 com a descrição pesando mais que a classificação. Só grava se mudou: regravar a
+    # configuração (a cada partida de processo) faz a próxima busca já preparada nas conexões dos
+    # outros processos falhar com "SQL logic error"
+    """INSERT INTO lancamento_busca (lancamento_busca, rank) SELECT 'rank', 'bm25(10.0, 1.0)'
+        WHERE NOT EXISTS (SELECT 1 FROM lancamento_busca_config WHERE k = 'rank' AND v = 'bm25(10.0, 1.0)')""",
+)
+
+def criar_busca(conn):
+    for ddl in DDL_BUSCA: conn.execute(text(ddl))
+
+def reconstruir_busca():
+    """Recarrega o índice de busca a partir dos lançamentos (bancos anteriores a ele ou restaurados)."""
+    db.session.execute(text('DELETE FROM lancamento_busca'))
+    db.session.execute(text(f'INSERT INTO lancamento_busca (rowid, descricao, classificacao) '
+                            f'SELECT id, descricao, {classificacao_sql("lancamento")} FROM lancamento'))
+    db.session.execute(text("INSERT INTO lancamento_busca (lancamento_busca) VALUES ('optimize')"))
+
+# --- MIGRAÇÕES DE SCHEMA ---
+# A versão do schema fica em PRAGMA user_version e só muda junto com o resto de
+# inicializar_banco, na mesma transação: estar na versão atual quer dizer que o banco está pronto.
+# 6: busca textual (lancamento_busca), criada por inicializar_banco
+SCHEMA_VERSAO = 6
+
+def reconstruir_tabela(conn, modelo, expressoes):
+    """Recria a tabela do modelo com o schema atual, copiando os dados da antiga.
+
+    Segue o procedimento recomendado pelo SQLite para alterar tipos de coluna: cria
+    '<tabela>_nova', copia, apaga a antiga e renomeia. `expressoes` mapeia coluna nova ->
+    expressão SQL sobre as colunas antigas; as demais são copiadas pelo nome.
+    """
+    tabela = modelo.__table__; nome = tabela.name
+    antigas = {c['name'] for c in inspect(conn).get_columns(nome)}
+    for indice in tabela.indexes: conn.execute(text(f'DROP INDEX IF EXISTS {indice.name}'))
+    meta = MetaData()
+    for t in db.metadata.tables.values():
+        if t is not tabela: t.to_metadata(meta)  # Para resolver as chaves estrangeiras
+    nova = tabela.to_metadata(meta, name=f'{nome}_nova')
+    nova.create(conn)
+    colunas = [c.name for c in tabela.columns if c.name in expressoes or c.name in antigas]
+    origem = ', '.join(expressoes.get(c, c) for c in colunas)
+    conn.execute(text(f'INSERT INTO {nome}_nova ({", ".join(colunas)}) SELECT {origem} FROM {nome}'))
+    conn.execute(text(f'DROP TABLE {nome}'))
+    conn.execute(text(f'ALTER TABLE {nome}_nova RENAME TO {nome}'))
+
+# Dados que a migração não sabe converter: a transação é desfeita e o banco fica como estava
+class ErroMigracao(ValueError):
+    pass
+
+def data_iso_sql(coluna):
+    """Expressão SQL: a data em texto do schema 0 como 'AAAA-MM-DD', ou NULL se não for uma data.
+
+    Aceita também 'DD/MM/AAAA' e data com hora. date() sozinha devolve '2024-02-30' como veio;
+    com '+0 days' ela normaliza ('2024-03-01'), e a data só vale se não mudou.
+    """
+    iso = (f"(CASE WHEN {coluna} GLOB '[0-9][0-9]/[0-9][0-9]/[0-9][0-9][0-9][0-9]*' "
+           f"THEN substr({coluna}, 7, 4) || '-' || substr({coluna}, 4, 2) || '-' || substr({coluna}, 1, 2) ELSE substr({coluna}, 1, 10) END)")
+    return f"(CASE WHEN date({iso}, '+0 days') = {iso} THEN {iso} END)"
+
+def recusar_datas_invalidas(conn, tabela, coluna, obrigatoria):
+    """Interrompe a migração se alguma data preenchida não for uma data."""
+    preenchida = '1' if obrigatoria else f"COALESCE({coluna}, '') != ''"
+    invalidas = conn.execute(text(f'SELECT id, {coluna} FROM {tabela} WHERE {preenchida} AND {data_iso_sql(coluna)} IS NULL LIMIT 20')).all()
+    if invalidas:
+        raise ErroMigracao(f"Datas inválidas em {tabela}.{coluna}, corrija antes de migrar: " + ', '.join(f"id {i} ({d!r})" for i, d in invalidas))
+
+def migrar_schema(conn):
+    versao = conn.execute(text('PRAGMA user_version')).scalar()
+    if versao >= SCHEMA_VERSAO: return
+    tabelas = set(inspect(conn).get_table_names())
+
+    if versao < 1:
+        # Datas em coluna DATE (ISO, comparável por intervalo) e dinheiro em centavos inteiros
+        if 'lancamento' in tabelas:
+            recusar_datas_invalidas(conn, 'lancamento', 'data', obrigatoria=True)
+            reconstruir_tabela(conn, Lancamento, {'data': data_iso_sql('data'), 'valor_centavos': 'CAST(ROUND(valor * 100) AS INTEGER)'})
+        if 'vencimento' in tabelas:
+            recusar_datas_invalidas(conn, 'vencimento', 'data_vencimento', obrigatoria=False)
+            reconstruir_tabela(conn, Vencimento, {'data_vencimento': data_iso_sql('data_vencimento')})
+        if 'conta' in tabelas:
+            reconstruir_tabela(conn, Conta, {'saldo_inicial_centavos': 'CAST(ROUND(COALESCE(saldo_inicial, 0) * 100) AS INTEGER)'})
+        # O resumo é derivado: é recriado vazio e recarregado por inicializar_banco
+        conn.execute(text('DROP TABLE IF EXISTS resumo_mensal'))
+
+    if versao < 2 and 'lancamento' in tabelas:
+        # Hash das linhas importadas; o índice único é criado por inicializar_banco
+        if 'hash_importacao' not in {c['name'] for c in inspect(conn).get_columns('lancamento')}:
+            conn.execute(text('ALTER TABLE lancamento ADD COLUMN hash_importacao VARCHAR(40)'))
+
+    if versao < 3 and 'conta' in tabelas:
+        if 'dia_fechamento' not in {c['name'] for c in inspect(conn).get_columns('conta')}:
+            conn.execute(text('ALTER TABLE conta ADD COLUMN dia_fechamento INTEGER'))
+
+    if versao < 4:
+        # Recorrências: dados do lançamento no vencimento e o vínculo no lançamento gerado
+        novas = {'vencimento': ['valor_centavos INTEGER', 'tipo_id INTEGER', 'subtipo_id INTEGER', 'categoria_id INTEGER', 'conta_id INTEGER', 'gerado_ate DATE'],
+                 'lancamento': ['vencimento_id INTEGER', 'competencia DATE']}
+        for tabela, colunas in novas.items():
+            if tabela not in tabelas: continue
+            existentes = {c['name'] for c in inspect(conn).get_columns(tabela)}
+            for coluna in colunas:
+                if coluna.split()[0] not in existentes: conn.execute(text(f'ALTER TABLE {tabela} ADD COLUMN {coluna}'))
+
+    if versao < 5:
+        # Multiusuário: os dados existentes ficam com o primeiro usuário cadastrado, que vira administrador
+        if 'user' in tabelas:
+            existentes = {c['name'] for c in inspect(conn).get_columns('user')}
+            for coluna in ('titular_id INTEGER', 'telegram_chat_id VARCHAR(50)'):
+                if coluna.split()[0] not in existentes: conn.execute(text(f'ALTER TABLE "user" ADD COLUMN {coluna}'))
+            conn.execute(text('UPDATE "user" SET is_admin = 1 WHERE id = (SELECT MIN(id) FROM "user")'))
+        dono = '(SELECT MIN(id) FROM "user")' if 'user' in tabelas else 'NULL'
+        for tabela in ('lancamento', 'conta', 'subtipo', 'categoria', 'vencimento', 'evento'):
+            if tabela not in tabelas: continue
+            if 'usuario_id' not in {c['name'] for c in inspect(conn).get_columns(tabela)}:
+                conn.execute(text(f'ALTER TABLE {tabela} ADD COLUMN usuario_id INTEGER'))
+            conn.execute(text(f'UPDATE {tabela} SET usuario_id = {dono} WHERE usuario_id IS NULL'))
+        # Índices que não começam pelo dono (os novos são criados por inicializar_banco)
+        for indice in ('ix_lancamento_data_conta', 'ux_lancamento_hash', 'ix_vencimento_data'):
+            conn.execute(text(f'DROP INDEX IF EXISTS {indice}'))
+        # Chave única do resumo mudou: é recriado vazio e recarregado por inicializar_banco
+        conn.execute(text('DROP TABLE IF EXISTS resumo_mensal'))
+
+    conn.execute(text(f'PRAGMA user_version = {SCHEMA_VERSAO}'))
+
+def preparar_pastas():
+    """Pastas de dados, comprovantes, backups e métricas. Como o banco, ficam fora do import:
+    são criadas pela inicializar_banco e pela garantir_banco."""
+    for pasta in (dados_dir, app.config['BACKUP_FOLDER'], registro.pasta):
+        if pasta: os.makedirs(pasta, exist_ok=True)
+    armazem.preparar()
+
+def inicializar_banco(aplicacao=app):
+    """Migrações, tabelas, índices, busca textual e cadastros comuns, numa única transação.
+
+    Idempotente. Roda no deploy (`flask --app app inicializar-banco`, antes do gunicorn), no
+    restore (na cópia extraída, ver preparar_restauracao) e, num banco ainda não inicializado,
+    pela garantir_banco. Não roda no import.
+    """
+    preparar_pastas()
+    # Roda sem dono (também no restore, dentro de uma requisição): vale para o banco inteiro
+    with aplicacao.app_context(), como_usuario(None):
+        # BEGIN IMMEDIATE: o DDL entra na transação da sessão (o sqlite3 não abre uma antes de
+        # CREATE/ALTER) e dois processos partindo juntos esperam um pelo outro
+        conn = db.session.connection(); conn.exec_driver_sql('BEGIN IMMEDIATE')
+        migrar_schema(conn)
+        db.metadata.create_all(conn)
+        # create_all não adiciona índices novos em tabelas já existentes
+        for modelo in (User, Conta, Subtipo, Categoria, Lancamento, Evento, Vencimento, ResumoMensal):
+            for indice in modelo.__table__.indexes: indice.create(bind=conn, checkfirst=True)
+        criar_busca(conn)
         
-        # 1. Garante os Tipos Básicos
+        # 1. Garante os Tipos Básicos (comuns a todos os usuários)
         if not db.session.get(Tipo, 1):
             db.session.add(Tipo(id=1, nome="Entrada"))
             db.session.add(Tipo(id=2, nome="Saída"))
-        
-        # 2. Garante a Conta Padrão
-        if not db.session.query(Conta).first():
-            db.session.add(Conta(nome="Carteira Principal", tipo="carteira"))
-            
-        db.session.commit() # Commita para garantir que os IDs dos Tipos existam
 
-        # 3. Garante Subtipos e Categorias Padrão (Para Pagamento de Fatura)
-        
-        # --- Para ENTRADA (Tipo 1) ---
-        sub_ent = Subtipo.query.filter_by(nome="Transferências", tipo_id=1).first()
-        if not sub_ent:
-            sub_ent = Subtipo(nome="Transferências", tipo_id=1)
-            db.session.add(sub_ent)
-            db.session.commit() # Commita para gerar o ID do subtipo
-            
-        cat_ent = Categoria.query.filter_by(nome="Pagamento de Fatura", subtipo_id=sub_ent.id).first()
-        if not cat_ent:
-            db.session.add(Categoria(nome="Pagamento de Fatura", subtipo_id=sub_ent.id))
-
-        # --- Para SAÍDA (Tipo 2) ---
-        sub_sai = Subtipo.query.filter_by(nome="Transferências", tipo_id=2).first()
-        if not sub_sai:
-            sub_sai = Subtipo(nome="Transferências", tipo_id=2)
-            db.session.add(sub_sai)
-            db.session.commit() # Commita para gerar o ID do subtipo
-
-        cat_sai = Categoria.query.filter_by(nome="Pagamento de Fatura", subtipo_id=sub_sai.id).first()
-        if not cat_sai:
-            db.session.add(Categoria(nome="Pagamento de Fatura", subtipo_id=sub_sai.id))
+        # Conta padrão e subtipos/categorias de cada usuário: preparar_usuario, no primeiro login
+        for (uid,) in db.session.query(User.id):
+            trocar_versao(chave_usuario('dimensoes', uid)); trocar_versao(chave_usuario('saldos', uid))
+        # Bancos anteriores ao resumo mensal: faz a carga inicial uma única vez
+        if not db.session.query(ResumoMensal.id).first() and db.session.query(Lancamento.id).first():
+            reconstruir_resumo()
+        if not db.session.execute(text('SELECT rowid FROM lancamento_busca LIMIT 1')).first() and db.session.query(Lancamento.id).first():
+            reconstruir_busca()
+        db.session.commit()
 
+def preparar_usuario(usuario_id):
+    """Cadastros iniciais de um dono: conta padrão e, para Entrada e Saída, o subtipo
+    Transferências com a categoria Pagamento de Fatura. Não faz nada se já existem."""
+    with como_usuario(usuario_id):
+        novos = []
+        if not db.session.query(Conta.id).first():
+            novos.append(Conta(nome="Carteira Principal", tipo="carteira"))
+        for tipo_id in (1, 2):
+            sub = Subtipo.query.filter_by(nome="Transferências", tipo_id=tipo_id).first()
+            if not sub:
+                sub = Subtipo(nome="Transferências", tipo_id=tipo_id); db.session.add(sub); db.session.flush()  # Gera o ID do subtipo
+                novos.append(sub)
+            if not Categoria.query.filter_by(nome="Pagamento de Fatura", subtipo_id=sub.id).first():
+                novos.append(Categoria(nome="Pagamento de Fatura", subtipo_id=sub.id))
+        db.session.add_all(novos)
+        # As chaves de versão do dono existem antes da primeira escrita dele
+        if novos or ler_versao(chave_usuario('dimensoes')) is None: invalidar_dimensoes()
+        if ler_versao(chave_usuario('saldos')) is None: trocar_versao(chave_usuario('saldos'))
         db.session.commit()
 
-inicializar_banco()
+banco_verificado = False
+
+def garantir_banco():
+    """Uma vez por processo (primeira requisição, comando do CLI, partida do bot): cria as pastas
+    e roda a inicializar_banco só se o banco está atrás do código. Um PRAGMA quando já está pronto."""
+    global banco_verificado
+    if banco_verificado: return
+    preparar_pastas()
+    with app.app_context(), db.engine.connect() as conn: versao = conn.execute(text('PRAGMA user_version')).scalar()
+    if versao < SCHEMA_VERSAO: inicializar_banco()
+    banco_verificado = True
 
 # --- ROTAS ---
 @app.route('/login', methods=['GET', 'POST'])
@@ -204,13 +848,45 @@ def login():
         if user and user.check_password(password):
             if user.totp_secret:
                 if token_2fa:
-                    if user.verify_totp(token_2fa): login_user(user); return redirect(url_for('index'))
+                    if user.verify_totp(token_2fa): return entrar(user)
                     else: flash('Código 2FA incorreto.'); return render_template('login.html', step='2fa', username=username, password=password)
                 else: return render_template('login.html', step='2fa', username=username, password=password)
-            else: login_user(user); return redirect(url_for('index'))
+            else: return entrar(user)
         else: flash('Usuário ou senha inválidos.')
     return render_template('login.html', step='login')
 
+def entrar(user):
+    preparar_usuario(user.dono_id); login_user(user)
+    return redirect(url_for('index'))
+
+def somente_admin(view):
+    @wraps(view)
+    def verificar(*args, **kwargs):
+        if not current_user.is_admin: return jsonify({"erro": "Apenas administradores podem fazer isso"}), 403
+        return view(*args, **kwargs)
+    return verificar
+
+@app.route('/api/usuario', methods=['GET', 'PUT'])
+@login_required
+def api_usuario():
+    """Dados do usuário logado. PUT {"telegram_chat_id": "..."} vincula o chat do bot (vazio desvincula)."""
+    if request.method == 'PUT':
+        chat = str((request.json or {}).get('telegram_chat_id') or '').strip() or None
+        if chat and User.query.filter(User.telegram_chat_id == chat, User.id != current_user.id).first():
+            return jsonify({"erro": "Este chat já está vinculado a outro usuário"}), 409
+        current_user.telegram_chat_id = chat; db.session.commit()
+    return jsonify({"id": current_user.id, "username": current_user.username, "is_admin": bool(current_user.is_admin),
+                    "titular_id": current_user.titular_id, "telegram_chat_id": current_user.telegram_chat_id})
+
+@app.route('/metrics')
+def metricas_prometheus():
+    """Métricas no formato texto do Prometheus: Bearer METRICAS_TOKEN ou um administrador logado."""
+    token = os.getenv('METRICAS_TOKEN')
+    if token: autorizado = hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    else: autorizado = current_user.is_authenticated and current_user.is_admin
+    if not autorizado: return jsonify({"erro": "Acesso negado"}), 403
+    return Response(registro.texto(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/logout')
 @login_required
 def logout(): logout_user(); return redirect(url_for('login'))
@@ -219,6 +895,7 @@ def logout(): logout_user(); return redirect(url_for('login'))
 @login_required
 def setup_2fa():
     if current_user.totp_secret: flash('2FA já ativado.'); return redirect(url_for('index'))
+    import pyotp, qrcode  # qrcode traz o Pillow: só quem ativa o 2FA paga o import
     secret = pyotp.random_base32()
     uri = pyotp.totp.TOTP(secret).provisioning_uri(name=current_user.username, issuer_name='Financas do Cris')
     img = qrcode.make(uri); buffered = BytesIO(); img.save(buffered, format="PNG")
@@ -229,132 +906,305 @@ def setup_2fa():
 @login_required
 def verify_2fa_setup():
     secret = request.form.get('secret'); token = request.form.get('token')
+    import pyotp
     if pyotp.TOTP(secret).verify(token):
         current_user.totp_secret = secret; db.session.commit()
         flash('✅ 2FA ativado!', 'success'); return redirect(url_for('index'))
     else: flash('❌ Código incorreto.', 'error'); return redirect(url_for('setup_2fa'))
 
-@bot.message_handler(commands=['start'])
-def send_welcome(message):
-    markup = types.ReplyKeyboardMarkup(row_width=1, resize_keyboard=True)
-    markup.add(types.KeyboardButton('🔥 Vencendo Hoje'), types.KeyboardButton('📅 Vencem este Mês'), types.KeyboardButton('🔮 Próximas Contas'))
-    bot.reply_to(message, "Menu:", reply_markup=markup)
-
-@bot.message_handler(func=lambda message: message.text == '🔥 Vencendo Hoje')
-def verificar_hoje(message):
-    with app.app_context():
-        hoje = datetime.now(); data_str = hoje.strftime('%Y-%m-%d')
-        vencimentos = Vencimento.query.filter_by(ativo=True).all()
-        fixas = [f"- {v.descricao}" for v in vencimentos if v.tipo == 'fixo' and v.dia == hoje.day]
-        variaveis = [f"- {v.descricao}" for v in vencimentos if v.tipo == 'variavel' and v.data_vencimento == data_str]
-        enviar_resp(message, "⚠️ CONTAS PARA HOJE", fixas, variaveis)
-
-@bot.message_handler(func=lambda message: message.text == '📅 Vencem este Mês')
-def verificar_mes(message):
-    with app.app_context():
-        hoje = datetime.now(); vencimentos = Vencimento.query.filter_by(ativo=True).all()
-        fixas = [f"- {v.descricao} (Dia {v.dia})" for v in vencimentos if v.tipo == 'fixo' and v.dia and v.dia >= hoje.day]
-        variaveis = []
-        for v in vencimentos:
-            if v.tipo == 'variavel' and v.data_vencimento:
-                try:
-                    dt = datetime.strptime(v.data_vencimento, '%Y-%m-%d')
-                    if dt.year == hoje.year and dt.month == hoje.month and dt.day >= hoje.day: variaveis.append(f"- {v.descricao} (Dia {dt.day})")
-                except: pass
-        enviar_resp(message, "📅 VENCEM ESTE MÊS", fixas, variaveis)
-
-@bot.message_handler(func=lambda message: message.text == '🔮 Próximas Contas')
-def verificar_futuro(message):
-    with app.app_context():
-        hoje = datetime.now(); prox_mes = 1 if hoje.month == 12 else hoje.month + 1; prox_ano = hoje.year + 1 if hoje.month == 12 else hoje.year
-        data_corte = datetime(prox_ano, prox_mes, 1); vencimentos = Vencimento.query.filter_by(ativo=True).all()
-        fixas = [f"- {v.descricao} (Dia {v.dia})" for v in vencimentos if v.tipo == 'fixo' and v.dia]
-        variaveis = []
-        for v in vencimentos:
-            if v.tipo == 'variavel' and v.data_vencimento:
-                try:
-                    dt = datetime.strptime(v.data_vencimento, '%Y-%m-%d')
-                    if dt >= data_corte: variaveis.append(f"- {v.descricao} ({dt.strftime('%d/%m/%Y')})")
-                except: pass
-        enviar_resp(message, "🔮 PRÓXIMAS CONTAS", fixas, variaveis)
-
-def enviar_resp(msg, titulo, f, v):
-    if not f and not v: return bot.reply_to(msg, "✅ Nada encontrado.")
-    resp = [f"<b>{titulo}</b>"]
-    if f: resp.append("\n<b>Fixas:</b>"); resp.extend(f)
-    if v: resp.append("\n<b>Variáveis:</b>"); resp.extend(v)
-    bot.reply_to(msg, "\n".join(resp), parse_mode="HTML")
-
-def iniciar_bot():
-    if bot:
-        try: bot.infinity_polling()
-        except: pass
-
 @app.route('/')
 @login_required 
 def index(): return render_template('index.html')
 
-@app.route('/uploads/<filename>')
+@app.route('/uploads/<path:filename>')
+@login_required
+def uploaded_file(filename):
+    """Serve um comprovante com suporte a Range e requisições condicionais.
+
+    Os endereçados por conteúdo nunca mudam: o sha256 é o ETag (forte) e o navegador
+    pode guardá-los por um ano. ?variante=miniatura|previa serve a versão reduzida de
+    imagens; enquanto ela não fica pronta vai o original, sem cache longo.
+    """
+    caminho = safe_join(app.config['UPLOAD_FOLDER'], filename)
+    if caminho is None or filename.startswith('.') or not os.path.isfile(caminho):
+        return jsonify({"erro": "Arquivo não encontrado"}), 404
+    # Só os comprovantes dos lançamentos do próprio usuário (o arquivo pode ser de vários)
+    if not db.session.query(Lancamento.id).filter(Lancamento.comprovante == filename).first():
+        return jsonify({"erro": "Arquivo não encontrado"}), 404
+    from comprovantes import eh_enderecado, VARIANTES
+    if not eh_enderecado(filename):
+        return send_file(caminho, conditional=True)
+
+    etag = os.path.basename(filename).split('.')[0]; variante = request.args.get('variante')
+    definitivo = variante is None
+    if variante in VARIANTES and os.path.exists(armazem.caminho_variante(filename, variante)):
+        caminho = armazem.caminho_variante(filename, variante); etag += '-' + variante; definitivo = True
+    resp = send_file(caminho, etag=etag, conditional=True)
+    if definitivo:
+        resp.cache_control.no_cache = None; resp.cache_control.private = True
+        resp.cache_control.max_age = 31536000; resp.cache_control.immutable = True
+    else:
+        resp.cache_control.no_cache = True
+    return resp
+
+def comprovante_referenciado(relativo):
+    """Algum lançamento, de qualquer usuário, aponta para o arquivo? (o mesmo conteúdo é um arquivo só)
+
+    Cada chamada usa uma conexão e uma transação novas: enxerga os commits feitos até ali.
+    """
+    with db.engine.connect() as conn:
+        return conn.execute(db.select(Lancamento.id).where(Lancamento.comprovante == relativo).limit(1)).first() is not None
+
+def remover_comprovantes_orfaos(relativos):
+    """Apaga os arquivos que nenhum lançamento referencia mais (chamar depois do commit)."""
+    for r in {r for r in relativos if r}:
+        armazem.remover(r, comprovante_referenciado)
+
+# --- CONFIGURAÇÕES (servidas pelo cache de dimensões) ---
+@app.route('/api/config', methods=['GET'])
+@login_required
+def get_config():
+    """Todas as dimensões numa resposta só, com ETag: se nada mudou o navegador recebe 304."""
+    dims = cache_dimensoes.obter()
+    resp = jsonify({k: list(dims[k].values()) for k in ("tipos", "subtipos", "categorias", "contas")})
+    resp.set_etag(dims["versao"] or "0")
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
+
+# --- FEED DE ALTERAÇÕES ---
+# O stream prende uma thread do gunicorn enquanto está aberto: ele termina cedo (long-poll) e
+# o EventSource reabre sozinho, enviando o Last-Event-ID; acima de feeds_por_processo() abertos
+# no worker, a resposta é 503 e o navegador tenta de novo mais tarde
+DURACAO_FEED = 25         # s até encerrar o stream
+RECONEXAO_FEED = 1000     # ms até o navegador reabrir um stream encerrado
+ESPERA_FEED_LOTADO = 10   # s até tentar de novo quando não há vaga
+INTERVALO_FEED = 1.0      # s entre consultas (eventos gravados por outros processos)
+BATIMENTO_FEED = 15       # s; comentário vazio para proxies não fecharem a conexão
+
+def formatar_evento(id_, tipo, dados="{}"): return f"id: {id_}\nevent: {tipo}\ndata: {dados}\n\n"
+
+class VagasFeed:
+    """Streams abertos neste processo; a vaga é devolvida quando o servidor fecha a resposta."""
+    def __init__(self):
+        self.trava = threading.Lock(); self.abertos = 0
+
+    def ocupar(self):
+        with self.trava:
+            if self.abertos >= feeds_por_processo(): return False
+            self.abertos += 1; return True
+
+    def liberar(self):
+        with self.trava: self.abertos -= 1
+
+vagas_feed = VagasFeed()
+
+@app.route('/api/eventos', methods=['GET'])
 @login_required
-def uploaded_file(filename): return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+def stream_eventos():
+    """Server-Sent Events com as alterações, a partir do Last-Event-ID (ou ?ultimo=).
+
+    Sem id, começa do evento mais recente (o cliente acabou de carregar os dados). Se os
+    eventos que o cliente perdeu já foram descartados, ou o banco foi restaurado/zerado,
+    envia 'recarregar'. O stream não usa a sessão do Flask-SQLAlchemy: cada consulta pega
+    uma conexão do engine e a devolve logo em seguida, com o filtro do dono explícito
+    (eventos sem dono valem para todos). Dura DURACAO_FEED; sem vaga no processo, 503.
+    """
+    try:
+        ultimo = request.headers.get('Last-Event-ID') or request.args.get('ultimo')
+        ultimo = int(ultimo) if ultimo else None
+    except ValueError:
+        ultimo = None
+    engine = db.engine; uid = usuario_atual()
+
+    def gerar(ultimo):
+        yield f'retry: {RECONEXAO_FEED}\n\n'
+        fim = time.monotonic() + DURACAO_FEED; batimento = time.monotonic() + BATIMENTO_FEED
+        while time.monotonic() < fim:
+            with engine.connect() as conn:
+                maximo, descartado = conn.execute(text('SELECT (SELECT MAX(id) FROM evento), (SELECT MAX(CAST(valor AS INTEGER)) FROM metadado WHERE chave IN (:dono, :todos))'),
+                                                  {"dono": chave_descartados(uid), "todos": chave_descartados(None)}).one()
+                maximo = maximo or 0; linhas = []
+                if ultimo is None or ultimo > maximo or (descartado and ultimo < descartado):
+                    yield formatar_evento(maximo, 'pronto' if ultimo is None else 'recarregar'); ultimo = maximo
+                else:
+                    linhas = conn.execute(text('SELECT id, tipo, dados FROM evento WHERE id > :ultimo AND (usuario_id = :uid OR usuario_id IS NULL) ORDER BY id LIMIT 500'), {"ultimo": ultimo, "uid": uid}).all()
+            for id_, tipo, dados in linhas:
+                yield formatar_evento(id_, tipo, dados); ultimo = id_
+            if len(linhas) == 500: continue
+            # Lote incompleto: o que veio até `maximo` e não é do dono é de outros donos. Sem
+            # avançar, quem não tem eventos relia os dos outros (id > ultimo) a cada consulta
+            ultimo = max(ultimo, maximo)
+            if time.monotonic() > batimento:
+                yield ':\n\n'; batimento = time.monotonic() + BATIMENTO_FEED
+            with aviso_eventos: aviso_eventos.wait(INTERVALO_FEED)
+        # Só o id, sem evento: a reconexão (Last-Event-ID) já parte do ponto avançado
+        if ultimo is not None: yield f'id: {ultimo}\n\n'
+
+    if not vagas_feed.ocupar():
+        return Response(f'retry: {ESPERA_FEED_LOTADO * 1000}\n\n', status=503, mimetype='text/event-stream',
+                        headers={'Retry-After': str(ESPERA_FEED_LOTADO), 'Cache-Control': 'no-cache'})
+    resp = Response(gerar(ultimo), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    resp.call_on_close(vagas_feed.liberar)
+    return resp
 
 # --- NOVAS ROTAS PARA CONTAS ---
 @app.route('/api/config/contas', methods=['GET', 'POST', 'DELETE'])
 @login_required
 def api_contas():
     if request.method == 'GET':
-        return jsonify([c.to_dict() for c in Conta.query.all()])
+        return jsonify(list(cache_dimensoes.obter()["contas"].values()))
     if request.method == 'POST':
         d = request.json
-        db.session.add(Conta(nome=d['nome'], tipo=d['tipo']))
-        db.session.commit()
+        dia = int(d['dia_fechamento']) if d.get('dia_fechamento') else None
+        if dia is not None and not 1 <= dia <= 31: return jsonify({"erro": "Dia de fechamento deve estar entre 1 e 31"}), 400
+        c = Conta(nome=d['nome'], tipo=d['tipo'], dia_fechamento=dia if d['tipo'] == 'cartao_credito' else None)
+        db.session.add(c); db.session.flush()
+        invalidar_dimensoes(); publicar('dimensao', dim='contas', acao='criado', item=c.to_dict()); db.session.commit()
         return jsonify({"msg":"ok"})
     if request.method == 'DELETE':
         item = db.session.get(Conta, request.args.get('id'))
         if item: 
-            db.session.delete(item); db.session.commit()
+            db.session.delete(item); invalidar_dimensoes(); publicar('dimensao', dim='contas', acao='excluido', item={"id": item.id}); db.session.commit()
         return jsonify({"msg":"ok"})
 
 @app.route('/api/config/tipos', methods=['GET'])
 @login_required
-def get_tipos(): return jsonify([t.to_dict() for t in Tipo.query.all()])
+def get_tipos(): return jsonify(list(cache_dimensoes.obter()["tipos"].values()))
 
 @app.route('/api/config/subtipos', methods=['GET', 'POST', 'DELETE'])
 @login_required
 def api_subtipos():
-    if request.method == 'GET': return jsonify([s.to_dict() for s in Subtipo.query.all()])
+    if request.method == 'GET': return jsonify(list(cache_dimensoes.obter()["subtipos"].values()))
     if request.method == 'POST':
-        d = request.json; db.session.add(Subtipo(nome=d['nome'], tipo_id=d['tipo_id'])); db.session.commit(); return jsonify({"msg":"ok"})
+        d = request.json; i = Subtipo(nome=d['nome'], tipo_id=d['tipo_id']); db.session.add(i); db.session.flush()
+        invalidar_dimensoes(); publicar('dimensao', dim='subtipos', acao='criado', item=i.to_dict()); db.session.commit(); return jsonify({"msg":"ok"})
     if request.method == 'DELETE':
         i = db.session.get(Subtipo, request.args.get('id'))
-        if i: Categoria.query.filter_by(subtipo_id=i.id).delete(); db.session.delete(i); db.session.commit()
+        if i: Categoria.query.filter_by(subtipo_id=i.id).delete(); db.session.delete(i); invalidar_dimensoes(); publicar('dimensao', dim='subtipos', acao='excluido', item={"id": i.id}); db.session.commit()
         return jsonify({"msg":"ok"})
 
 @app.route('/api/config/categorias', methods=['GET', 'POST', 'DELETE'])
 @login_required
 def api_categorias():
-    if request.method == 'GET': return jsonify([c.to_dict() for c in Categoria.query.all()])
+    if request.method == 'GET': return jsonify(list(cache_dimensoes.obter()["categorias"].values()))
     if request.method == 'POST':
-        d = request.json; db.session.add(Categoria(nome=d['nome'], subtipo_id=d['subtipo_id'])); db.session.commit(); return jsonify({"msg":"ok"})
+        d = request.json
+        if not pertence("subtipos", d.get('subtipo_id')): return jsonify({"erro": "Subtipo não encontrado"}), 400
+        i = Categoria(nome=d['nome'], subtipo_id=d['subtipo_id']); db.session.add(i); db.session.flush()
+        invalidar_dimensoes(); publicar('dimensao', dim='categorias', acao='criado', item=i.to_dict()); db.session.commit(); return jsonify({"msg":"ok"})
     if request.method == 'DELETE':
         i = db.session.get(Categoria, request.args.get('id')); 
-        if i: db.session.delete(i); db.session.commit()
+        if i: db.session.delete(i); invalidar_dimensoes(); publicar('dimensao', dim='categorias', acao='excluido', item={"id": i.id}); db.session.commit()
         return jsonify({"msg":"ok"})
 
+# --- PAGINAÇÃO E FILTROS DE LANÇAMENTOS ---
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 500
+
+def intervalo_do_mes(mes):
+    """Converte 'AAAA-MM' no intervalo [dia 1, primeiro dia do mês seguinte)."""
+    ano, m = (int(p) for p in mes.split('-'))
+    prox = date(ano + 1, 1, 1) if m == 12 else date(ano, m + 1, 1)
+    return date(ano, m, 1), prox
+
+def codificar_cursor(l):
+    return base64.urlsafe_b64encode(f"{l.data}|{l.id}".encode()).decode()
+
+def decodificar_cursor(cursor):
+    data, id_ = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return date.fromisoformat(data), int(id_)
+
+def filtrar_lancamentos(query, args):
+    """Aplica os filtros de período, conta, tipo e status aceitos pela API.
+
+    As datas são comparadas por intervalo (e não por LIKE) para usar os índices de data.
+    """
+    if args.get('mes'):
+        inicio, fim = intervalo_do_mes(args['mes'])
+        query = query.filter(Lancamento.data >= inicio, Lancamento.data < fim)
+    if args.get('inicio'): query = query.filter(Lancamento.data >= date.fromisoformat(args['inicio']))
+    if args.get('fim'): query = query.filter(Lancamento.data <= date.fromisoformat(args['fim']))
+    if args.get('conta_id'): query = query.filter(Lancamento.conta_id == int(args['conta_id']))
+    if args.get('tipo_id'): query = query.filter(Lancamento.tipo_id == int(args['tipo_id']))
+    if args.get('efetivado') not in (None, ''): query = query.filter(Lancamento.efetivado == (args['efetivado'].lower() in ('1', 'true', 'sim')))
+    return query
+
 @app.route('/api/lancamentos', methods=['GET'])
 @login_required
-def get_lanc(): return jsonify([l.to_dict() for l in Lancamento.query.all()])
+def get_lanc():
+    """Lista os lançamentos do mais recente para o mais antigo, paginando por cursor (data, id)."""
+    try:
+        limite = max(1, min(int(request.args.get('limite', LIMITE_PADRAO)), LIMITE_MAXIMO))
+        query = filtrar_lancamentos(Lancamento.query, request.args)
+        if request.args.get('cursor'):
+            query = query.filter(tuple_(Lancamento.data, Lancamento.id) < decodificar_cursor(request.args['cursor']))
+    except (ValueError, TypeError) as e:
+        return jsonify({"erro": f"Parâmetro inválido: {str(e)}"}), 400
+
+    # A página (no máximo LIMITE_MAXIMO + 1 linhas) é lida aqui, antes do streaming, para que
+    # a conexão volte ao pool ao fim da view; só a serialização é feita em streaming.
+    pagina = consulta_serializada(query).order_by(Lancamento.data.desc(), Lancamento.id.desc()).limit(limite + 1).all()
+    proximo = codificar_cursor(pagina[limite - 1]) if len(pagina) > limite else None
+    corpo = stream_json_lista(pagina[:limite], cache_dimensoes.obter(), rodape=lambda: {"proximo_cursor": proximo})
+    return Response(stream_with_context(corpo), mimetype='application/json')
+
+# Tabela FTS5 (fora dos modelos: create_all não sabe criá-la); a coluna oculta com o nome
+# da tabela é a que recebe o MATCH e "rank" é o bm25 com os pesos configurados
+lancamento_busca = table('lancamento_busca', column('rowid'), column('rank'))
+MINIMO_BUSCA = 2
+# Só os N lançamentos mais recentes (por id) que casam com a busca e os filtros são
+# ordenados por relevância: calcular o bm25 de todas as ocorrências de um termo comum
+# ("pix", "mercado") custaria dezenas de ms e, entre milhares de descrições quase iguais,
+# não muda o topo da lista
+BUSCA_CANDIDATOS = 1000
+
+def expressao_busca(texto):
+    """'alug apto' -> '"alug"* AND "apto"*', ou None sem palavras pesquisáveis.
+
+    Cada palavra vira um prefixo entre aspas, então aspas, parênteses e operadores do FTS5
+    digitados pelo usuário não quebram a consulta.
+    """
+    termos = [t for t in re.findall(r'\w+', texto) if len(t) >= MINIMO_BUSCA]
+    return ' AND '.join(f'"{t}"*' for t in termos) or None
+
+@app.route('/api/lancamentos/search', methods=['GET'])
+@login_required
+def buscar_lanc():
+    """Busca por descrição, subtipo ou categoria, dos mais relevantes (bm25) para os menos.
+
+    Aceita os mesmos filtros de /api/lancamentos; a descrição pesa mais que a classificação
+    e, no empate, vem o mais recente. Só os BUSCA_CANDIDATOS lançamentos cadastrados por último
+    que casam com a busca e os filtros entram na ordenação: um mais relevante cadastrado antes
+    deles fica de fora (refine a busca ou os filtros para alcançá-lo).
+    """
+    expressao = expressao_busca(request.args.get('q', ''))
+    if not expressao: return jsonify({"erro": f"Informe ao menos uma palavra com {MINIMO_BUSCA} letras"}), 400
+    try:
+        limite = max(1, min(int(request.args.get('limite', LIMITE_PADRAO)), LIMITE_MAXIMO))
+        query = filtrar_lancamentos(Lancamento.query, request.args)
+    except (ValueError, TypeError) as e:
+        return jsonify({"erro": f"Parâmetro inválido: {str(e)}"}), 400
+
+    # O FTS5 entrega as ocorrências em ordem decrescente de rowid (sem ordenar) e a leitura
+    # para nos BUSCA_CANDIDATOS primeiros que passam nos filtros; só eles calculam o rank
+    candidatos = (query.join(lancamento_busca, lancamento_busca.c.rowid == Lancamento.id)
+                  .filter(literal_column('lancamento_busca').op('MATCH')(expressao))
+                  .with_entities(Lancamento.id.label('id'), lancamento_busca.c.rank.label('rank'))
+                  .order_by(lancamento_busca.c.rowid.desc()).limit(BUSCA_CANDIDATOS).subquery())
+    pagina = (consulta_serializada(Lancamento.query.join(candidatos, candidatos.c.id == Lancamento.id))
+              .order_by(candidatos.c.rank, Lancamento.data.desc(), Lancamento.id.desc()).limit(limite).all())
+    return Response(stream_with_context(stream_json_lista(pagina, cache_dimensoes.obter())), mimetype='application/json')
 
 @app.route('/api/lancamentos', methods=['POST'])
 @login_required
 def criar_lanc():
+    f = request.form; nome_arq = temporario = None
     try:
-        f = request.form; nome_arq = None
         if 'arquivo' in request.files:
             arq = request.files['arquivo']
             if arq.filename:
-                nome_arq = str(int(time.time())) + "_" + secure_filename(arq.filename)
-                arq.save(os.path.join(app.config['UPLOAD_FOLDER'], nome_arq))
+                # Grava em pedaços calculando o sha256; o arquivo vai para o lugar definitivo após o commit
+                nome_arq, temporario = armazem.receber(arq.stream, arq.filename)
         
         cat = int(f.get('categoria_id')) if f.get('categoria_id') and f.get('categoria_id') != 'null' else None
         
@@ -362,88 +1212,617 @@ def criar_lanc():
         c_raw = f.get('conta_id')
         conta_id = int(c_raw) if c_raw and c_raw != 'null' else None
 
-        db.session.add(Lancamento(
-            data=f.get('data'), 
+        l = Lancamento(
+            data=date.fromisoformat(f.get('data')), 
             descricao=f.get('descricao'), 
             tipo_id=int(f.get('tipo_id')), 
             subtipo_id=int(f.get('subtipo_id')), 
             categoria_id=cat, 
             conta_id=conta_id,
-            valor=float(f.get('valor')), 
+            valor_centavos=centavos(f.get('valor')), 
             efetivado=False, 
             comprovante=nome_arq
-        ))
-        db.session.commit(); return jsonify({"msg":"ok"}), 201
-    except Exception as e: return jsonify({"erro": str(e)}), 400
+        )
+        if not (pertence("tipos", l.tipo_id) and pertence("subtipos", l.subtipo_id) and pertence("categorias", cat) and pertence("contas", conta_id)):
+            raise ValueError("Conta, tipo, subtipo ou categoria inexistente")
+        db.session.add(l); acumular_resumo(l, 1)
+        db.session.flush(); publicar('lancamento', acao='criado', item=l.to_dict())
+        db.session.commit()
+        if temporario: armazem.promover(temporario, nome_arq)
+        return jsonify({"msg":"ok"}), 201
+    except Exception as e:
+        db.session.rollback(); armazem.descartar(temporario)
+        return jsonify({"erro": str(e)}), 400
+
+# --- IMPORTAÇÃO DE EXTRATOS ---
+SINONIMOS_TIPO = {"entrada": "entrada", "receita": "entrada", "credito": "entrada", "c": "entrada",
+                  "saida": "saida", "despesa": "saida", "debito": "saida", "d": "saida"}
+SUBTIPO_IMPORTACAO = "Importados"
+
+class MapeadorDimensoes:
+    """Resolve nomes de tipo/subtipo/categoria/conta em ids usando o cache de dimensões."""
+
+    def __init__(self, conta_padrao_id):
+        from importacao import normalizar
+        self.normalizar = normalizar
+        dims = cache_dimensoes.obter()
+        self.tipos = {normalizar(t["nome"]): t["id"] for t in dims["tipos"].values()}
+        self.subtipos = {(s["tipo_id"], normalizar(s["nome"])): s["id"] for s in dims["subtipos"].values()}
+        self.categorias = {(c["subtipo_id"], normalizar(c["nome"])): c["id"] for c in dims["categorias"].values()}
+        self.contas = {normalizar(c["nome"]): c["id"] for c in dims["contas"].values()}
+        self.conta_padrao_id = conta_padrao_id
+
+    def tipo(self, nome, valor_centavos):
+        chave = SINONIMOS_TIPO.get(self.normalizar(nome)) if nome else None
+        chave = chave or ("saida" if valor_centavos < 0 else "entrada")
+        return self.tipos[chave]
+
+    def subtipo(self, tipo_id, nome):
+        sid = self.subtipos.get((tipo_id, self.normalizar(nome))) if nome else None
+        if sid: return sid
+        # Sem subtipo reconhecido: usa (e cria na primeira vez) o subtipo "Importados" do tipo
+        chave = (tipo_id, self.normalizar(SUBTIPO_IMPORTACAO))
+        if chave not in self.subtipos:
+            novo = Subtipo(nome=SUBTIPO_IMPORTACAO, tipo_id=tipo_id); db.session.add(novo); db.session.flush()
+            invalidar_dimensoes(); self.subtipos[chave] = novo.id
+        return self.subtipos[chave]
+
+    def categoria(self, subtipo_id, nome):
+        return self.categorias.get((subtipo_id, self.normalizar(nome))) if nome else None
+
+    def conta(self, nome):
+        return self.contas.get(self.normalizar(nome), self.conta_padrao_id) if nome else self.conta_padrao_id
+
+def importar_lancamentos(lotes, conta_padrao_id=None, efetivado=True):
+    """Grava os lotes lidos de um extrato: um executemany e um commit por lote.
+
+    Linhas já importadas antes (mesmo hash) são ignoradas. O hash considera data, valor,
+    descrição, conta e a ordem da linha entre as idênticas do mesmo arquivo, para que
+    duas compras iguais no mesmo dia não virem uma só; no OFX usa o FITID do banco.
+    """
+    mapa = MapeadorDimensoes(conta_padrao_id); ocorrencias = {}
+    stats = {"lidos": 0, "importados": 0, "duplicados": 0}
+    for lote in lotes:
+        linhas = {}
+        for r in lote:
+            tipo_id = mapa.tipo(r["tipo"], r["valor_centavos"]); subtipo_id = mapa.subtipo(tipo_id, r["subtipo"])
+            conta_id = mapa.conta(r["conta"])
+            if r["id_externo"]:
+                base = f"ofx|{conta_id}|{r['id_externo']}"
+            else:
+                base = f"{r['data']}|{r['valor_centavos']}|{mapa.normalizar(r['descricao'])}|{conta_id}"
+                ocorrencias[base] = ocorrencias.get(base, 0) + 1; base += f"|{ocorrencias[base]}"
+            h = hashlib.sha1(base.encode()).hexdigest()
+            linhas[h] = dict(data=r["data"], descricao=r["descricao"] or "-", tipo_id=tipo_id, subtipo_id=subtipo_id,
+                             categoria_id=mapa.categoria(subtipo_id, r["categoria"]), conta_id=conta_id,
+                             valor_centavos=abs(r["valor_centavos"]), efetivado=efetivado, comprovante=None, hash_importacao=h, usuario_id=usuario_atual())
+        stats["lidos"] += len(lote)
+
+        existentes = {h for (h,) in db.session.query(Lancamento.hash_importacao).filter(Lancamento.hash_importacao.in_(list(linhas)))}
+        novos = [l for h, l in linhas.items() if h not in existentes]
+        stats["duplicados"] += len(lote) - len(novos)
+        if novos:
+            db.session.execute(db.insert(Lancamento), novos)
+            deltas = {}
+            for l in novos:
+                d = deltas.setdefault(chave_resumo(l["data"], l["tipo_id"], l["subtipo_id"], l["categoria_id"], l["conta_id"], l["efetivado"]), [0, 0])
+                d[0] += l["valor_centavos"]; d[1] += 1
+            acumular_resumo_lote(deltas)
+            publicar('lancamentos', meses=meses_de(l["data"] for l in novos))
+        db.session.commit()
+        stats["importados"] += len(novos)
+    return stats
+
+@app.route('/api/lancamentos/import', methods=['POST'])
+@login_required
+def importar_extrato():
+    arq = request.files.get('arquivo')
+    if not arq or not arq.filename: return jsonify({"erro": "Nenhum arquivo enviado"}), 400
+    c_raw = request.form.get('conta_id')
+    conta_id = int(c_raw) if c_raw and c_raw != 'null' else None
+    if not pertence("contas", conta_id): return jsonify({"erro": "Conta não encontrada"}), 400
+    efetivado = request.form.get('efetivado', '1').lower() in ('1', 'true', 'sim')
+    from importacao import ler_extrato, ErroImportacao
+    erros = []
+    try:
+        stats = importar_lancamentos(ler_extrato(arq.stream, arq.filename, erros), conta_id, efetivado)
+    except ErroImportacao as e:
+        db.session.rollback()
+        return jsonify({"erro": str(e)}), 400
+    return jsonify({**stats, "erros": erros[:50], "total_erros": len(erros)})
 
 @app.route('/api/lancamentos/<int:id>', methods=['DELETE'])
 @login_required
 def del_lanc(id):
     l = db.session.get(Lancamento, id)
-    if l: db.session.delete(l); db.session.commit()
+    if l:
+        comprovante = l.comprovante
+        acumular_resumo(l, -1); db.session.delete(l)
+        publicar('lancamento', acao='excluido', item={"id": l.id, "data": l.data.isoformat(), "conta_id": l.conta_id, "efetivado": l.efetivado})
+        db.session.commit()
+        remover_comprovantes_orfaos([comprovante])
     return jsonify({"msg":"ok"})
 
 @app.route('/api/lancamentos/<int:id>/status', methods=['PATCH'])
 @login_required
 def status_lanc(id):
     l = db.session.get(Lancamento, id)
-    if l: l.efetivado = not l.efetivado; db.session.commit()
+    if not l: return jsonify({"erro": "Lançamento não encontrado"}), 404
+    acumular_resumo(l, -1); l.efetivado = not l.efetivado; acumular_resumo(l, 1); publicar('lancamento', acao='alterado', item=l.to_dict()); db.session.commit()
     return jsonify(l.to_dict())
 
+# --- RECORRÊNCIAS ---
+# Vencimentos com valor e subtipo geram lançamentos pendentes do mês atual até
+# RECORRENCIA_MESES meses à frente; a previsão de caixa projeta o restante sem gravar nada.
+MESES_RECORRENCIA = int(os.getenv('RECORRENCIA_MESES', 3))
+LOTE_RECORRENCIA = 500
+
+def vencimentos_recorrentes(ids=None, conta_id=None):
+    q = Vencimento.query.filter(Vencimento.ativo == True, Vencimento.valor_centavos.isnot(None), Vencimento.subtipo_id.isnot(None))
+    if ids is not None: q = q.filter(Vencimento.id.in_(ids))
+    if conta_id: q = q.filter(Vencimento.conta_id == conta_id)
+    return q.all()
+
+def ocorrencias_pendentes(vencimentos, hoje, meses):
+    """[(vencimento, data, competencia)] ainda não geradas no horizonte, em ordem de vencimento.
+
+    Os fixos saem de uma única matriz vencimentos x meses (recorrencia.ocorrencias_fixas);
+    datas que já passaram não entram, nem meses até o gerado_ate de cada vencimento.
+    """
+    from recorrencia import ocorrencias_fixas, serie_meses, para_date
+    serie = serie_meses(hoje, meses); ultimo = para_date(serie[-1])
+    fixos = [v for v in vencimentos if v.tipo == 'fixo' and v.dia]
+    res = []
+    if fixos:
+        datas, mascara = ocorrencias_fixas([v.dia for v in fixos], [v.gerado_ate or 'NaT' for v in fixos], hoje, serie, hoje)
+        for i, j in zip(*mascara.nonzero()):
+            res.append((fixos[i], para_date(datas[i, j]), para_date(serie[j])))
+    for v in vencimentos:
+        if v.tipo != 'variavel' or not v.data_vencimento or v.data_vencimento < hoje: continue
+        competencia = v.data_vencimento.replace(day=1)
+        if competencia <= ultimo and (not v.gerado_ate or competencia > v.gerado_ate): res.append((v, v.data_vencimento, competencia))
+    return res
+
+def projetar_vencimentos(hoje=None, meses=None, ids=None):
+    """Grava como pendentes os lançamentos dos vencimentos recorrentes ativos. Devolve quantos criou.
+
+    Idempotente: INSERT OR IGNORE na chave (vencimento_id, competencia), em lotes. O RETURNING
+    devolve só as linhas de fato inseridas, e só elas entram no resumo mensal; duas gerações
+    simultâneas não duplicam nada. O gerado_ate de cada vencimento avança até o fim do horizonte.
+    Sem dono corrente (worker, CLI) gera para todos: cada linha leva o dono do vencimento.
+    """
+    from recorrencia import serie_meses, para_date
+    hoje = hoje or date.today(); meses = meses or MESES_RECORRENCIA
+    vencimentos = vencimentos_recorrentes(ids)
+    if not vencimentos: return 0
+    saida = db.session.query(Tipo.id).filter_by(nome="Saída").scalar() or 2
+    linhas = [dict(data=data, descricao=v.descricao, tipo_id=v.tipo_id or saida, subtipo_id=v.subtipo_id, categoria_id=v.categoria_id,
+                   conta_id=v.conta_id, valor_centavos=v.valor_centavos, efetivado=False, comprovante=None, vencimento_id=v.id, competencia=competencia,
+                   usuario_id=v.usuario_id)
+              for v, data, competencia in ocorrencias_pendentes(vencimentos, hoje, meses)]
+    stmt = sqlite_insert(Lancamento).on_conflict_do_nothing(index_elements=['vencimento_id', 'competencia']).returning(
+        Lancamento.usuario_id, Lancamento.data, Lancamento.tipo_id, Lancamento.subtipo_id, Lancamento.categoria_id, Lancamento.conta_id, Lancamento.valor_centavos)
+    criados = 0; datas = {}
+    for i in range(0, len(linhas), LOTE_RECORRENCIA):
+        deltas = {}
+        for uid, data, tipo_id, subtipo_id, categoria_id, conta_id, valor in db.session.connection().execute(stmt, linhas[i:i + LOTE_RECORRENCIA]):
+            d = deltas.setdefault(chave_resumo(data, tipo_id, subtipo_id, categoria_id, conta_id, False, uid), [0, 0])
+            d[0] += valor; d[1] += 1; criados += 1; datas.setdefault(uid, set()).add(data)
+        acumular_resumo_lote(deltas)
+    for uid, datas_usuario in datas.items(): publicar('lancamentos', usuario_id=uid, meses=meses_de(datas_usuario))
+    ultimo = para_date(serie_meses(hoje, meses)[-1])
+    for v in vencimentos:
+        alcance = ultimo if v.tipo == 'fixo' else min(v.data_vencimento.replace(day=1), ultimo) if v.data_vencimento else None
+        if alcance and (not v.gerado_ate or alcance > v.gerado_ate): v.gerado_ate = alcance
+    db.session.commit()
+    return criados
+
+def remover_gerados(v, hoje):
+    """Apaga os lançamentos do vencimento que ainda estão pendentes, de hoje em diante."""
+    q = Lancamento.query.filter(Lancamento.vencimento_id == v.id, Lancamento.efetivado == False, Lancamento.data >= hoje)
+    deltas = {}; datas = set()
+    for l in q:
+        d = deltas.setdefault(chave_resumo(l.data, l.tipo_id, l.subtipo_id, l.categoria_id, l.conta_id, False), [0, 0])
+        d[0] -= l.valor_centavos; d[1] -= 1; datas.add(l.data)
+    q.delete(synchronize_session=False)
+    acumular_resumo_lote(deltas)
+    if deltas: ResumoMensal.query.filter(ResumoMensal.quantidade == 0).delete(); publicar('lancamentos', meses=meses_de(datas))
+
+def previsao_caixa(hoje, meses, conta_id=None):
+    """Saldo projetado por mês: saldo de hoje + lançamentos que ainda não entraram nele
+    (pendentes do mês atual em diante e efetivados com data futura) + ocorrências ainda
+    não geradas dos vencimentos recorrentes. Tudo é somado em arrays (recorrencia.prever_caixa).
+    """
+    import numpy as np
+    from recorrencia import ocorrencias_fixas, prever_caixa, serie_meses, para_date
+    contas = [c for c in cache_dimensoes.obter()["contas"].values() if not conta_id or c["id"] == conta_id]
+    saldo = sum(saldo_atual(c, hoje) for c in contas)
+    entrada = id_tipo_entrada()
+    fim = para_date(serie_meses(hoje, meses + 1)[-1])
+    sinal = case((Lancamento.tipo_id == entrada, Lancamento.valor_centavos), else_=-Lancamento.valor_centavos)
+    q = db.session.query(Lancamento.data, func.sum(sinal)).filter(
+        Lancamento.data >= hoje.replace(day=1), Lancamento.data < fim, or_(Lancamento.efetivado == False, Lancamento.data > hoje))
+    if conta_id: q = q.filter(Lancamento.conta_id == conta_id)
+    lancados = q.group_by(Lancamento.data).all()
+    fluxos = [(np.array([d for d, _ in lancados], dtype='datetime64[D]'), np.array([v for _, v in lancados], dtype=np.int64))]
+
+    vencimentos = vencimentos_recorrentes(conta_id=conta_id)
+    valores = {v.id: v.valor_centavos if v.tipo_id == entrada else -v.valor_centavos for v in vencimentos}
+    fixos = [v for v in vencimentos if v.tipo == 'fixo' and v.dia]
+    if fixos:
+        datas, mascara = ocorrencias_fixas([v.dia for v in fixos], [v.gerado_ate or 'NaT' for v in fixos], hoje, serie_meses(hoje, meses), hoje)
+        por_vencimento = np.array([valores[v.id] for v in fixos], dtype=np.int64)[:, None]
+        fluxos.append((datas[mascara], np.broadcast_to(por_vencimento, datas.shape)[mascara]))
+    variaveis = [(v, d) for v, d, _ in ocorrencias_pendentes([v for v in vencimentos if v.tipo == 'variavel'], hoje, meses)]
+    fluxos.append((np.array([d for _, d in variaveis], dtype='datetime64[D]'), np.array([valores[v.id] for v, _ in variaveis], dtype=np.int64)))
+
+    r = prever_caixa(hoje, meses, saldo, fluxos)
+    return {"hoje": hoje.isoformat(), "saldo_atual": reais(saldo), "meses": [
+        {"mes": str(m), "entradas": reais(int(e)), "saidas": reais(int(s)), "saldo": reais(int(f)),
+         "saldo_minimo": reais(int(mi)), "dia_saldo_minimo": str(dm)}
+        for m, e, s, f, mi, dm in zip(r["meses"], r["entradas"], r["saidas"], r["saldo"], r["saldo_minimo"], r["dia_minimo"])]}
+
 @app.route('/api/vencimentos', methods=['GET', 'POST'])
 @login_required
 def api_venc():
     if request.method == 'GET': return jsonify([v.to_dict() for v in Vencimento.query.all()])
-    d = request.json; db.session.add(Vencimento(descricao=d['descricao'], tipo=d['tipo'], dia=d.get('dia'), data_vencimento=d.get('data_vencimento'))); db.session.commit(); return jsonify({"msg":"ok"})
+    d = request.json
+    try:
+        v = Vencimento(descricao=d['descricao'], tipo=d['tipo'], dia=d.get('dia'), data_vencimento=date.fromisoformat(d['data_vencimento']) if d.get('data_vencimento') else None)
+        if v.tipo == 'fixo' and not 1 <= int(v.dia or 0) <= 31: return jsonify({"erro": "Dia do vencimento deve estar entre 1 e 31"}), 400
+        if d.get('valor') not in (None, ''):
+            # O tipo (entrada/saída) vem do subtipo; conta e categoria são opcionais
+            subtipo = cache_dimensoes.obter()["subtipos"].get(int(d.get('subtipo_id') or 0))
+            if not subtipo: return jsonify({"erro": "Informe o subtipo para gerar os lançamentos"}), 400
+            v.valor_centavos = abs(centavos(d['valor'])); v.subtipo_id = subtipo["id"]; v.tipo_id = subtipo["tipo_id"]
+            v.categoria_id = int(d['categoria_id']) if d.get('categoria_id') else None
+            v.conta_id = int(d['conta_id']) if d.get('conta_id') else None
+            if not (pertence("categorias", v.categoria_id) and pertence("contas", v.conta_id)): return jsonify({"erro": "Conta ou categoria não encontrada"}), 400
+    except (KeyError, ValueError, TypeError, ArithmeticError) as e:
+        return jsonify({"erro": f"Dados inválidos: {str(e)}"}), 400
+    db.session.add(v); invalidar_vencimentos(); publicar('vencimentos'); db.session.commit(); return jsonify({"msg":"ok"})
 
 @app.route('/api/vencimentos/<int:id>/toggle', methods=['PATCH'])
 @login_required
 def toggle_v(id):
     v = db.session.get(Vencimento, id); 
-    if v: v.ativo = not v.ativo; db.session.commit()
+    if v:
+        v.ativo = not v.ativo; invalidar_vencimentos(); publicar('vencimentos')
+        # Desativado: some com o que ainda não foi pago; reativado, volta a gerar a partir de hoje
+        if not v.ativo: remover_gerados(v, date.today()); v.gerado_ate = None
+        db.session.commit()
+        if v.ativo: projetar_vencimentos(ids=[v.id])
     return jsonify({"msg":"ok"})
 
 @app.route('/api/vencimentos/<int:id>', methods=['DELETE'])
 @login_required
 def del_v(id):
     v = db.session.get(Vencimento, id); 
-    if v: db.session.delete(v); db.session.commit()
+    if v:
+        remover_gerados(v, date.today())
+        # Os lançamentos já pagos ficam, sem o vínculo
+        Lancamento.query.filter_by(vencimento_id=v.id).update({"vencimento_id": None}, synchronize_session=False)
+        db.session.delete(v); invalidar_vencimentos(); publicar('vencimentos'); db.session.commit()
     return jsonify({"msg":"ok"})
 
+@app.route('/api/vencimentos/gerar', methods=['POST'])
+@login_required
+def gerar_recorrencias():
+    """Gera os lançamentos pendentes dos vencimentos recorrentes. ?meses=3"""
+    try: meses = max(1, min(int(request.args.get('meses', MESES_RECORRENCIA)), 24))
+    except ValueError as e: return jsonify({"erro": f"Parâmetro inválido: {str(e)}"}), 400
+    return jsonify({"criados": projetar_vencimentos(meses=meses)})
+
+@app.route('/api/previsao', methods=['GET'])
+@login_required
+def get_previsao():
+    """Previsão de caixa mês a mês. ?meses=12&conta_id=&ate=AAAA-MM-DD (data de partida)"""
+    try:
+        hoje = date.fromisoformat(request.args['ate']) if request.args.get('ate') else date.today()
+        meses = max(1, min(int(request.args.get('meses', 12)), 120))
+        conta_id = int(request.args['conta_id']) if request.args.get('conta_id') else None
+    except ValueError as e:
+        return jsonify({"erro": f"Parâmetro inválido: {str(e)}"}), 400
+    return jsonify(previsao_caixa(hoje, meses, conta_id))
+
 @app.route('/api/planejamento', methods=['GET'])
 @login_required
 def get_planejamento():
-    ano = request.args.get('ano', datetime.now().year); arvore = {}
-    sql = db.session.query(Tipo.nome, Subtipo.nome, Categoria.nome, Lancamento.data, Lancamento.valor).join(Tipo, Lancamento.tipo_id == Tipo.id).join(Subtipo, Lancamento.subtipo_id == Subtipo.id).outerjoin(Categoria, Lancamento.categoria_id == Categoria.id).filter(Lancamento.data.like(f'{ano}-%')).all()
-    for t, s, c, d, v in sql:
-        mes = int(d.split('-')[1]) - 1; c = c or "Outros"
+    try: ano = ler_ano(request.args)
+    except ValueError as e: return jsonify({"erro": f"Parâmetro inválido: {str(e)}"}), 400
+    return jsonify(arvore_planejamento(ano))
+
+def ler_ano(args):
+    """?ano= (padrão: o ano atual); ValueError se não for um ano de 1 a 9999."""
+    ano = int(args.get('ano', datetime.now().year))
+    if not 1 <= ano <= 9999: raise ValueError(f"ano fora do intervalo: {ano}")
+    return ano
+
+def arvore_planejamento(ano):
+    """{tipo: {subtipo: {categoria: [12 totais mensais]}}} do ano, a partir do resumo mensal."""
+    arvore = {}; dims = cache_dimensoes.obter()
+    sql = db.session.query(ResumoMensal.tipo_id, ResumoMensal.subtipo_id, ResumoMensal.categoria_id, ResumoMensal.mes, func.sum(ResumoMensal.total_centavos)).filter(ResumoMensal.ano == ano).group_by(ResumoMensal.tipo_id, ResumoMensal.subtipo_id, ResumoMensal.categoria_id, ResumoMensal.mes).all()
+    for tid, sid, cid, mes, v in sql:
+        t = dims["tipos"].get(tid); s = dims["subtipos"].get(sid)
+        if not t or not s: continue
+        t = t["nome"]; s = s["nome"]; c = nome_dim("categorias", cid, "Outros")
         if t not in arvore: arvore[t] = {}
         if s not in arvore[t]: arvore[t][s] = {}
         if c not in arvore[t][s]: arvore[t][s][c] = [0.0]*12
-        arvore[t][s][c][mes] += v
-    return jsonify(arvore)
+        arvore[t][s][c][mes - 1] += reais(v)
+    return arvore
+
+@app.route('/api/resumo', methods=['GET'])
+@login_required
+def get_resumo():
+    """Cartões e gráficos do dashboard para um mês (e conta opcional), lidos do resumo mensal."""
+    try:
+        ano, mes = (int(p) for p in request.args.get('mes', datetime.now().strftime('%Y-%m')).split('-'))
+        conta_id = int(request.args['conta_id']) if request.args.get('conta_id') else None
+    except ValueError as e:
+        return jsonify({"erro": f"Parâmetro inválido: {str(e)}"}), 400
+
+    q = db.session.query(ResumoMensal.tipo_id, ResumoMensal.subtipo_id, ResumoMensal.categoria_id, ResumoMensal.conta_id, func.sum(ResumoMensal.total_centavos)).filter(ResumoMensal.ano == ano, ResumoMensal.mes == mes, ResumoMensal.efetivado == True)
+    if conta_id: q = q.filter(ResumoMensal.conta_id == conta_id)
+    dims = cache_dimensoes.obter()
+    res = {"entradas": 0.0, "saidas": 0.0, "saldo_disponivel": 0.0, "fatura": 0.0, "graficos": {}}
+    for tid, sid, cid, contid, v in q.group_by(ResumoMensal.tipo_id, ResumoMensal.subtipo_id, ResumoMensal.categoria_id, ResumoMensal.conta_id).all():
+        v = reais(v); tipo = nome_dim("tipos", tid, "N/A"); entrada = tipo == "Entrada"
+        conta = dims["contas"].get(contid); credito = conta is not None and conta["tipo"] == 'cartao_credito'
+        res["entradas" if entrada else "saidas"] += v
+        if credito: res["fatura"] += -v if entrada else v
+        else: res["saldo_disponivel"] += v if entrada else -v
+        graf = res["graficos"].setdefault(tipo, {"subtipo": {}, "categoria": {}})
+        s = nome_dim("subtipos", sid, "Outros"); c = nome_dim("categorias", cid, "Outros")
+        graf["subtipo"][s] = graf["subtipo"].get(s, 0.0) + v
+        graf["categoria"][c] = graf["categoria"].get(c, 0.0) + v
+    return jsonify(res)
 
 @app.route('/api/anos_disponiveis', methods=['GET'])
 @login_required
 def get_anos():
-    q = db.session.query(func.substr(Lancamento.data, 1, 4)).distinct().all(); anos = [int(a[0]) for a in q if a[0]]; 
+    # Salta de ano em ano pelo índice de data: uma busca MIN(data) por ano existente
+    anos = []; proximo = db.session.query(func.min(Lancamento.data)).scalar()
+    while proximo:
+        anos.append(proximo.year)
+        proximo = db.session.query(func.min(Lancamento.data)).filter(Lancamento.data >= date(proximo.year + 1, 1, 1)).scalar()
     if not anos: anos.append(datetime.now().year)
-    return jsonify(sorted(list(set(anos))))
+    return jsonify(anos)
+
+# --- MOTOR DE SALDOS ---
+def id_tipo_entrada():
+    return next((t["id"] for t in cache_dimensoes.obter()["tipos"].values() if t["nome"] == "Entrada"), 1)
+
+def mes_anterior(ano, mes): return (ano - 1, 12) if mes == 1 else (ano, mes - 1)
+
+def movimento_mensal(conta_id, depois_de=None, ate=None):
+    """[((ano, mes), centavos)] dos efetivados da conta, mês a mês, lidos do resumo mensal."""
+    sinal = case((ResumoMensal.tipo_id == id_tipo_entrada(), ResumoMensal.total_centavos), else_=-ResumoMensal.total_centavos)
+    q = db.session.query(ResumoMensal.ano, ResumoMensal.mes, func.sum(sinal)).filter(ResumoMensal.conta_id == conta_id, ResumoMensal.efetivado == True)
+    if depois_de: q = q.filter(tuple_(ResumoMensal.ano, ResumoMensal.mes) > depois_de)
+    if ate: q = q.filter(tuple_(ResumoMensal.ano, ResumoMensal.mes) <= ate)
+    return [((a, m), v) for a, m, v in q.group_by(ResumoMensal.ano, ResumoMensal.mes).order_by(ResumoMensal.ano, ResumoMensal.mes)]
+
+def gravar_pontos_saldo(pontos, chave, versao):
+    # Cada INSERT só acontece se a versão 'saldos' do dono ainda for a lida antes do cálculo: se um
+    # lançamento foi gravado no meio do caminho, os pontos calculados são descartados
+    if not pontos or versao is None: return
+    db.session.execute(text(
+        "INSERT OR IGNORE INTO saldo_mensal (conta_id, ano, mes, acumulado_centavos) "
+        "SELECT :conta_id, :ano, :mes, :acumulado_centavos FROM metadado WHERE chave = :chave AND valor = :versao"),
+        [dict(p, chave=chave, versao=versao) for p in pontos])
+    db.session.commit()
+
+def acumulado_ate(conta_id, ate):
+    """Soma dos efetivados da conta até o fim do mês `ate`: último ponto de controle + meses seguintes.
+
+    Os meses percorridos viram pontos de controle; as próximas consultas leem só o último.
+    """
+    chave = chave_usuario('saldos'); versao = ler_versao(chave)
+    ponto = SaldoMensal.query.filter(SaldoMensal.conta_id == conta_id, tuple_(SaldoMensal.ano, SaldoMensal.mes) <= ate) \
+        .order_by(SaldoMensal.ano.desc(), SaldoMensal.mes.desc()).first()
+    if ponto and (ponto.ano, ponto.mes) == ate: return ponto.acumulado_centavos
+    acumulado = ponto.acumulado_centavos if ponto else 0; novos = []
+    for (ano, mes), v in movimento_mensal(conta_id, (ponto.ano, ponto.mes) if ponto else None, ate):
+        acumulado += v; novos.append({"conta_id": conta_id, "ano": ano, "mes": mes, "acumulado_centavos": acumulado})
+    if not novos or (novos[-1]["ano"], novos[-1]["mes"]) != ate:
+        novos.append({"conta_id": conta_id, "ano": ate[0], "mes": ate[1], "acumulado_centavos": acumulado})
+    gravar_pontos_saldo(novos, chave, versao)
+    return acumulado
+
+def saldo_atual(conta, hoje):
+    """Saldo inicial + ponto de controle do mês passado + efetivados deste mês até hoje."""
+    anterior = acumulado_ate(conta["id"], mes_anterior(hoje.year, hoje.month))
+    sinal = case((Lancamento.tipo_id == id_tipo_entrada(), Lancamento.valor_centavos), else_=-Lancamento.valor_centavos)
+    mes_corrente = db.session.query(func.coalesce(func.sum(sinal), 0)).filter(
+        Lancamento.conta_id == conta["id"], Lancamento.efetivado == True,
+        Lancamento.data >= hoje.replace(day=1), Lancamento.data <= hoje).scalar()
+    return centavos(conta["saldo_inicial"]) + anterior + mes_corrente
+
+def historico_saldos(conta, hoje, meses):
+    """Saldo no fim de cada um dos últimos `meses` meses (o atual inclusive)."""
+    inicio = (hoje.year, hoje.month)
+    for _ in range(meses - 1): inicio = mes_anterior(*inicio)
+    saldo = centavos(conta["saldo_inicial"]) + acumulado_ate(conta["id"], mes_anterior(*inicio))
+    movimento = dict(movimento_mensal(conta["id"], mes_anterior(*inicio), (hoje.year, hoje.month)))
+    serie, atual = [], inicio
+    for _ in range(meses):
+        saldo += movimento.get(atual, 0)
+        serie.append({"mes": f"{atual[0]}-{atual[1]:02d}", "saldo": reais(saldo)})
+        atual = (atual[0] + 1, 1) if atual[1] == 12 else (atual[0], atual[1] + 1)
+    return serie
+
+def data_fechamento(ano, mes, dia):
+    return date(ano, mes, min(dia or 31, calendar.monthrange(ano, mes)[1]))
+
+def faturas_cartao(conta, hoje, quantidade):
+    """Totais das últimas `quantidade` faturas do cartão, da aberta hoje para trás.
+
+    Cada fatura vai do dia seguinte ao fechamento anterior até o fechamento. Pagamentos
+    (categoria "Pagamento de Fatura") aparecem à parte e não abatem o total da fatura.
+    """
+    dia = conta.get("dia_fechamento"); ano, mes = hoje.year, hoje.month
+    if hoje > data_fechamento(ano, mes, dia): ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    fechamentos = []
+    for _ in range(quantidade + 1):
+        fechamentos.append(data_fechamento(ano, mes, dia)); ano, mes = mes_anterior(ano, mes)
+    fechamentos.reverse()
+    periodos = [(fechamentos[i] + timedelta(days=1), fechamentos[i + 1]) for i in range(quantidade)]
+
+    from importacao import normalizar
+    pagamento = {c["id"] for c in cache_dimensoes.obter()["categorias"].values() if normalizar(c["nome"]) == "pagamento de fatura"}
+    entrada = id_tipo_entrada()
+    linhas = db.session.query(Lancamento.data, Lancamento.tipo_id, Lancamento.categoria_id, func.sum(Lancamento.valor_centavos)).filter(
+        Lancamento.conta_id == conta["id"], Lancamento.efetivado == True,
+        Lancamento.data >= periodos[0][0], Lancamento.data <= periodos[-1][1]).group_by(Lancamento.data, Lancamento.tipo_id, Lancamento.categoria_id).all()
+    faturas = []
+    for inicio, fim in reversed(periodos):
+        f = {"compras": 0, "creditos": 0, "pagamentos": 0}
+        for data, tid, cid, v in linhas:
+            if not inicio <= data <= fim: continue
+            f["compras" if tid != entrada else "pagamentos" if cid in pagamento else "creditos"] += v
+        faturas.append({"inicio": inicio.isoformat(), "fechamento": fim.isoformat(), "aberta": inicio <= hoje <= fim,
+                        **{k: reais(v) for k, v in f.items()}, "total": reais(f["compras"] - f["creditos"])})
+    return faturas
+
+@app.route('/api/contas/saldos', methods=['GET'])
+@login_required
+def get_saldos():
+    """Saldo atual, histórico mensal e (cartões) faturas por conta. ?ate=AAAA-MM-DD&meses=12&faturas=6"""
+    try:
+        hoje = date.fromisoformat(request.args['ate']) if request.args.get('ate') else date.today()
+        meses = max(1, min(int(request.args.get('meses', 12)), 120))
+        qtd_faturas = max(1, min(int(request.args.get('faturas', 6)), 24))
+    except ValueError as e:
+        return jsonify({"erro": f"Parâmetro inválido: {str(e)}"}), 400
+
+    res = []
+    for conta in cache_dimensoes.obter()["contas"].values():
+        item = {**conta, "saldo": reais(saldo_atual(conta, hoje)), "historico": historico_saldos(conta, hoje, meses)}
+        if conta["tipo"] == 'cartao_credito': item["faturas"] = faturas_cartao(conta, hoje, qtd_faturas)
+        res.append(item)
+    return jsonify({"ate": hoje.isoformat(), "contas": res})
+
+# --- EXPORTAÇÃO (CSV / XLSX) ---
+LOTE_EXPORTACAO = 1000
+
+def linhas_exportacao(stmt, dims):
+    """Percorre o SELECT pelo cursor, LOTE_EXPORTACAO linhas por vez, sem carregar o resultado inteiro.
+
+    Usa uma conexão própria, fora da sessão: ela volta ao pool quando o download termina
+    ou quando o cliente desconecta (o Werkzeug fecha o gerador e o `with` é encerrado).
+    """
+    with db.engine.connect() as conn:
+        for _, data, descricao, tid, sid, cid, contid, v, efetivado, comprovante in conn.execution_options(yield_per=LOTE_EXPORTACAO).execute(stmt):
+            yield [data, descricao, nome_dim("tipos", tid, "N/A", dims), nome_dim("subtipos", sid, "N/A", dims), nome_dim("categorias", cid, "", dims),
+                   nome_dim("contas", contid, "", dims), reais(v), efetivado, comprovante]
+
+def resposta_planilha(formato, nome, cabecalho, linhas, titulo):
+    from exportacao import gerar_planilha, MIMETYPES
+    corpo = gerar_planilha(formato, cabecalho, linhas, titulo)
+    resp = Response(stream_with_context(corpo), mimetype=MIMETYPES[formato])
+    resp.headers['Content-Disposition'] = f'attachment; filename="{nome}.{formato}"'
+    return resp
+
+@app.route('/api/export/lancamentos', methods=['GET'])
+@login_required
+def exportar_lancamentos():
+    """Lançamentos filtrados (mesmos filtros de /api/lancamentos), do mais antigo para o mais recente."""
+    from exportacao import MIMETYPES, COLUNAS_LANCAMENTOS
+    formato = request.args.get('formato', 'csv')
+    if formato not in MIMETYPES: return jsonify({"erro": "Formato inválido (use csv ou xlsx)"}), 400
+    try:
+        # O SELECT roda numa conexão fora da sessão (sem o escopo automático): o dono vai no filtro
+        query = filtrar_lancamentos(Lancamento.query.filter(Lancamento.usuario_id == usuario_atual()), request.args)
+    except (ValueError, TypeError) as e:
+        return jsonify({"erro": f"Parâmetro inválido: {str(e)}"}), 400
+    stmt = consulta_serializada(query).order_by(Lancamento.data, Lancamento.id).statement
+    nome = f"lancamentos_{request.args.get('mes') or datetime.now().strftime('%Y-%m-%d')}"
+    return resposta_planilha(formato, nome, COLUNAS_LANCAMENTOS, linhas_exportacao(stmt, cache_dimensoes.obter()), "Lançamentos")
+
+@app.route('/api/export/planejamento', methods=['GET'])
+@login_required
+def exportar_planejamento():
+    from exportacao import MIMETYPES, COLUNAS_PLANEJAMENTO
+    formato = request.args.get('formato', 'xlsx')
+    if formato not in MIMETYPES: return jsonify({"erro": "Formato inválido (use csv ou xlsx)"}), 400
+    try: ano = ler_ano(request.args)
+    except ValueError as e: return jsonify({"erro": f"Parâmetro inválido: {str(e)}"}), 400
+    # O planejamento vem do resumo mensal (no máximo algumas centenas de linhas): monta antes do envio
+    linhas = [[t, s, c, *valores, round(sum(valores), 2)]
+              for t, subtipos in arvore_planejamento(ano).items() for s, categorias in subtipos.items() for c, valores in categorias.items()]
+    return resposta_planilha(formato, f"planejamento_{ano}", COLUNAS_PLANEJAMENTO, linhas, f"Planejamento {ano}")
 
 # --- ROTAS DE MANUTENÇÃO (BACKUP / RESTORE / RESET) ---
 
+# Tabelas que um arquivo precisa ter para ser aceito como backup deste sistema
+TABELAS_BACKUP = ('user', 'tipo', 'subtipo', 'lancamento')
+
+def caminho_banco(): return db.engine.url.database
+
+def arquivo_temporario():
+    fd, caminho = tempfile.mkstemp(dir=app.config['BACKUP_FOLDER'], suffix='.tmp'); os.close(fd)
+    return caminho
+
+def remover_arquivo(caminho):
+    if os.path.exists(caminho): os.remove(caminho)
+
+def stream_removendo(corpo, caminho):
+    """Repassa `corpo` e apaga `caminho` no fim: download completo, erro no meio ou cliente que desconectou."""
+    try:
+        yield from corpo
+    finally:
+        remover_arquivo(caminho)
+
+def preparar_restauracao(caminho):
+    """Migra e inicializa o banco extraído de um backup antes de ele substituir o banco em uso.
+
+    Usa um app Flask à parte, com o engine apontando para a cópia: se a migração falhar, o banco
+    em uso nem foi tocado, e os outros processos nunca leem um schema antigo.
+    """
+    copia = Flask(__name__)
+    copia.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + caminho
+    db.init_app(copia)
+    try:
+        inicializar_banco(copia)
+    finally:
+        # Fecha as conexões: o checkpoint leva o WAL da cópia de volta ao arquivo antes do aplicar_banco
+        with copia.app_context(): db.engine.dispose()
+
+def fazer_snapshot():
+    """Snapshot rotacionado em BACKUP_FOLDER (agendado no worker e via `flask --app app backup`)."""
+    from backup import criar_snapshot
+    with app.app_context():
+        return criar_snapshot(caminho_banco(), app.config['BACKUP_FOLDER'], app.config['BACKUP_MANTER'])
+
 @app.route('/api/manutencao/backup', methods=['GET'])
 @login_required
+@somente_admin
 def download_backup():
+    """Cópia consistente do banco comprimida em streaming: .db.gz, ou .tar.gz com os comprovantes (?uploads=1)."""
+    from backup import copiar_banco, stream_gzip, stream_tar_gz
+    copia = arquivo_temporario()
     try:
-        # Gera um nome com a data atual: backup_financeiro_2023-10-27.db
-        nome_arquivo = f"backup_financeiro_{datetime.now().strftime('%Y-%m-%d')}.db"
-        return send_file(db_path, as_attachment=True, download_name=nome_arquivo)
+        # API de backup do SQLite: lê por páginas sem bloquear as gravações em andamento
+        copiar_banco(caminho_banco(), copia)
     except Exception as e:
+        remover_arquivo(copia)
         return jsonify({"erro": f"Erro ao gerar backup: {str(e)}"}), 500
 
+    nome_arquivo = f"backup_financeiro_{datetime.now().strftime('%Y-%m-%d')}"
+    if request.args.get('uploads', '').lower() in ('1', 'true', 'sim'):
+        corpo = stream_tar_gz(copia, app.config['UPLOAD_FOLDER']); nome_arquivo += '.tar.gz'
+    else:
+        corpo = stream_gzip(copia); nome_arquivo += '.db.gz'
+    resp = Response(stream_removendo(corpo, copia), mimetype='application/gzip')
+    resp.headers['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    # O finally do gerador só roda se ele chegou a ser iniciado: a resposta descartada antes do primeiro pedaço cai aqui
+    resp.call_on_close(lambda: remover_arquivo(copia))
+    return resp
+
 @app.route('/api/manutencao/restore', methods=['POST'])
 @login_required
+@somente_admin
 def restore_backup():
     if 'arquivo' not in request.files:
         return jsonify({"erro": "Nenhum arquivo enviado"}), 400
@@ -452,43 +1831,173 @@ def restore_backup():
     if file.filename == '':
         return jsonify({"erro": "Arquivo vazio"}), 400
 
+    from backup import aplicar_banco, verificar_banco, extrair_banco, extrair_uploads, ErroBackup
+    novo = arquivo_temporario()
     try:
-        # Remove a sessão atual para liberar o arquivo do banco
-        db.session.remove()
-        
-        # Sobrescreve o banco de dados atual
-        file.save(db_path)
-        
-        return jsonify({"msg": "Backup restaurado com sucesso!"})
+        # Aceita .db, .db.gz ou o .tar.gz com comprovantes; valida antes de tocar no banco em uso
+        extrair_banco(file.stream, novo)
+        verificar_banco(novo, SCHEMA_VERSAO, TABELAS_BACKUP)
+        # Backups de versões antigas chegam ao banco em uso já migrados
+        preparar_restauracao(novo)
+
+        # Guarda o estado atual (dá para voltar atrás pelos snapshots) e troca o conteúdo
+        # numa única transação; os outros processos passam a ler o banco restaurado
+        fazer_snapshot()
+        db.session.remove(); db.engine.dispose()
+        aplicar_banco(novo, caminho_banco())
+        db.engine.dispose()
+        comprovantes = extrair_uploads(file.stream, app.config['UPLOAD_FOLDER'])
+
+        # Avisa os caches (web e bot) da troca
+        with como_usuario(None): invalidar_vencimentos(); publicar('recarregar')  # Para todos os usuários
+        db.session.commit()
+
+        msg = "Backup restaurado com sucesso!"
+        if comprovantes: msg += f" ({comprovantes} comprovantes)"
+        return jsonify({"msg": msg})
+    except (ErroBackup, ErroMigracao) as e:
+        return jsonify({"erro": f"Backup inválido: {str(e)}"}), 400
     except Exception as e:
         return jsonify({"erro": f"Erro ao restaurar: {str(e)}"}), 500
+    finally:
+        remover_arquivo(novo)
 
 @app.route('/api/manutencao/reset', methods=['DELETE'])
 @login_required
 def reset_sistema():
+    """Apaga os dados do usuário logado (ou da família dele); os dos outros usuários ficam."""
     try:
+        # Todas as consultas abaixo saem filtradas pelo dono (escopo_usuario)
+        comprovantes = [c for (c,) in db.session.query(Lancamento.comprovante).filter(Lancamento.comprovante.isnot(None)).distinct()]
+        contas = [c for (c,) in db.session.query(Conta.id)]
         # Apaga dados em ordem para respeitar chaves estrangeiras
         db.session.query(Lancamento).delete()
-        db.session.query(Vencimento).delete()
+        db.session.query(ResumoMensal).delete()
+        # Os pontos de saldo não têm dono: são os das contas dele
+        SaldoMensal.query.filter(SaldoMensal.conta_id.in_(contas)).delete(synchronize_session=False); trocar_versao(chave_usuario('saldos'))
+        db.session.query(Vencimento).delete(); invalidar_vencimentos()
         db.session.query(Categoria).delete()
         db.session.query(Subtipo).delete()
         
-        # Apaga contas (exceto se quiser manter a padrão, mas o inicializar_banco recria)
+        # Apaga contas (preparar_usuario recria a padrão)
         db.session.query(Conta).delete()
+        invalidar_dimensoes()
         
-        # Opcional: Apagar Tipos se quiser resetar tudo mesmo (o inicializar recria)
-        # db.session.query(Tipo).delete() 
+        # Os Tipos são comuns a todos os usuários e não são apagados
         
+        publicar('recarregar')
         db.session.commit()
         
-        # Recria as configurações iniciais (Tipos básicos e Conta Carteira)
-        inicializar_banco()
+        # Comprovantes que só os lançamentos apagados usavam
+        remover_comprovantes_orfaos(comprovantes)
+
+        # Recria as configurações iniciais (Conta Carteira, Transferências)
+        preparar_usuario(usuario_atual())
         
         return jsonify({"msg": "Sistema resetado com sucesso!"})
     except Exception as e:
         db.session.rollback()
         return jsonify({"erro": f"Erro ao resetar: {str(e)}"}), 500
 
+def com_banco(comando):
+    """Comandos do CLI: rodam com o banco pronto, mesmo num arquivo novo (ver garantir_banco)."""
+    @wraps(comando)
+    def executar(*args, **kwargs):
+        garantir_banco(); return comando(*args, **kwargs)
+    return executar
+
+@app.cli.command('inicializar-banco')
+def cli_inicializar_banco():
+    """Cria ou migra o schema e os cadastros comuns (idempotente; rodar no deploy)."""
+    inicio = time.perf_counter()
+    try: inicializar_banco()
+    except ErroMigracao as e: raise click.ClickException(str(e))
+    print(f"Banco pronto (schema {SCHEMA_VERSAO}) em {time.perf_counter() - inicio:.2f}s.")
+
+def dono_por_nome(username):
+    """Dono dos dados do usuário `username` (o primeiro cadastrado, se vazio), para o CLI."""
+    user = User.query.filter_by(username=username).first() if username else User.query.order_by(User.id).first()
+    if not user: raise click.ClickException(f"Usuário não encontrado: {username or '(nenhum cadastrado)'}")
+    return user.dono_id
+
+@app.cli.command('criar-usuario')
+@click.argument('username')
+@click.option('--senha', prompt=True, hide_input=True, confirmation_prompt=True)
+@click.option('--email', default=None)
+@click.option('--admin', is_flag=True, help='Pode baixar e restaurar backups do banco inteiro.')
+@click.option('--titular', default=None, help='Usuário cujos dados o novo usuário compartilha (família).')
+@com_banco
+def cli_criar_usuario(username, senha, email, admin, titular):
+    """Cadastra um usuário, com os dados próprios ou os do titular."""
+    if User.query.filter_by(username=username).first(): raise click.ClickException(f"Usuário já existe: {username}")
+    user = User(username=username, email=email, is_admin=admin, titular_id=dono_por_nome(titular) if titular else None)
+    user.set_password(senha); db.session.add(user); db.session.commit()
+    preparar_usuario(user.dono_id)
+    print(f"Usuário {username} criado (id {user.id}, dados do usuário {user.dono_id}).")
+
+@app.cli.command('vincular-telegram')
+@click.argument('username')
+@click.argument('chat_id', required=False)
+@com_banco
+def cli_vincular_telegram(username, chat_id):
+    """Liga o chat do Telegram ao usuário (sem CHAT_ID, desliga)."""
+    user = User.query.filter_by(username=username).first()
+    if not user: raise click.ClickException(f"Usuário não encontrado: {username}")
+    user.telegram_chat_id = chat_id; db.session.commit()
+    print(f"Chat {chat_id} vinculado a {username}." if chat_id else f"Telegram desvinculado de {username}.")
+
+@app.cli.command('reconstruir-resumo')
+@com_banco
+def cli_reconstruir_resumo():
+    """Recalcula a tabela de resumo mensal a partir dos lançamentos."""
+    reconstruir_resumo(); db.session.commit()
+    print("Resumo mensal reconstruído.")
+
+@app.cli.command('reconstruir-busca')
+@com_banco
+def cli_reconstruir_busca():
+    """Recria o índice de busca textual a partir dos lançamentos."""
+    reconstruir_busca(); db.session.commit()
+    print("Índice de busca reconstruído.")
+
+@app.cli.command('backup')
+@com_banco
+def cli_backup():
+    """Grava um snapshot do banco em BACKUP_DIR (se houve mudança desde o último)."""
+    nome = fazer_snapshot()
+    print(f"Snapshot criado: {nome}" if nome else "Nenhuma alteração desde o último snapshot.")
+
+@app.cli.command('limpar-comprovantes')
+@com_banco
+def cli_limpar_comprovantes():
+    """Apaga da pasta de uploads os arquivos que nenhum lançamento referencia."""
+    referenciados = {c for (c,) in db.session.query(Lancamento.comprovante).filter(Lancamento.comprovante.isnot(None)).distinct()}
+    print(f"{armazem.limpar_orfaos(referenciados)} arquivos órfãos removidos.")
+
+@app.cli.command('gerar-recorrencias')
+@click.option('--meses', type=int, default=None, help='Horizonte em meses (padrão: RECORRENCIA_MESES).')
+@com_banco
+def cli_gerar_recorrencias(meses):
+    """Gera os lançamentos pendentes dos vencimentos recorrentes."""
+    print(f"{projetar_vencimentos(meses=meses)} lançamentos gerados.")
+
+@app.cli.command('importar')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--conta', 'conta_id', type=int, help='Conta usada quando o extrato não informa a conta.')
+@click.option('--pendente', is_flag=True, help='Importa os lançamentos como não efetivados.')
+@click.option('--usuario', default=None, help='Dono dos lançamentos (padrão: o primeiro usuário cadastrado).')
+@com_banco
+def cli_importar(arquivo, conta_id, pendente, usuario):
+    """Importa um extrato CSV, XLSX ou OFX."""
+    from importacao import ler_extrato
+    inicio = time.perf_counter(); erros = []
+    with open(arquivo, 'rb') as f, como_usuario(dono_por_nome(usuario)):
+        if not pertence("contas", conta_id): raise click.ClickException(f"Conta {conta_id} não é do usuário")
+        stats = importar_lancamentos(ler_extrato(f, arquivo, erros), conta_id, not pendente)
+    for e in erros[:20]: print(f"  ! {e}")
+    print(f"{stats['lidos']} lidos, {stats['importados']} importados, {stats['duplicados']} duplicados, "
+          f"{len(erros)} com erro em {time.perf_counter() - inicio:.1f}s")
+
 if __name__ == "__main__":
-    t = threading.Thread(target=iniciar_bot); t.daemon = True; t.start()
+    inicializar_banco()
     app.run(host='0.0.0.0', debug=True, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,236 @@
+"""Backups online do SQLite: cópia consistente, compressão em streaming e rotação.
+
+As cópias usam a API de backup do SQLite (sqlite3.Connection.backup), que lê o
+banco em passos de algumas páginas numa conexão própria. Em modo WAL a leitura
+não bloqueia quem está gravando, e o resultado é sempre um retrato consistente
+do banco, ao contrário de copiar o arquivo enquanto ele é alterado.
+
+Este módulo não depende do Flask; app.py e worker.py passam os caminhos.
+"""
+import os
+import re
+import gzip
+import zlib
+import shutil
+import sqlite3
+import tarfile
+import hashlib
+import tempfile
+from datetime import datetime
+
+PAGINAS_POR_PASSO = 1024      # ~4 MB por passo com páginas de 4 KB
+PAUSA_ENTRE_PASSOS = 0.005
+REINICIOS_MAXIMOS = 3         # recomeços da cópia paginada antes de copiar num passo só
+TAMANHO_PEDACO = 256 * 1024
+NIVEL_COMPRESSAO = 6
+
+# financeiro_20250131-030000_1a2b3c4d5e6f.db.gz (data da cópia e início do sha256 do conteúdo)
+_NOME_SNAPSHOT = re.compile(r"^financeiro_(\d{8}-\d{6})_([0-9a-f]{12})\.db\.gz$")
+
+
+class ErroBackup(ValueError):
+    pass
+
+
+class _CopiaReiniciada(Exception):
+    pass
+
+
+def copiar_banco(origem, destino, paginas=PAGINAS_POR_PASSO, reinicios=REINICIOS_MAXIMOS):
+    """Grava em `destino` uma cópia consistente de `origem`, que pode estar em uso.
+
+    Uma gravação de outra conexão na origem faz o SQLite recomeçar a cópia paginada do
+    início; com gravações contínuas ela não terminaria. Depois de `reinicios` recomeços,
+    a cópia é refeita num passo só (pages=-1), que lê a origem numa única transação de
+    leitura: em WAL, quem grava não espera por ela.
+
+    A cópia sai em modo de journal DELETE: é um arquivo .db único, sem -wal/-shm.
+    """
+    fonte = sqlite3.connect(origem, timeout=15)
+    alvo = sqlite3.connect(destino)
+    anterior, recomecos = None, 0
+
+    def progresso(status, restantes, total):
+        # As páginas restantes só deixam de diminuir quando a cópia recomeçou
+        nonlocal anterior, recomecos
+        if anterior is not None and restantes >= anterior:
+            recomecos += 1
+            if recomecos > reinicios: raise _CopiaReiniciada
+        anterior = restantes
+
+    try:
+        try:
+            fonte.backup(alvo, pages=paginas, progress=progresso, sleep=PAUSA_ENTRE_PASSOS)
+        except _CopiaReiniciada:
+            fonte.backup(alvo)
+        alvo.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        alvo.close(); fonte.close()
+
+
+def aplicar_banco(origem, destino):
+    """Substitui o conteúdo do banco `destino` (em uso) pelo de `origem`.
+
+    Tudo acontece numa única transação de escrita no destino: as outras conexões,
+    inclusive de outros processos, veem o banco antigo ou o novo, nunca uma mistura.
+    """
+    fonte = sqlite3.connect(origem)
+    alvo = sqlite3.connect(destino, timeout=15)
+    try:
+        fonte.backup(alvo)
+    finally:
+        alvo.close(); fonte.close()
+
+
+def verificar_banco(caminho, versao_maxima, tabelas_obrigatorias=()):
+    """Confere se o arquivo é um banco SQLite íntegro, de uma versão de schema conhecida."""
+    try:
+        conn = sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        raise ErroBackup(f"não foi possível abrir o arquivo: {e}")
+    try:
+        resultado = [r[0] for r in conn.execute("PRAGMA integrity_check")]
+        if resultado != ["ok"]: raise ErroBackup(f"banco corrompido: {'; '.join(resultado[:3])}")
+        versao = conn.execute("PRAGMA user_version").fetchone()[0]
+        if versao > versao_maxima: raise ErroBackup(f"backup de uma versão mais nova do sistema (schema {versao})")
+        tabelas = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        faltando = [t for t in tabelas_obrigatorias if t not in tabelas]
+        if faltando: raise ErroBackup(f"não é um backup deste sistema (faltam as tabelas {', '.join(faltando)})")
+        return versao
+    except sqlite3.DatabaseError as e:
+        raise ErroBackup(f"arquivo inválido: {e}")
+    finally:
+        conn.close()
+
+
+def sha256_arquivo(caminho):
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        while pedaco := f.read(TAMANHO_PEDACO): h.update(pedaco)
+    return h.hexdigest()
+
+
+# --- COMPRESSÃO EM STREAMING ---
+def _ler_em_pedacos(caminho):
+    with open(caminho, "rb") as f:
+        while pedaco := f.read(TAMANHO_PEDACO): yield pedaco
+
+
+def _gzip(pedacos):
+    compressor = zlib.compressobj(NIVEL_COMPRESSAO, zlib.DEFLATED, 31)  # wbits=31: formato gzip
+    for pedaco in pedacos:
+        saida = compressor.compress(pedaco)
+        if saida: yield saida
+    yield compressor.flush()
+
+
+def _tar(arquivos):
+    """Fluxo tar de [(nome no pacote, caminho)], um arquivo de cada vez, sem montar em memória."""
+    for nome, caminho in arquivos:
+        info = tarfile.TarInfo(nome)
+        estado = os.stat(caminho)
+        info.size, info.mtime = estado.st_size, int(estado.st_mtime)
+        yield info.tobuf(format=tarfile.PAX_FORMAT)
+        yield from _ler_em_pedacos(caminho)
+        if info.size % tarfile.BLOCKSIZE: yield tarfile.NUL * (tarfile.BLOCKSIZE - info.size % tarfile.BLOCKSIZE)
+    yield tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+
+
+def stream_gzip(caminho):
+    return _gzip(_ler_em_pedacos(caminho))
+
+
+def stream_tar_gz(caminho_banco, pasta_uploads):
+    """Pacote .tar.gz com o banco (financeiro.db) e os comprovantes (uploads/...)."""
+    arquivos = [("financeiro.db", caminho_banco)]
+    for raiz, pastas, nomes in os.walk(pasta_uploads):
+        pastas[:] = sorted(p for p in pastas if not p.startswith("."))  # .tmp: uploads em andamento
+        for nome in sorted(nomes):
+            caminho = os.path.join(raiz, nome)
+            arquivos.append(("uploads/" + os.path.relpath(caminho, pasta_uploads).replace(os.sep, "/"), caminho))
+    return _gzip(_tar(arquivos))
+
+
+def _membros(pacote, prefixo):
+    for membro in pacote:
+        if membro.isfile() and membro.name.startswith(prefixo): yield membro
+
+
+def extrair_banco(arquivo, destino):
+    """Grava em `destino` o banco contido no upload: .db, .db.gz ou .tar.gz (financeiro.db)."""
+    inicio = arquivo.read(2); arquivo.seek(0)
+    if inicio != b"\x1f\x8b":
+        with open(destino, "wb") as f: shutil.copyfileobj(arquivo, f, TAMANHO_PEDACO)
+        return
+    try:
+        with tarfile.open(fileobj=arquivo, mode="r:gz") as pacote:
+            membro = next((m for m in _membros(pacote, "financeiro.db") if m.name == "financeiro.db"), None)
+            if membro is None: raise ErroBackup("o pacote não contém financeiro.db")
+            with pacote.extractfile(membro) as origem, open(destino, "wb") as f:
+                shutil.copyfileobj(origem, f, TAMANHO_PEDACO)
+    except tarfile.ReadError:
+        # Não é um tar: é um .db comprimido
+        arquivo.seek(0)
+        try:
+            with gzip.open(arquivo) as origem, open(destino, "wb") as f:
+                shutil.copyfileobj(origem, f, TAMANHO_PEDACO)
+        except (OSError, EOFError) as e:
+            raise ErroBackup(f"arquivo comprimido inválido: {e}")
+
+
+def extrair_uploads(arquivo, pasta_uploads):
+    """Copia os comprovantes de um .tar.gz para `pasta_uploads`, sem apagar os existentes."""
+    arquivo.seek(0)
+    if arquivo.read(2) != b"\x1f\x8b": return 0
+    arquivo.seek(0); quantidade = 0
+    try:
+        with tarfile.open(fileobj=arquivo, mode="r:gz") as pacote:
+            for membro in _membros(pacote, "uploads/"):
+                # Nada de caminhos absolutos ou com ".." saindo da pasta de uploads
+                relativo = os.path.normpath(membro.name[len("uploads/"):])
+                if relativo.startswith("..") or os.path.isabs(relativo): continue
+                destino = os.path.join(pasta_uploads, relativo)
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                with pacote.extractfile(membro) as origem, open(destino, "wb") as f:
+                    shutil.copyfileobj(origem, f, TAMANHO_PEDACO)
+                quantidade += 1
+    except tarfile.ReadError:
+        return 0
+    return quantidade
+
+
+# --- SNAPSHOTS ROTACIONADOS ---
+def listar_snapshots(pasta):
+    """[(nome, datetime, hash)] do mais recente para o mais antigo."""
+    if not os.path.isdir(pasta): return []
+    achados = []
+    for nome in os.listdir(pasta):
+        m = _NOME_SNAPSHOT.match(nome)
+        if m: achados.append((nome, datetime.strptime(m.group(1), "%Y%m%d-%H%M%S"), m.group(2)))
+    return sorted(achados, key=lambda s: s[1], reverse=True)
+
+
+def criar_snapshot(origem, pasta, manter=7):
+    """Cópia comprimida do banco em `pasta`, mantendo só as `manter` mais recentes.
+
+    Cada snapshot é uma cópia completa, não incremental: não há diferença de páginas nem
+    do WAL entre um e outro. Se o conteúdo for idêntico ao da última cópia (nenhuma
+    gravação desde então), nada é gravado. Devolve o nome do snapshot criado, ou None.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=pasta, suffix=".db"); os.close(fd)
+    try:
+        copiar_banco(origem, temporario)
+        resumo = sha256_arquivo(temporario)[:12]
+        existentes = listar_snapshots(pasta)
+        if existentes and existentes[0][2] == resumo: return None
+        nome = f"financeiro_{datetime.now():%Y%m%d-%H%M%S}_{resumo}.db.gz"
+        parcial = os.path.join(pasta, nome + ".parcial")
+        with open(parcial, "wb") as f:
+            for pedaco in stream_gzip(temporario): f.write(pedaco)
+        os.replace(parcial, os.path.join(pasta, nome))
+    finally:
+        if os.path.exists(temporario): os.remove(temporario)
+    for antigo, _, _ in [s for s in listar_snapshots(pasta) if s[0] != nome][max(manter - 1, 0):]:
+        os.remove(os.path.join(pasta, antigo))
+    return nome
@@ -0,0 +1,167 @@
+"""Armazenamento dos comprovantes por conteúdo (sha256), com miniaturas em segundo plano.
+
+Cada arquivo fica em uploads/ab/cd/<sha256>.<ext>: o mesmo PDF enviado duas vezes
+ocupa um único arquivo e o nome nunca muda de conteúdo (pode ser cacheado para
+sempre). O banco guarda esse caminho relativo em Lancamento.comprovante; a
+contagem de referências é feita lá (ver app.remover_comprovantes_orfaos e remover()).
+
+Arquivos antigos, gravados como <timestamp>_<nome> na raiz de uploads, continuam
+sendo servidos normalmente.
+"""
+import os
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+
+from werkzeug.utils import secure_filename
+
+log = logging.getLogger(__name__)
+
+TAMANHO_PEDACO = 256 * 1024
+EXTENSOES_IMAGEM = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+# variante -> maior lado em pixels
+VARIANTES = {"miniatura": 320, "previa": 1280}
+PASTA_TEMPORARIA = ".tmp"
+
+
+def extensao(nome):
+    ext = os.path.splitext(secure_filename(nome or ""))[1].lower()
+    return ext if 1 < len(ext) <= 10 else ""
+
+
+def endereco(sha, ext):
+    return f"{sha[:2]}/{sha[2:4]}/{sha}{ext}"
+
+
+def eh_enderecado(relativo):
+    """True para os caminhos no formato ab/cd/<sha256>.ext (os antigos ficam na raiz)."""
+    partes = relativo.split("/")
+    return len(partes) == 3 and len(partes[2].split(".")[0]) == 64
+
+
+class ArmazemComprovantes:
+    """Criar não mexe no disco nem abre threads: a pasta temporária é criada por preparar() (ou
+    no primeiro upload) e o pool de miniaturas na primeira imagem recebida."""
+
+    def __init__(self, pasta, threads=2):
+        self.pasta = pasta
+        self.temporaria = os.path.join(pasta, PASTA_TEMPORARIA)
+        self.threads = threads
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def preparar(self):
+        os.makedirs(self.temporaria, exist_ok=True)
+
+    def _miniaturas(self):
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="miniaturas")
+            return self._executor
+
+    def caminho(self, relativo):
+        return os.path.join(self.pasta, *relativo.split("/"))
+
+    def caminho_variante(self, relativo, variante):
+        base = os.path.splitext(relativo)[0]
+        return self.caminho(f"{base}.{variante}.jpg")
+
+    def receber(self, stream, nome_original):
+        """Grava o upload em pedaços num temporário, calculando o sha256 no caminho.
+
+        Devolve (relativo, temporario). O arquivo só vai para o lugar definitivo em
+        promover(), depois do commit do lançamento que o referencia.
+        """
+        h = hashlib.sha256()
+        self.preparar()
+        fd, temporario = tempfile.mkstemp(dir=self.temporaria)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while pedaco := stream.read(TAMANHO_PEDACO):
+                    h.update(pedaco); f.write(pedaco)
+        except BaseException:
+            os.remove(temporario); raise
+        return endereco(h.hexdigest(), extensao(nome_original)), temporario
+
+    def promover(self, temporario, relativo):
+        """Move o temporário para o endereço definitivo e agenda as miniaturas.
+
+        Se o arquivo já existe (mesmo conteúdo) ele é sobrescrito por um idêntico:
+        assim um comprovante apagado por uma exclusão concorrente volta a existir.
+        """
+        destino = self.caminho(relativo)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(temporario, destino)
+        if os.path.splitext(relativo)[1] in EXTENSOES_IMAGEM:
+            self._miniaturas().submit(self._gerar_variantes, relativo)
+
+    @staticmethod
+    def descartar(temporario):
+        if temporario and os.path.exists(temporario): os.remove(temporario)
+
+    def _gerar_variantes(self, relativo):
+        from PIL import Image, ImageOps
+
+        try:
+            with Image.open(self.caminho(relativo)) as original:
+                original.draft("RGB", (max(VARIANTES.values()),) * 2)  # JPEG: decodifica já reduzido
+                imagem = ImageOps.exif_transpose(original).convert("RGB")
+            for variante, lado in VARIANTES.items():
+                destino = self.caminho_variante(relativo, variante)
+                if os.path.exists(destino): continue
+                copia = imagem.copy(); copia.thumbnail((lado, lado))
+                parcial = destino + ".parcial"
+                copia.save(parcial, "JPEG", quality=82, optimize=True)
+                os.replace(parcial, destino)
+        except Exception:
+            log.exception("Erro ao gerar miniaturas de %s", relativo)
+
+    def remover(self, relativo, referenciado):
+        """Apaga o arquivo e as variantes dele se `referenciado(relativo)` segue falso. Devolve se apagou.
+
+        Um upload do mesmo conteúdo pode fazer o commit e o promover() entre a contagem de
+        referências e a remoção. Por isso o arquivo é antes renomeado para a pasta temporária
+        (a lápide) e a contagem é refeita: se ele voltou a ser usado, volta ao lugar. Um
+        promover() depois da segunda contagem grava o arquivo de novo.
+        """
+        destino = self.caminho(relativo)
+        if referenciado(relativo) or not os.path.exists(destino): return False
+        self.preparar()
+        fd, lapide = tempfile.mkstemp(dir=self.temporaria, suffix=".removendo"); os.close(fd)
+        try:
+            os.replace(destino, lapide)
+        except FileNotFoundError:
+            os.remove(lapide); return False
+        if referenciado(relativo):
+            os.replace(lapide, destino)  # Se o promover() já o regravou, o conteúdo é o mesmo
+            return False
+        os.remove(lapide)
+        if eh_enderecado(relativo) and not os.path.exists(destino):
+            for v in VARIANTES:
+                caminho = self.caminho_variante(relativo, v)
+                if os.path.exists(caminho): os.remove(caminho)
+        return True
+
+    def limpar_orfaos(self, referenciados):
+        """Remove os arquivos que nenhum lançamento referencia. Devolve quantos foram apagados.
+
+        Também apaga temporários esquecidos (uploads interrompidos há mais de uma hora).
+        """
+        shas = {os.path.basename(r).split(".")[0] for r in referenciados if eh_enderecado(r)}
+        apagados = 0
+        limite = time.time() - 3600
+        for nome in os.listdir(self.temporaria):
+            caminho = os.path.join(self.temporaria, nome)
+            if os.path.getmtime(caminho) < limite: os.remove(caminho)
+        for raiz, pastas, nomes in os.walk(self.pasta):
+            pastas[:] = [p for p in pastas if not p.startswith(".")]
+            relativa = os.path.relpath(raiz, self.pasta)
+            for nome in nomes:
+                relativo = nome if relativa == "." else f"{relativa.replace(os.sep, '/')}/{nome}"
+                usado = nome.split(".")[0] in shas if eh_enderecado(relativo) else relativo in referenciados
+                if not usado:
+                    os.remove(os.path.join(raiz, nome)); apagados += 1
+        return apagados
@@ -0,0 +1,77 @@
+"""Geração de planilhas (CSV e XLSX) em streaming.
+
+Assim como importacao.py, este módulo não conhece o banco: recebe um cabeçalho
+e um iterável de linhas (listas de valores Python) e devolve um gerador de
+pedaços prontos para um Response do Flask. As consultas ficam em app.py.
+"""
+import csv
+import io
+import tempfile
+from datetime import date
+
+TAMANHO_BLOCO = 1000         # linhas por pedaço enviado no CSV
+TAMANHO_PEDACO = 64 * 1024   # bytes por pedaço enviado no XLSX
+
+COLUNAS_LANCAMENTOS = ["data", "descricao", "tipo", "subtipo", "categoria", "conta", "valor", "efetivado", "comprovante"]
+MESES = ["jan", "fev", "mar", "abr", "mai", "jun", "jul", "ago", "set", "out", "nov", "dez"]
+COLUNAS_PLANEJAMENTO = ["tipo", "subtipo", "categoria"] + MESES + ["total"]
+
+
+def _celula_csv(valor):
+    # Formato do Excel em português: vírgula decimal, ';' como separador
+    if valor is None: return ""
+    if isinstance(valor, bool): return "sim" if valor else "não"
+    if isinstance(valor, float): return f"{valor:.2f}".replace(".", ",")
+    if isinstance(valor, date): return valor.isoformat()
+    return valor
+
+
+def gerar_csv(cabecalho, linhas, tamanho=TAMANHO_BLOCO):
+    """Envia o cabeçalho logo de cara e depois um pedaço a cada `tamanho` linhas.
+
+    O BOM no início faz o Excel abrir o arquivo como UTF-8. O arquivo gerado pode
+    ser importado de volta (mesmos nomes de coluna aceitos por importacao.py).
+    """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=";", lineterminator="\n")
+    escritor.writerow(cabecalho)
+    yield "\ufeff" + buffer.getvalue()
+    buffer.seek(0); buffer.truncate()
+    for n, linha in enumerate(linhas, start=1):
+        escritor.writerow([_celula_csv(v) for v in linha])
+        if n % tamanho == 0:
+            yield buffer.getvalue()
+            buffer.seek(0); buffer.truncate()
+    if buffer.tell(): yield buffer.getvalue()
+
+
+def gerar_xlsx(cabecalho, linhas, titulo="Dados"):
+    """Monta a planilha no modo write-only do openpyxl e envia o arquivo em pedaços.
+
+    No modo write-only cada linha vai direto para um arquivo temporário em disco,
+    então a memória não cresce com o número de linhas. O XLSX é um zip que só
+    fica completo ao final, por isso o envio começa depois da última linha.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    planilha = wb.create_sheet(title=titulo[:31])
+    planilha.append(cabecalho)
+    for linha in linhas:
+        planilha.append(linha)
+    with tempfile.TemporaryFile() as arquivo:
+        wb.save(arquivo)
+        arquivo.seek(0)
+        while pedaco := arquivo.read(TAMANHO_PEDACO):
+            yield pedaco
+
+
+MIMETYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def gerar_planilha(formato, cabecalho, linhas, titulo="Dados"):
+    if formato == "xlsx": return gerar_xlsx(cabecalho, linhas, titulo)
+    return gerar_csv(cabecalho, linhas)
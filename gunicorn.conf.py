@@ -0,0 +1,38 @@
+# Configuração do gunicorn para produção (usada pelo Dockerfile).
+# Processos x threads: o SQLite em WAL aceita vários leitores e um escritor, então
+# poucos processos com algumas threads cada aproveitam bem sem disputar o lock de escrita.
+import os
+
+from metricas import Registro, incorporar_encerrado
+from servidor import threads_web
+
+bind = os.getenv("WEB_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_WORKERS", 2))
+# WEB_THREADS, lido em servidor.py: o mesmo número dimensiona o pool de conexões do app
+threads = threads_web()
+worker_class = "gthread"
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+# Recicla os workers de tempos em tempos para conter vazamentos de memória
+max_requests = 2000
+max_requests_jitter = 200
+accesslog = "-"
+errorlog = "-"
+
+# Métricas (ver metricas.py): cada worker grava o seu instantâneo em METRICAS_DIR; o de um
+# worker reciclado (max_requests) é somado ao acumulado para os contadores não voltarem
+METRICAS_DIR = os.getenv("METRICAS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "metricas"))
+
+
+def on_starting(server):
+    Registro("web", METRICAS_DIR).limpar()
+
+
+def worker_exit(server, worker):
+    from app import registro
+    registro.gravar()
+
+
+def child_exit(server, worker):
+    incorporar_encerrado(METRICAS_DIR, "web", worker.pid)
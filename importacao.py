@@ -0,0 +1,169 @@
+"""Leitura de extratos bancários (CSV, XLSX e OFX) em lotes.
+
+Os leitores não conhecem o banco de dados: cada um devolve um gerador de lotes
+(listas) de registros normalizados no formato
+
+    {"data": date, "descricao": str, "valor_centavos": int (com sinal),
+     "tipo": str|None, "subtipo": str|None, "categoria": str|None,
+     "conta": str|None, "id_externo": str|None}
+
+e a gravação (mapeamento para Tipo/Subtipo/Categoria/Conta, deduplicação e
+inserção) fica em app.importar_lancamentos.
+"""
+import io
+import re
+import unicodedata
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+TAMANHO_LOTE = 5000
+
+# Nomes de coluna aceitos (já normalizados: minúsculas, sem acento)
+ALIASES = {
+    "data": ("data", "date", "data lancamento", "data do lancamento", "dt"),
+    "descricao": ("descricao", "historico", "lancamento", "memo", "description", "detalhes"),
+    "valor": ("valor", "valor (r$)", "amount", "quantia"),
+    "tipo": ("tipo",),
+    "subtipo": ("subtipo",),
+    "categoria": ("categoria", "category"),
+    "conta": ("conta", "account"),
+}
+
+
+class ErroImportacao(ValueError):
+    pass
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e sem espaços extras (para comparar nomes)."""
+    texto = unicodedata.normalize("NFKD", str(texto or "")).encode("ascii", "ignore").decode()
+    return " ".join(texto.lower().split())
+
+
+def para_centavos(valor):
+    """Aceita número ou texto nos formatos '1234.56', '1.234,56', '-R$ 10,00'."""
+    if valor is None or valor == "": raise ErroImportacao("valor vazio")
+    if isinstance(valor, (int, float, Decimal)):
+        d = Decimal(str(valor))
+    else:
+        t = re.sub(r"[^\d,.\-]", "", str(valor))
+        if "," in t: t = t.replace(".", "").replace(",", ".")
+        try: d = Decimal(t)
+        except InvalidOperation: raise ErroImportacao(f"valor inválido: {valor!r}")
+    return int((d * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def para_data(valor):
+    if isinstance(valor, datetime): return valor.date()
+    if isinstance(valor, date): return valor
+    t = str(valor or "").strip()[:10]
+    for formato in ("%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y", "%d-%m-%Y", "%Y%m%d"):
+        try: return datetime.strptime(t, formato).date()
+        except ValueError: pass
+    raise ErroImportacao(f"data inválida: {valor!r}")
+
+
+def mapear_colunas(cabecalho):
+    """Índice de cada campo conhecido no cabeçalho; data, descrição e valor são obrigatórios."""
+    nomes = [normalizar(c) for c in cabecalho]
+    mapa = {}
+    for campo, aliases in ALIASES.items():
+        for i, nome in enumerate(nomes):
+            if nome in aliases: mapa[campo] = i; break
+    faltando = [c for c in ("data", "descricao", "valor") if c not in mapa]
+    if faltando: raise ErroImportacao(f"colunas obrigatórias ausentes: {', '.join(faltando)}")
+    return mapa
+
+
+def registro(linha, mapa):
+    pega = lambda campo: linha[mapa[campo]] if campo in mapa and mapa[campo] < len(linha) else None
+    texto = lambda campo: (str(pega(campo)).strip() or None) if pega(campo) not in (None, "") else None
+    return {
+        "data": para_data(pega("data")), "descricao": (texto("descricao") or "")[:100],
+        "valor_centavos": para_centavos(pega("valor")), "tipo": texto("tipo"), "subtipo": texto("subtipo"),
+        "categoria": texto("categoria"), "conta": texto("conta"), "id_externo": None,
+    }
+
+
+def _em_lotes(linhas, mapa, tamanho, erros):
+    lote = []
+    for n, linha in linhas:
+        if not any(v not in (None, "") for v in linha): continue
+        try: lote.append(registro(linha, mapa))
+        except ErroImportacao as e: erros.append(f"linha {n}: {e}")
+        if len(lote) >= tamanho: yield lote; lote = []
+    if lote: yield lote
+
+
+def _texto(arquivo):
+    """Abre o arquivo binário como texto, detectando UTF-8 ou Latin-1 pelo começo dele."""
+    amostra = arquivo.read(65536); arquivo.seek(0)
+    try: amostra.decode("utf-8"); codificacao = "utf-8-sig"
+    except UnicodeDecodeError as e: codificacao = "utf-8-sig" if e.start > len(amostra) - 4 else "latin-1"
+    return io.TextIOWrapper(arquivo, encoding=codificacao, newline="")
+
+
+def ler_csv(arquivo, erros, tamanho=TAMANHO_LOTE):
+    import pandas as pd
+
+    texto = _texto(arquivo)
+    primeira = texto.readline(); texto.seek(0)
+    sep = ";" if primeira.count(";") > primeira.count(",") else ","
+    # Tudo como texto: a conversão de datas/valores (formato brasileiro) é feita em registro()
+    leitor = pd.read_csv(texto, sep=sep, dtype=str, keep_default_na=False, chunksize=tamanho)
+    mapa = None; inicio = 2
+    for bloco in leitor:
+        if mapa is None: mapa = mapear_colunas(bloco.columns)
+        linhas = enumerate(bloco.itertuples(index=False, name=None), start=inicio)
+        inicio += len(bloco)
+        yield from _em_lotes(linhas, mapa, tamanho, erros)
+
+
+def ler_xlsx(arquivo, erros, tamanho=TAMANHO_LOTE):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = enumerate(wb.active.iter_rows(values_only=True), start=1)
+        _, cabecalho = next(linhas, (None, None))
+        if cabecalho is None: return
+        yield from _em_lotes(linhas, mapear_colunas(cabecalho), tamanho, erros)
+    finally:
+        wb.close()
+
+
+_CAMPO_OFX = re.compile(r"<(\w+)>([^<\r\n]*)")
+
+
+def ler_ofx(arquivo, erros, tamanho=TAMANHO_LOTE):
+    """Lê os blocos <STMTTRN> linha a linha (serve para OFX SGML e XML)."""
+    lote = []; atual = None; n = 0
+    for linha in _texto(arquivo):
+        for tag, valor in _CAMPO_OFX.findall(linha):
+            tag = tag.upper()
+            if tag == "STMTTRN": atual = {}; n += 1
+            elif atual is not None: atual[tag] = valor.strip()
+        if atual is not None and "</STMTTRN>" in linha.upper():
+            try:
+                lote.append({
+                    "data": para_data(atual.get("DTPOSTED", "")[:8]),
+                    "descricao": (atual.get("MEMO") or atual.get("NAME") or "")[:100],
+                    "valor_centavos": para_centavos(atual.get("TRNAMT")),
+                    "tipo": None, "subtipo": None, "categoria": None, "conta": None,
+                    "id_externo": atual.get("FITID"),
+                })
+            except ErroImportacao as e:
+                erros.append(f"transação {n}: {e}")
+            atual = None
+            if len(lote) >= tamanho: yield lote; lote = []
+    if lote: yield lote
+
+
+LEITORES = {"csv": ler_csv, "xlsx": ler_xlsx, "ofx": ler_ofx}
+
+
+def ler_extrato(arquivo, nome, erros, tamanho=TAMANHO_LOTE):
+    """Escolhe o leitor pela extensão de `nome` e devolve o gerador de lotes."""
+    extensao = nome.rsplit(".", 1)[-1].lower() if "." in nome else ""
+    if extensao not in LEITORES: raise ErroImportacao(f"formato não suportado: .{extensao} (use CSV, XLSX ou OFX)")
+    return LEITORES[extensao](arquivo, erros, tamanho)
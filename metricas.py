@@ -0,0 +1,297 @@
+"""Métricas de desempenho no formato texto do Prometheus, sem dependências externas.
+
+Histogramas de latência por rota e por handler do bot, contagem de consultas SQL e do
+tempo gasto nelas por operação (ver Medicao) e perfis de uma única requisição
+(cProfile ou pilhas amostradas no formato "folded" dos flamegraphs).
+
+Cada processo (os workers do gunicorn e o worker.py) guarda as suas métricas em memória
+e, a cada poucos segundos, grava um instantâneo em <pasta>/<papel>-<pid>.json. O
+/metrics soma os instantâneos de todos os processos: um único scrape vê o web inteiro e
+o bot. Os arquivos de processos encerrados são somados a <papel>-encerrados.json (ver
+incorporar_encerrado, chamado pelo gunicorn.conf.py), para os contadores não voltarem.
+
+Como backup.py, este módulo não depende do Flask; app.py e worker.py ligam os ganchos.
+"""
+import os
+import sys
+import json
+import time
+import threading
+import contextvars
+from collections import Counter
+
+# Segundos: de consultas por chave primária a relatórios pesados
+LIMITES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LIMITES_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _rotulos(nomes, valores, extra=None):
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)] + ([extra] if extra else [])
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(v):
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self.valores = {}  # tupla de rótulos -> total
+
+    def incrementar(self, valor=1, **rotulos):
+        chave = tuple(str(rotulos[r]) for r in self.rotulos)
+        self.valores[chave] = self.valores.get(chave, 0) + valor
+
+    def vazio(self):
+        return Contador(self.nome, self.ajuda, self.rotulos)
+
+    def exportar(self):
+        return [[list(k), v] for k, v in self.valores.items()]
+
+    def somar(self, dados):
+        for chave, v in dados: chave = tuple(chave); self.valores[chave] = self.valores.get(chave, 0) + v
+
+    def texto(self):
+        return [f"{self.nome}{_rotulos(self.rotulos, k)} {_numero(v)}" for k, v in sorted(self.valores.items())]
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), limites=LIMITES_SEGUNDOS):
+        self.nome, self.ajuda, self.rotulos, self.limites = nome, ajuda, tuple(rotulos), tuple(limites)
+        self.valores = {}  # tupla de rótulos -> [contagem por faixa (não acumulada)..., soma, total]
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(str(rotulos[r]) for r in self.rotulos)
+        serie = self.valores.get(chave)
+        if serie is None: serie = self.valores[chave] = [0] * (len(self.limites) + 1) + [0.0, 0]
+        i = 0
+        while i < len(self.limites) and valor > self.limites[i]: i += 1
+        serie[i] += 1; serie[-2] += valor; serie[-1] += 1
+
+    def vazio(self):
+        return Histograma(self.nome, self.ajuda, self.rotulos, self.limites)
+
+    def exportar(self):
+        return [[list(k), list(v)] for k, v in self.valores.items()]
+
+    def somar(self, dados):
+        for chave, serie in dados:
+            atual = self.valores.setdefault(tuple(chave), [0] * (len(self.limites) + 1) + [0.0, 0])
+            for i, v in enumerate(serie): atual[i] += v
+
+    def texto(self):
+        linhas = []
+        for chave, serie in sorted(self.valores.items()):
+            acumulado = 0
+            for limite, n in zip(self.limites + ("+Inf",), serie):
+                acumulado += n
+                le = 'le="%s"' % (limite if limite == "+Inf" else _numero(float(limite)))
+                linhas.append(f"{self.nome}_bucket{_rotulos(self.rotulos, chave, le)} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {_numero(float(serie[-2]))}")
+            linhas.append(f"{self.nome}_count{_rotulos(self.rotulos, chave)} {serie[-1]}")
+        return linhas
+
+
+class Registro:
+    """Métricas de um processo, gravadas periodicamente numa pasta compartilhada."""
+
+    def __init__(self, papel="web", pasta=None, intervalo=10):
+        self.papel, self.pasta, self.intervalo = papel, pasta, intervalo
+        self.metricas = {}
+        self._lock = threading.Lock()
+        self._pid = None  # A thread de gravação não sobrevive ao fork: é recriada por processo
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self.metricas.setdefault(nome, Contador(nome, ajuda, rotulos))
+
+    def histograma(self, nome, ajuda, rotulos=(), limites=LIMITES_SEGUNDOS):
+        return self.metricas.setdefault(nome, Histograma(nome, ajuda, rotulos, limites))
+
+    def observar(self, nome, valor, **rotulos):
+        with self._lock:
+            self.metricas[nome].observar(valor, **rotulos)
+        self._iniciar_gravacao()
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        with self._lock:
+            self.metricas[nome].incrementar(valor, **rotulos)
+        self._iniciar_gravacao()
+
+    # --- instantâneos por processo ---
+    def arquivo(self, pid=None):
+        return os.path.join(self.pasta, f"{self.papel}-{pid or os.getpid()}.json")
+
+    def _iniciar_gravacao(self):
+        if not self.pasta or self._pid == os.getpid(): return
+        self._pid = os.getpid()
+        threading.Thread(target=self._gravar_sempre, daemon=True, name="metricas").start()
+
+    def _gravar_sempre(self):
+        while True:
+            time.sleep(self.intervalo)
+            try: self.gravar()
+            except OSError: pass
+
+    def gravar(self):
+        if not self.pasta: return
+        with self._lock:
+            dados = {nome: m.exportar() for nome, m in self.metricas.items()}
+        _gravar_json(self.arquivo(), dados)
+
+    def texto(self):
+        """Exposição do Prometheus com a soma de todos os processos da pasta (ou só deste)."""
+        if self.pasta:
+            self.gravar()
+            somadas = {nome: m.vazio() for nome, m in self.metricas.items()}
+            for caminho in _instantaneos(self.pasta):
+                try:
+                    with open(caminho, encoding="utf-8") as f: dados = json.load(f)
+                except (OSError, ValueError): continue  # Gravado no meio da leitura ou apagado
+                for nome, valores in dados.items():
+                    if nome in somadas: somadas[nome].somar(valores)
+        else:
+            somadas = self.metricas
+        linhas = []
+        for nome, m in sorted(somadas.items()):
+            linhas += [f"# HELP {nome} {m.ajuda}", f"# TYPE {nome} {m.tipo}"] + m.texto()
+        return "\n".join(linhas) + "\n"
+
+    def limpar(self):
+        """Apaga os instantâneos deste papel (na partida: os contadores recomeçam do zero)."""
+        for caminho in _instantaneos(self.pasta, self.papel): os.remove(caminho)
+
+
+def _instantaneos(pasta, papel=None):
+    if not pasta or not os.path.isdir(pasta): return []
+    return [os.path.join(pasta, n) for n in os.listdir(pasta) if n.endswith(".json") and (papel is None or n.startswith(f"{papel}-"))]
+
+
+def _gravar_json(caminho, dados):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    parcial = f"{caminho}.{threading.get_ident()}.parcial"
+    with open(parcial, "w", encoding="utf-8") as f: json.dump(dados, f)
+    os.replace(parcial, caminho)
+
+
+def incorporar_encerrado(pasta, papel, pid):
+    """Soma o instantâneo de um processo que terminou ao acumulado do papel e apaga o dele."""
+    caminho = os.path.join(pasta, f"{papel}-{pid}.json")
+    acumulado = os.path.join(pasta, f"{papel}-encerrados.json")
+    try:
+        with open(caminho, encoding="utf-8") as f: dados = json.load(f)
+    except (OSError, ValueError): return
+    try:
+        with open(acumulado, encoding="utf-8") as f: total = json.load(f)
+    except (OSError, ValueError): total = {}
+    for nome, valores in dados.items():
+        series = {tuple(k): v for k, v in total.get(nome, [])}
+        for chave, v in valores:
+            chave = tuple(chave); atual = series.get(chave)
+            series[chave] = v if atual is None else ([a + b for a, b in zip(atual, v)] if isinstance(v, list) else atual + v)
+        total[nome] = [[list(k), v] for k, v in series.items()]
+    _gravar_json(acumulado, total)
+    os.remove(caminho)
+
+
+# --- SQL E TEMPO POR OPERAÇÃO ---
+# A medição em andamento na thread/contexto atual (requisição web ou handler do bot);
+# o ouvinte de SQL do app.py soma nela cada comando executado
+medicao_atual = contextvars.ContextVar("medicao_atual", default=None)
+
+
+class Medicao:
+    __slots__ = ("inicio", "consultas", "sql", "_token")
+
+    def __init__(self):
+        self.inicio = time.perf_counter(); self.consultas = 0; self.sql = 0.0
+        self._token = medicao_atual.set(self)
+
+    def sair(self):
+        """Tira a medição do contexto sem encerrá-la (o resto do trabalho segue em envolver)."""
+        if self._token is not None: medicao_atual.reset(self._token); self._token = None
+
+    def envolver(self, partes):
+        """Percorre `partes` com esta medição no contexto a cada passo.
+
+        Para respostas em streaming: o gerador do corpo roda depois que a requisição terminou,
+        fora do contexto em que a medição começou, e o SQL dele se perderia.
+        """
+        iterador = iter(partes)
+        try:
+            while True:
+                token = medicao_atual.set(self)
+                try: parte = next(iterador)
+                except StopIteration: return
+                finally: medicao_atual.reset(token)
+                yield parte
+        finally:
+            if hasattr(iterador, "close"): iterador.close()
+
+    def encerrar(self):
+        """Tira a medição do contexto e devolve os segundos desde o início."""
+        self.sair()
+        return time.perf_counter() - self.inicio
+
+
+def registrar_consulta(segundos):
+    medicao = medicao_atual.get()
+    if medicao is not None: medicao.consultas += 1; medicao.sql += segundos
+
+
+# --- PERFIS DE UMA REQUISIÇÃO ---
+class PerfilCProfile:
+    """cProfile da thread atual; grava <destino>.prof (pstats, snakeviz) e <destino>.txt."""
+
+    def __init__(self):
+        import cProfile  # Com o pstats, só quando um perfil é pedido: fora da partida do processo
+        self.perfil = cProfile.Profile(); self.perfil.enable()
+
+    def encerrar(self, destino):
+        self.perfil.disable()
+        self.perfil.dump_stats(destino + ".prof")
+        import pstats
+        with open(destino + ".txt", "w", encoding="utf-8") as f:
+            pstats.Stats(self.perfil, stream=f).sort_stats("cumulative").print_stats(60)
+        return destino + ".prof"
+
+
+class PerfilPilhas:
+    """Amostra a pilha da thread atual a cada `intervalo` segundos, numa thread à parte.
+
+    Grava <destino>.folded: uma linha "arquivo:função;...;arquivo:função contagem" por pilha,
+    o formato de entrada do flamegraph.pl e do speedscope. Enquanto amostra, o intervalo de
+    troca de threads do Python cai para metade do de amostragem (o padrão, 5 ms, deixaria a
+    thread de amostragem sem a GIL durante quase toda a requisição).
+    """
+
+    def __init__(self, intervalo=0.001):
+        self.alvo = threading.get_ident(); self.intervalo = intervalo
+        self.troca = sys.getswitchinterval(); sys.setswitchinterval(intervalo / 2)
+        self.pilhas = Counter(); self.parar = threading.Event()
+        self.thread = threading.Thread(target=self._amostrar, daemon=True, name="perfil"); self.thread.start()
+
+    def _amostrar(self):
+        while not self.parar.wait(self.intervalo):
+            quadro = sys._current_frames().get(self.alvo); pilha = []
+            while quadro is not None:
+                pilha.append(f"{os.path.basename(quadro.f_code.co_filename)}:{quadro.f_code.co_name}")
+                quadro = quadro.f_back
+            if pilha: self.pilhas[";".join(reversed(pilha))] += 1
+
+    def encerrar(self, destino):
+        self.parar.set(); self.thread.join(); sys.setswitchinterval(self.troca)
+        with open(destino + ".folded", "w", encoding="utf-8") as f:
+            for pilha, n in self.pilhas.most_common(): f.write(f"{pilha} {n}\n")
+        return destino + ".folded"
+
+
+PERFIS = {"cprofile": PerfilCProfile, "pilhas": PerfilPilhas}
@@ -0,0 +1,92 @@
+"""Recorrências: datas das ocorrências dos vencimentos e previsão de caixa com NumPy.
+
+Um vencimento fixo ocorre todo mês no dia `dia`; nos meses mais curtos ele cai no
+último dia (31 -> 30/04, 28/02 ou 29/02). Um variável ocorre uma única vez. As datas
+de todos os vencimentos em todos os meses do horizonte saem de uma só operação
+vetorizada (matriz recorrências x meses), sem laço em Python por mês.
+
+Como importacao.py e exportacao.py, este módulo não conhece o banco: app.py lê
+os vencimentos e lançamentos e passa arrays.
+"""
+from datetime import date
+
+import numpy as np
+
+
+def mes_numpy(d):
+    return np.datetime64(d.strftime("%Y-%m"), "M")
+
+
+def para_date(d):
+    return d.astype("datetime64[D]").astype(date)
+
+
+def serie_meses(inicio, quantidade):
+    """`quantidade` meses consecutivos a partir do mês da data `inicio` (datetime64[M])."""
+    return mes_numpy(inicio) + np.arange(quantidade)
+
+
+def dias_no_mes(meses):
+    return ((meses + 1).astype("datetime64[D]") - meses.astype("datetime64[D]")).astype(np.int64)
+
+
+def datas_fixas(dias, meses):
+    """Matriz (len(dias) x len(meses)) com a data de cada vencimento fixo em cada mês."""
+    dias = np.asarray(dias, dtype=np.int64).reshape(-1, 1)
+    limite = dias_no_mes(meses).reshape(1, -1)
+    return meses.astype("datetime64[D]").reshape(1, -1) + (np.minimum(dias, limite) - 1)
+
+
+def ocorrencias_fixas(dias, gerados_ate, inicio, meses, hoje):
+    """(datas, mascara) das ocorrências fixas ainda não geradas no horizonte.
+
+    `gerados_ate` tem, por vencimento, o último mês já gerado (NaT se nunca gerou).
+    Como na geração, ocorrências anteriores a `hoje` não entram (não é pagamento novo).
+    """
+    datas = datas_fixas(dias, meses)
+    gerados = np.asarray(gerados_ate, dtype="datetime64[M]").reshape(-1, 1)
+    mascara = (datas >= np.datetime64(hoje, "D")) & (np.isnat(gerados) | (meses.reshape(1, -1) > gerados))
+    return datas, mascara
+
+
+def prever_caixa(hoje, quantidade, saldo_inicial, fluxos):
+    """Saldo projetado mês a mês, de hoje até o fim do `quantidade`-ésimo mês.
+
+    `fluxos` é uma lista de pares (datas datetime64[D], valores em centavos com sinal:
+    positivo entra, negativo sai). Fluxos com data anterior a hoje (pendentes em atraso)
+    são contados hoje; os posteriores ao horizonte são ignorados.
+
+    Devolve um dict de arrays por mês: meses, entradas, saidas, saldo (no fim do mês),
+    saldo_minimo e dia_minimo (o dia de menor saldo, para ver se a conta fica negativa
+    antes de um recebimento).
+    """
+    meses = serie_meses(hoje, quantidade)
+    inicio = np.datetime64(hoje, "D")
+    fim = (meses[-1] + 1).astype("datetime64[D]")
+    total_dias = int((fim - inicio).astype(np.int64))
+    datas = np.concatenate([np.asarray(d, dtype="datetime64[D]").ravel() for d, _ in fluxos] or [np.empty(0, "datetime64[D]")])
+    valores = np.concatenate([np.asarray(v, dtype=np.int64).ravel() for _, v in fluxos] or [np.empty(0, np.int64)])
+    dentro = datas < fim
+    datas, valores = np.maximum(datas[dentro], inicio), valores[dentro]
+
+    # Movimento diário (bincount soma os valores de cada dia) e saldo acumulado
+    dia = (datas - inicio).astype(np.int64)
+    diario = np.bincount(dia, weights=valores, minlength=total_dias).round().astype(np.int64)
+    saldo = saldo_inicial + np.cumsum(diario)
+
+    # Início de cada mês no eixo dos dias (o primeiro mês começa hoje)
+    cortes = np.maximum((meses.astype("datetime64[D]") - inicio).astype(np.int64), 0)
+    indice_mes = np.searchsorted(cortes, dia, side="right") - 1
+    entradas = np.bincount(indice_mes, weights=np.where(valores > 0, valores, 0), minlength=quantidade).round().astype(np.int64)
+    saidas = np.bincount(indice_mes, weights=np.where(valores < 0, -valores, 0), minlength=quantidade).round().astype(np.int64)
+    fins = np.append(cortes[1:], total_dias) - 1
+    minimos = np.minimum.reduceat(saldo, cortes)
+    # Primeiro dia de cada mês em que o saldo atinge o mínimo dele: todo mês tem ao menos
+    # um, então o primeiro marcado a partir do início do mês está dentro do mês
+    mes_do_dia = np.repeat(np.arange(quantidade), np.diff(np.append(cortes, total_dias)))
+    marcados = np.flatnonzero(saldo == minimos[mes_do_dia])
+    posicao = marcados[np.searchsorted(marcados, cortes)]
+    return {
+        "meses": meses, "entradas": entradas, "saidas": saidas, "saldo": saldo[fins],
+        "saldo_minimo": minimos, "dia_minimo": inicio + posicao,
+    }
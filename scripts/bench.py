@@ -0,0 +1,211 @@
+"""Benchmark reproduzível das rotas da API, com comparação contra uma linha de base.
+
+Uso:
+  python scripts/bench.py [--escalas 1000 10000 100000] [--repeticoes 30] [--seed 42] [--saida bench.json]
+  python scripts/bench.py --baseline bench.json [--tolerancia 0.25]
+
+Cria um banco SQLite temporário (via DATABASE_URL) e o preenche com scripts/dados_sinteticos.py
+até cada escala (em lançamentos), do menor para o maior: o banco cresce, e a mesma semente
+gera sempre os mesmos dados. A cada degrau, com o cliente de teste logado, mede cada rota de
+ROTAS: p50/p99 e vazão (requisições por segundo, uma de cada vez) em --repeticoes chamadas
+depois do aquecimento, com as rotas alternadas a cada volta; quantos comandos SQL cada chamada
+executa; e o pico de memória alocada (tracemalloc), numa volta à parte para não pesar nas
+latências. Mede também o inicializar_banco (o `flask --app app inicializar-banco` do deploy)
+sobre o banco cheio.
+
+Imprime uma linha JSON por escala e rota e grava tudo em --saida. Com --baseline compara com
+um resultado anterior (ver comparar): p50 ou pico de memória que piorou mais que --tolerancia
+(e mais que o ruído mínimo, RUIDO_MS / RUIDO_KB), ou qualquer comando SQL a mais, é listado
+como regressão, e o script sai com código 1. O p99 vai no resultado, mas com poucas dezenas
+de repetições varia demais de uma rodada para outra para servir de alarme.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import sqlite3
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+from datetime import date
+
+tmp = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+os.environ.setdefault('TELEGRAM_TOKEN', '0:bench')
+os.environ.setdefault('METRICAS_DIR', os.path.join(tmp, 'metricas'))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from app import app, db, User, Lancamento, inicializar_banco, como_usuario
+from dados_sinteticos import popular_dimensoes, popular_lancamentos
+
+HOJE = date.today()
+# (nome, método, URL): o nome é a chave na linha de base, a URL pode mudar de um dia para o outro
+ROTAS = [
+    ("config", "GET", "/api/config"),
+    ("lancamentos_mes", "GET", f"/api/lancamentos?mes={HOJE:%Y-%m}&limite=100"),
+    ("lancamentos_todos", "GET", "/api/lancamentos?limite=500"),
+    ("busca", "GET", "/api/lancamentos/search?q=mercado&limite=50"),
+    ("resumo", "GET", f"/api/resumo?mes={HOJE:%Y-%m}"),
+    ("planejamento", "GET", f"/api/planejamento?ano={HOJE.year}"),
+    ("anos_disponiveis", "GET", "/api/anos_disponiveis"),
+    ("saldos", "GET", "/api/contas/saldos?meses=12"),
+    ("previsao", "GET", "/api/previsao?meses=12"),
+    ("vencimentos", "GET", "/api/vencimentos"),
+    ("export_mes_csv", "GET", f"/api/export/lancamentos?mes={HOJE:%Y-%m}&formato=csv"),
+    # Escrita: o total de chamadas (aquecimento + repetições + memória) é par, o lançamento volta ao status original
+    ("status", "PATCH", "/api/lancamentos/{id}/status"),
+]
+AQUECIMENTO = 3
+VOLTAS_MEMORIA = 5
+RUIDO_MS = 0.5
+RUIDO_KB = 64
+# Senha de custo mínimo: o benchmark mede as rotas, não o hash do login
+SENHA = generate_password_hash("bench", method="pbkdf2:sha256:1")
+# O aviso de orçamento de SQL sairia a cada chamada: o número de comandos já vai no resultado
+app.logger.setLevel(logging.ERROR)
+comandos = [0]
+with app.app_context():
+    event.listen(db.engine, "before_cursor_execute", lambda *_: comandos.__setitem__(0, comandos[0] + 1))
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+def chamar(cliente, metodo, url):
+    resp = cliente.open(url, method=metodo); corpo = resp.get_data()
+    assert resp.status_code == 200, (url, resp.status_code)
+    return len(corpo)
+
+
+def medir_rotas(cliente, rotas, repeticoes):
+    """{nome: medidas}. As rotas se alternam a cada volta: uma fase lenta da máquina pesa igual em todas."""
+    for _ in range(AQUECIMENTO):
+        for _, metodo, url in rotas: chamar(cliente, metodo, url)
+    tempos = {nome: [] for nome, *_ in rotas}; consultas = {}; tamanhos = {}
+    for _ in range(repeticoes):
+        for nome, metodo, url in rotas:
+            comandos[0] = 0
+            inicio = time.perf_counter(); tamanhos[nome] = chamar(cliente, metodo, url); tempos[nome].append(time.perf_counter() - inicio)
+            consultas[nome] = comandos[0]
+    # Memória numa volta à parte: o tracemalloc deixa cada alocação bem mais lenta
+    picos = {}
+    tracemalloc.start()
+    for nome, metodo, url in rotas:
+        pico = 0
+        for _ in range(VOLTAS_MEMORIA):
+            tracemalloc.reset_peak(); antes = tracemalloc.get_traced_memory()[0]
+            chamar(cliente, metodo, url); pico = max(pico, tracemalloc.get_traced_memory()[1] - antes)
+        picos[nome] = pico
+    tracemalloc.stop()
+    return {nome: {"p50_ms": round(percentil(t, 50) * 1000, 2), "p99_ms": round(percentil(t, 99) * 1000, 2), "req_s": round(len(t) / sum(t), 1),
+                   "consultas": consultas[nome], "pico_kb": round(picos[nome] / 1024, 1), "bytes": tamanhos[nome]} for nome, t in tempos.items()}
+
+
+def medir_inicializacao(repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter(); inicializar_banco(); tempos.append(time.perf_counter() - inicio)
+    return {"p50_ms": round(percentil(tempos, 50) * 1000, 2), "p99_ms": round(max(tempos) * 1000, 2)}
+
+
+def comparar(atual, base, tolerancia):
+    """Diferenças acima da tolerância: ([(escala, rota, campo, antes, depois, razão, 'regressao'|'melhora')], {escala: mediana}).
+
+    Numa máquina compartilhada (ou com frequência variável) uma escala inteira pode sair 40% mais
+    lenta ou mais rápida de uma rodada para outra. Por isso o p50 de cada rota é julgado contra
+    a mediana das razões depois/antes da sua escala: regressão é a rota que piorou em relação às
+    outras. Uma escala inteira que mudou mais que a tolerância vai à parte, em `medianas`.
+    """
+    diferencas = []; medianas = {}
+    for escala, rotas in atual["resultados"].items():
+        anteriores = base.get("resultados", {}).get(escala, {})
+        pares = {nome: (anteriores[nome], medida) for nome, medida in rotas.items() if nome in anteriores}
+        razoes = [d["p50_ms"] / a["p50_ms"] for a, d in pares.values() if a.get("p50_ms")]
+        mediana = percentil(razoes, 50) if razoes else 1
+        if abs(mediana - 1) > tolerancia: medianas[escala] = round(mediana, 2)
+        for nome, (anterior, medida) in pares.items():
+            for campo, ruido, fator in (("p50_ms", RUIDO_MS, mediana), ("pico_kb", RUIDO_KB, 1), ("consultas", 0, 1)):
+                antes, depois = anterior.get(campo), medida.get(campo)
+                if antes is None or depois is None or abs(depois - antes * fator) <= ruido: continue
+                razao = depois / (antes * fator) if antes else float("inf")
+                if campo == "consultas": diferencas.append((escala, nome, campo, antes, depois, round(razao, 2), "regressao" if depois > antes else "melhora"))
+                elif razao > 1 + tolerancia: diferencas.append((escala, nome, campo, antes, depois, round(razao, 2), "regressao"))
+                elif razao < 1 / (1 + tolerancia): diferencas.append((escala, nome, campo, antes, depois, round(razao, 2), "melhora"))
+    return diferencas, medianas
+
+
+def versao_codigo():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--escalas", type=int, nargs="+", default=[1000, 10000, 100000], help="lançamentos (até 1000000)")
+    parser.add_argument("--repeticoes", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rotas", nargs="+", help="só estas rotas (pelo nome)")
+    parser.add_argument("--saida", help="arquivo JSON com o resultado (serve de --baseline depois)")
+    parser.add_argument("--baseline", help="resultado anterior para comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="piora relativa aceita (0.25 = 25%%)")
+    args = parser.parse_args()
+    repeticoes = args.repeticoes + args.repeticoes % 2
+    rotas = [r for r in ROTAS if not args.rotas or r[0] in args.rotas]
+    base = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f: base = json.load(f)
+
+    inicializar_banco()  # O import do app não prepara o banco
+    with app.app_context():
+        user = User(username="bench", password_hash=SENHA); db.session.add(user); db.session.commit()
+        uid = user.id; catalogo = popular_dimensoes(uid, args.seed, hoje=HOJE)
+    resultado = {"meta": {"seed": args.seed, "repeticoes": repeticoes, "commit": versao_codigo(), "data": HOJE.isoformat(),
+                          "python": platform.python_version(), "sqlite": sqlite3.sqlite_version, "maquina": platform.platform()},
+                 "resultados": {}}
+    criados = 0
+    for escala in sorted(args.escalas):
+        with app.app_context():
+            carga = popular_lancamentos(uid, catalogo, escala, inicio=criados, seed=args.seed, hoje=HOJE); criados = escala
+            with como_usuario(uid): alvo = db.session.query(Lancamento.id).filter(Lancamento.data <= HOJE).order_by(Lancamento.id).first()[0]
+        print(json.dumps({"escala": escala, "carga_s": round(carga, 1)}), flush=True)
+        cliente = app.test_client()
+        cliente.post("/login", data={"username": "bench", "password": "bench"})
+        medidas = resultado["resultados"][str(escala)] = {}
+        # Leituras alternadas entre si; as escritas à parte, para não invalidar os caches das leituras a cada volta
+        urls = [(nome, metodo, url.format(id=alvo)) for nome, metodo, url in rotas]
+        for grupo in ([r for r in urls if r[1] == "GET"], [r for r in urls if r[1] != "GET"]):
+            medidas.update(medir_rotas(cliente, grupo, repeticoes))
+        for nome, *_ in urls: print(json.dumps({"escala": escala, "rota": nome, **medidas[nome]}, ensure_ascii=False), flush=True)
+        medidas["inicializar_banco"] = medir_inicializacao(repeticoes)
+        print(json.dumps({"escala": escala, "rota": "inicializar_banco", **medidas["inicializar_banco"]}), flush=True)
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f: json.dump(resultado, f, ensure_ascii=False, indent=1)
+    if base is None: return
+    if {k: base["meta"].get(k) for k in ("seed", "repeticoes")} != {k: resultado["meta"][k] for k in ("seed", "repeticoes")}:
+        print(json.dumps({"aviso": "seed ou repetições diferentes da linha de base", "baseline": base["meta"]}), flush=True)
+    diferencas, medianas = comparar(resultado, base, args.tolerancia)
+    for escala, nome, campo, antes, depois, razao, tipo in diferencas:
+        print(json.dumps({tipo: nome, "escala": int(escala), "campo": campo, "antes": antes, "depois": depois, "razao": razao}, ensure_ascii=False))
+    for escala, mediana in medianas.items():
+        print(json.dumps({"aviso": "todas as rotas mudaram juntas: máquina mais lenta/rápida ou mudança comum a todas (rode de novo para confirmar)",
+                          "escala": int(escala), "mediana_razao": mediana}, ensure_ascii=False))
+    regressoes = sum(1 for *_, tipo in diferencas if tipo == "regressao")
+    print(json.dumps({"baseline": args.baseline, "commit_baseline": base["meta"].get("commit"), "regressoes": regressoes,
+                      "melhoras": len(diferencas) - regressoes}))
+    if regressoes: sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark da busca textual (FTS5) em /api/lancamentos/search.
+
+Uso: python scripts/bench_busca.py [--linhas 500000] [--repeticoes 50]
+
+Cria um banco SQLite temporário (via DATABASE_URL) com um usuário e --linhas lançamentos
+de descrições variadas em 5 anos, e mede p50/p99 da rota de busca (com o cliente de teste
+logado) para termos raros, comuns, prefixos curtos e com filtros de período e conta.
+Também mede a carga: os lançamentos entram por INSERT ... SELECT, passando pelos gatilhos
+que alimentam o índice.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from datetime import date
+
+tmp = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+os.environ.setdefault('TELEGRAM_TOKEN', '0:bench')
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from werkzeug.security import generate_password_hash
+
+from app import app, db, User, Conta, Subtipo, Categoria, preparar_usuario, como_usuario, inicializar_banco
+
+HOJE = date.today()
+DESCRICOES = [
+    "Aluguel apartamento", "Condomínio", "Conta de luz", "Conta de água", "Internet fibra", "Supermercado Pão de Açúcar",
+    "Mercado Extra", "Padaria São José", "Posto Shell", "Posto Ipiranga", "Farmácia Drogasil", "Uber viagem", "iFood pedido",
+    "Restaurante japonês", "Academia Smart Fit", "Netflix", "Spotify", "Salário", "Pix recebido", "Transferência enviada",
+    "Pagamento fatura cartão", "Seguro do carro", "IPVA", "Mensalidade escola", "Plano de saúde", "Cinema", "Livraria Cultura",
+    "Pet shop", "Manutenção carro", "Estacionamento",
+]
+SUBTIPOS = ["Moradia", "Alimentação", "Transporte", "Saúde", "Lazer", "Educação", "Serviços", "Salário"]
+BUSCAS = [
+    ("raro", {"q": "livraria"}),
+    ("comum", {"q": "conta"}),
+    ("acento", {"q": "pao acucar"}),
+    ("prefixo_2", {"q": "po"}),
+    ("prefixo_3", {"q": "mer"}),
+    ("classificacao", {"q": "saude"}),
+    ("mes", {"q": "mercado", "mes": f"{HOJE:%Y-%m}"}),
+    ("conta", {"q": "posto", "conta_id": None}),
+]
+SENHA = generate_password_hash("bench", method="pbkdf2:sha256:1")
+
+INSERIR_LANCAMENTOS = db.text("""
+    WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < :linhas - 1)
+    INSERT INTO lancamento (usuario_id, data, descricao, tipo_id, subtipo_id, categoria_id, conta_id, valor_centavos, efetivado)
+    SELECT :uid, date(:inicio, '+' || (abs(random()) % 1826) || ' days'),
+           json_extract(:descricoes, '$[' || (abs(random()) % :d) || ']') || ' ' || (i % 997),
+           2, json_extract(:subtipos, '$[' || (i % :s) || ']'), json_extract(:categorias, '$[' || (i % :s) || ']'),
+           json_extract(:contas, '$[' || (i % 2) || ']'), 100 + abs(random()) % 200000, 1
+    FROM n
+""")
+
+
+def popular(linhas):
+    user = User(username="bench", password_hash=SENHA); db.session.add(user); db.session.commit()
+    uid = user.id; preparar_usuario(uid)
+    with como_usuario(uid):
+        db.session.add(Conta(nome="Banco", tipo="banco"))
+        subtipos = [Subtipo(nome=nome, tipo_id=2) for nome in SUBTIPOS]; db.session.add_all(subtipos); db.session.flush()
+        categorias = [Categoria(nome=f"{s.nome} geral", subtipo_id=s.id) for s in subtipos]; db.session.add_all(categorias); db.session.flush()
+        contas = [c.id for c in Conta.query.order_by(Conta.id)]
+        inicio = time.perf_counter()
+        db.session.execute(INSERIR_LANCAMENTOS, {
+            "uid": uid, "linhas": linhas, "inicio": date(HOJE.year - 4, 1, 1).isoformat(), "d": len(DESCRICOES), "s": len(subtipos),
+            "descricoes": json.dumps(DESCRICOES), "subtipos": json.dumps([s.id for s in subtipos]),
+            "categorias": json.dumps([c.id for c in categorias]), "contas": json.dumps(contas)})
+        db.session.commit()
+    return contas[-1], time.perf_counter() - inicio
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=500000)
+    parser.add_argument("--repeticoes", type=int, default=50)
+    args = parser.parse_args()
+
+    inicializar_banco()
+    with app.app_context():
+        conta_id, carga = popular(args.linhas)
+    print(json.dumps({"linhas": args.linhas, "carga_s": round(carga, 1)}))
+
+    cliente = app.test_client()
+    cliente.post("/login", data={"username": "bench", "password": "bench"})
+    for nome, params in BUSCAS:
+        params = {**params, "limite": 50, **({"conta_id": conta_id} if "conta_id" in params else {})}
+        tempos = []
+        for _ in range(args.repeticoes):
+            inicio = time.perf_counter()
+            resp = cliente.get("/api/lancamentos/search", query_string=params); resp.get_data()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+            assert resp.status_code == 200, (nome, resp.status_code)
+        print(json.dumps({"busca": nome, "params": params, "resultados": len(resp.json["itens"]),
+                          "p50_ms": round(percentil(tempos, 50), 2), "p99_ms": round(percentil(tempos, 99), 2)}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
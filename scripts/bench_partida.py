@@ -0,0 +1,88 @@
+"""Tempo de partida: do início do processo até a primeira resposta do app.
+
+Uso: python scripts/bench_partida.py [--repeticoes 10] [--importtime 15]
+
+Prepara um banco temporário (como no deploy, onde `flask --app app inicializar-banco`
+roda antes do gunicorn) e, a cada repetição, sobe um processo Python novo que importa o
+app e atende GET /login pelo test_client. Mede, em medianas: o import do Flask, do
+Flask-SQLAlchemy e do Flask-Login (o piso, fora do alcance do app), o resto do import do app
+(módulo, modelos, rotas), a primeira requisição, a soma deles (partida_ms: do import à
+primeira resposta, a meta de 200 ms) e o processo inteiro visto de fora (processo_ms, com o
+interpretador). Com --importtime N, lista os N módulos que mais pesam no import (python -X
+importtime, tempo acumulado).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+META_MS = 200
+
+# Roda no processo filho: os tempos internos saem em JSON na última linha
+FILHO = """
+import time, json; inicio = time.perf_counter()
+import flask, flask_sqlalchemy, flask_login
+bibliotecas = time.perf_counter()
+import app
+importado = time.perf_counter()
+resposta = app.app.test_client().get('/login')
+fim = time.perf_counter()
+print(json.dumps({"bibliotecas_ms": (bibliotecas - inicio) * 1000, "app_ms": (importado - bibliotecas) * 1000,
+                  "requisicao_ms": (fim - importado) * 1000, "partida_ms": (fim - inicio) * 1000, "status": resposta.status_code}))
+"""
+
+
+def ambiente(pasta):
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(pasta, 'partida.db'), METRICAS_DIR=os.path.join(pasta, 'metricas'))
+    env.pop('TELEGRAM_TOKEN', None)
+    return env
+
+
+def medir(env):
+    comeco = time.perf_counter()
+    saida = subprocess.run([sys.executable, '-c', FILHO], cwd=RAIZ, env=env, capture_output=True, text=True, check=True)
+    processo = (time.perf_counter() - comeco) * 1000
+    return {**json.loads(saida.stdout.strip().splitlines()[-1]), "processo_ms": processo}
+
+
+def mais_pesados(env, quantos):
+    """[(ms acumulados, módulo)] dos imports de primeiro nível mais caros do `import app`."""
+    saida = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=RAIZ, env=env, capture_output=True, text=True, check=True)
+    modulos = []
+    for linha in saida.stderr.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha: continue
+        _, acumulado, nome = linha.split('|')
+        # Recuo de dois espaços: importado direto pelo app (ou pelo próprio interpretador)
+        if nome.startswith('  ') and not nome.startswith('    '): modulos.append((int(acumulado) / 1000, nome.strip()))
+    return sorted(modulos, reverse=True)[:quantos]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticoes", type=int, default=10)
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="lista os N imports mais caros")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        env = ambiente(pasta)
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'inicializar-banco'], cwd=RAIZ, env=env, capture_output=True, check=True)
+        medir(env)  # Aquece o cache de bytecode (__pycache__) e o do sistema de arquivos
+        medidas = [medir(env) for _ in range(args.repeticoes)]
+        if args.importtime:
+            for ms, nome in mais_pesados(env, args.importtime): print(f"{ms:8.1f} ms  {nome}")
+
+    if any(m["status"] != 200 for m in medidas): raise SystemExit(f"GET /login respondeu {medidas[0]['status']}")
+    chaves = ("bibliotecas_ms", "app_ms", "requisicao_ms", "partida_ms", "processo_ms")
+    medianas = {chave: round(statistics.median(m[chave] for m in medidas), 1) for chave in chaves}
+    print(json.dumps({**medianas, "repeticoes": args.repeticoes, "meta_ms": META_MS}))
+    print(f"do import à primeira resposta: {medianas['partida_ms']:.0f} ms ({'dentro' if medianas['partida_ms'] < META_MS else 'acima'} "
+          f"da meta de {META_MS} ms), {medianas['bibliotecas_ms']:.0f} ms deles no Flask/SQLAlchemy")
+
+
+if __name__ == "__main__":
+    main()
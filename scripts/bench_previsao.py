@@ -0,0 +1,106 @@
+"""Benchmark da previsão de caixa: laço em Python (mês a mês, dia a dia) x arrays NumPy.
+
+Uso: python scripts/bench_previsao.py [100 500 2000]
+
+Cria um banco SQLite temporário (via DATABASE_URL) com N vencimentos recorrentes
+ativos e mede a projeção de 5 anos: só o cálculo (recorrencia.prever_caixa) e a
+consulta completa (app.previsao_caixa, com as leituras do banco).
+"""
+import os
+import sys
+import json
+import time
+import random
+import calendar
+import tempfile
+from datetime import date, timedelta
+
+tmp = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+os.environ.setdefault('TELEGRAM_TOKEN', '0:bench')
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from app import app, db, User, Conta, Vencimento, Subtipo, previsao_caixa, preparar_usuario, como_usuario, inicializar_banco
+from recorrencia import ocorrencias_fixas, prever_caixa, serie_meses
+
+MESES = 60
+
+
+def popular(total):
+    rnd = random.Random(42)
+    subtipo = Subtipo.query.first(); conta_id = db.session.query(Conta.id).scalar()
+    atual = Vencimento.query.count()
+    db.session.add_all([Vencimento(
+        descricao=f"Recorrência {i}", tipo='fixo' if i % 10 else 'variavel', dia=rnd.randint(1, 31),
+        data_vencimento=date(2026 + rnd.randint(0, 4), rnd.randint(1, 12), rnd.randint(1, 28)), ativo=True,
+        valor_centavos=rnd.randint(1000, 500000), tipo_id=rnd.choice([1, 2]), subtipo_id=subtipo.id, conta_id=conta_id
+    ) for i in range(atual, total)])
+    db.session.commit()
+
+
+def laco_python(vencimentos, hoje, saldo):
+    # Referência: cada vencimento em cada mês, depois o saldo dia a dia
+    fim = date(hoje.year + (hoje.month - 1 + MESES) // 12, (hoje.month - 1 + MESES) % 12 + 1, 1)
+    diario = {}
+    for v in vencimentos:
+        valor = v.valor_centavos if v.tipo_id == 1 else -v.valor_centavos
+        if v.tipo == 'variavel':
+            if hoje <= v.data_vencimento < fim: diario[v.data_vencimento] = diario.get(v.data_vencimento, 0) + valor
+            continue
+        ano, mes = hoje.year, hoje.month
+        for _ in range(MESES):
+            d = date(ano, mes, min(v.dia, calendar.monthrange(ano, mes)[1]))
+            if d >= hoje: diario[d] = diario.get(d, 0) + valor
+            ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    meses, dia = {}, hoje
+    while dia < fim:
+        saldo += diario.get(dia, 0)
+        m = meses.setdefault((dia.year, dia.month), [saldo, saldo])
+        m[0] = saldo; m[1] = min(m[1], saldo)
+        dia += timedelta(days=1)
+    return meses
+
+
+def vetorizado(vencimentos, hoje, saldo):
+    fixos = [v for v in vencimentos if v.tipo == 'fixo']
+    variaveis = [v for v in vencimentos if v.tipo == 'variavel' and v.data_vencimento >= hoje]
+    datas, mascara = ocorrencias_fixas([v.dia for v in fixos], ['NaT'] * len(fixos), hoje, serie_meses(hoje, MESES), hoje)
+    valores = np.array([v.valor_centavos if v.tipo_id == 1 else -v.valor_centavos for v in fixos], dtype=np.int64)[:, None]
+    fluxos = [(datas[mascara], np.broadcast_to(valores, datas.shape)[mascara]),
+              (np.array([v.data_vencimento for v in variaveis], dtype='datetime64[D]'),
+               np.array([v.valor_centavos if v.tipo_id == 1 else -v.valor_centavos for v in variaveis], dtype=np.int64))]
+    return prever_caixa(hoje, MESES, saldo, fluxos)
+
+
+def medir(fn, repeticoes=5):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter(); fn(); tempos.append((time.perf_counter() - inicio) * 1000)
+    return min(tempos)
+
+
+def main():
+    escalas = [int(n) for n in sys.argv[1:]] or [100, 500, 2000]
+    hoje = date.today()
+    inicializar_banco()
+    with app.app_context():
+        usuario = User(username="bench", password_hash="-"); db.session.add(usuario); db.session.commit()
+        uid = usuario.id; preparar_usuario(uid)
+    with app.app_context(), como_usuario(uid):
+        db.session.add(Subtipo(nome="Bench", tipo_id=2)); db.session.commit()
+        for n in sorted(escalas):
+            popular(n)
+            vencimentos = Vencimento.query.all()
+            ref, vet = laco_python(vencimentos, hoje, 0), vetorizado(vencimentos, hoje, 0)
+            assert [s for s, _ in ref.values()] == vet["saldo"].tolist(), "resultados diferentes"
+            python_ms = medir(lambda: laco_python(vencimentos, hoje, 0))
+            numpy_ms = medir(lambda: vetorizado(vencimentos, hoje, 0))
+            completo_ms = medir(lambda: previsao_caixa(hoje, MESES))
+            print(json.dumps({"recorrencias": n, "meses": MESES, "python_ms": round(python_ms, 2), "numpy_ms": round(numpy_ms, 2),
+                              "ganho": round(python_ms / numpy_ms, 1), "endpoint_ms": round(completo_ms, 2)}))
+
+
+if __name__ == "__main__":
+    main()
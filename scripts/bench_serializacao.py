@@ -0,0 +1,79 @@
+"""Benchmark da serialização de lançamentos: N+1 (to_dict antigo) x JOIN em lote.
+
+Uso: python scripts/bench_serializacao.py [1000 10000 100000]
+
+Cria um banco SQLite temporário (via DATABASE_URL), popula com N lançamentos
+e mede o tempo para serializar todos eles em JSON pelos dois caminhos.
+"""
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+from datetime import date
+
+tmp = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+os.environ.setdefault('TELEGRAM_TOKEN', '0:bench')
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, db, User, Lancamento, Tipo, Subtipo, Categoria, Conta, consulta_serializada, stream_json_lista, cache_dimensoes, preparar_usuario, como_usuario, inicializar_banco
+
+
+def to_dict_legado(l):
+    # Reprodução do Lancamento.to_dict anterior: quatro buscas por linha
+    t = db.session.get(Tipo, l.tipo_id)
+    s = db.session.get(Subtipo, l.subtipo_id)
+    c = db.session.get(Categoria, l.categoria_id) if l.categoria_id else None
+    conta = db.session.get(Conta, l.conta_id) if l.conta_id else None
+    return {
+        "id": l.id, "data": l.data.isoformat(), "descricao": l.descricao,
+        "tipo": t.nome if t else "N/A", "subtipo": s.nome if s else "N/A",
+        "categoria": c.nome if c else "-", "conta": conta.nome if conta else "Padrão",
+        "conta_id": l.conta_id, "valor": l.valor, "efetivado": l.efetivado, "comprovante": l.comprovante
+    }
+
+
+def popular(total, usuario_id):
+    rnd = random.Random(42)
+    subtipos = [s.id for s in Subtipo.query.all()]
+    categorias = [c.id for c in Categoria.query.all()]
+    contas = [c.id for c in Conta.query.all()]
+    atual = Lancamento.query.count()
+    linhas = [{
+        "data": date(rnd.randint(2019, 2025), rnd.randint(1, 12), rnd.randint(1, 28)),
+        "descricao": f"Lançamento {i}", "tipo_id": rnd.randint(1, 2), "subtipo_id": rnd.choice(subtipos),
+        "categoria_id": rnd.choice(categorias), "conta_id": rnd.choice(contas),
+        "valor_centavos": rnd.randint(100, 200000), "efetivado": rnd.random() < 0.7, "comprovante": None, "usuario_id": usuario_id
+    } for i in range(atual, total)]
+    if linhas:
+        db.session.execute(db.insert(Lancamento), linhas)
+        db.session.commit()
+
+
+def medir(fn):
+    db.session.expunge_all()
+    inicio = time.perf_counter()
+    fn()
+    return (time.perf_counter() - inicio) * 1000
+
+
+def main():
+    escalas = [int(n) for n in sys.argv[1:]] or [1000, 10000, 100000]
+    resultado = []
+    inicializar_banco()
+    with app.app_context():
+        usuario = User(username="bench", password_hash="-"); db.session.add(usuario); db.session.commit()
+        uid = usuario.id; preparar_usuario(uid)
+    with app.app_context(), como_usuario(uid):
+        for n in sorted(escalas):
+            popular(n, uid)
+            legado = medir(lambda: json.dumps([to_dict_legado(l) for l in Lancamento.query.all()]))
+            lote = medir(lambda: ''.join(stream_json_lista(consulta_serializada(Lancamento.query).yield_per(1000), cache_dimensoes.obter())))
+            resultado.append({"lancamentos": n, "n_mais_1_ms": round(legado, 1), "join_ms": round(lote, 1), "ganho": round(legado / lote, 1)})
+            print(json.dumps(resultado[-1]))
+
+
+if __name__ == "__main__":
+    main()
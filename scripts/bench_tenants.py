@@ -0,0 +1,130 @@
+"""Benchmark multiusuário: latência das rotas do dashboard conforme cresce o número de usuários.
+
+Uso: python scripts/bench_tenants.py [--usuarios 1 10 100 1000] [--linhas 10000] [--amostra 20] [--repeticoes 20]
+
+Cria um banco SQLite temporário (via DATABASE_URL) e vai acrescentando usuários, cada um
+com --linhas lançamentos em 5 anos, 3 contas (uma de cartão), 10 subtipos e 5 vencimentos
+recorrentes. A cada degrau mede, com o cliente de teste logado como uma amostra fixa de
+usuários, p50/p99 das rotas de dashboard e planejamento. Com o filtro do dono nos índices
+(ix_lancamento_usuario_data, uq_resumo_chave...) as latências ficam planas enquanto o banco
+cresce; sem ele cada consulta percorreria os lançamentos de todos os usuários.
+
+Imprime uma linha JSON por degrau e rota, e no fim a variação do p50 entre o primeiro e o
+último degrau.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from datetime import date
+
+tmp = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+os.environ.setdefault('TELEGRAM_TOKEN', '0:bench')
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from werkzeug.security import generate_password_hash
+
+from app import app, db, User, Conta, Subtipo, Categoria, Vencimento, preparar_usuario, reconstruir_resumo, como_usuario, inicializar_banco
+
+HOJE = date.today()
+ROTAS = [
+    "/api/config",
+    f"/api/lancamentos?mes={HOJE:%Y-%m}&limite=100",
+    f"/api/resumo?mes={HOJE:%Y-%m}",
+    "/api/anos_disponiveis",
+    f"/api/planejamento?ano={HOJE.year}",
+    "/api/contas/saldos?meses=12",
+    "/api/previsao?meses=12",
+]
+# Senha de custo mínimo: o benchmark mede as consultas, não o hash do login
+SENHA = generate_password_hash("bench", method="pbkdf2:sha256:1")
+
+# Lançamentos gerados no próprio SQLite: um INSERT ... SELECT por usuário
+INSERIR_LANCAMENTOS = db.text("""
+    WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < :linhas - 1)
+    INSERT INTO lancamento (usuario_id, data, descricao, tipo_id, subtipo_id, conta_id, valor_centavos, efetivado)
+    SELECT :uid, date(:inicio, '+' || (abs(random()) % 1826) || ' days'), 'Lançamento ' || i,
+           json_extract(:tipos, '$[' || (i * 7 % :k) || ']'), json_extract(:subtipos, '$[' || (i * 7 % :k) || ']'),
+           json_extract(:contas, '$[' || (i % 3) || ']'), 100 + abs(random()) % 200000, i % 10 < 7
+    FROM n
+""")
+
+
+def criar_usuario(indice, linhas, rnd):
+    user = User(username=f"bench{indice}", password_hash=SENHA); db.session.add(user); db.session.commit()
+    uid = user.id; preparar_usuario(uid)
+    with como_usuario(uid):
+        db.session.add_all([Conta(nome="Banco", tipo="banco"), Conta(nome="Cartão", tipo="cartao_credito", dia_fechamento=5)])
+        db.session.add_all([Subtipo(nome=f"Subtipo {i}", tipo_id=1 if i < 2 else 2) for i in range(8)])
+        db.session.flush()
+        subtipos = Subtipo.query.order_by(Subtipo.id).all(); contas = [c.id for c in Conta.query.order_by(Conta.id)]
+        db.session.add_all([Categoria(nome=f"Categoria {i}", subtipo_id=s.id) for s in subtipos for i in range(2)])
+        db.session.add_all([Vencimento(descricao=f"Conta {i}", tipo="fixo", dia=rnd.randint(1, 28), ativo=True, valor_centavos=rnd.randint(5000, 300000),
+                                       tipo_id=subtipos[-1].tipo_id, subtipo_id=subtipos[-1].id, conta_id=contas[0]) for i in range(5)])
+        db.session.execute(INSERIR_LANCAMENTOS, {
+            "uid": uid, "linhas": linhas, "inicio": date(HOJE.year - 4, 1, 1).isoformat(), "k": len(subtipos),
+            "tipos": json.dumps([s.tipo_id for s in subtipos]), "subtipos": json.dumps([s.id for s in subtipos]), "contas": json.dumps(contas)})
+        reconstruir_resumo(uid)
+        db.session.commit()
+    return uid
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+def medir(usuarios, repeticoes):
+    """{rota: [ms]} com o cliente de teste logado como cada usuário da amostra."""
+    tempos = {rota: [] for rota in ROTAS}
+    for nome in usuarios:
+        cliente = app.test_client()
+        cliente.post("/login", data={"username": nome, "password": "bench"})
+        for rota in ROTAS:
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                resp = cliente.get(rota); resp.get_data()
+                tempos[rota].append((time.perf_counter() - inicio) * 1000)
+                assert resp.status_code == 200, (rota, resp.status_code)
+    return tempos
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--usuarios", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--linhas", type=int, default=10000, help="lançamentos por usuário")
+    parser.add_argument("--amostra", type=int, default=20, help="usuários medidos em cada degrau")
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    inicializar_banco()
+    rnd = random.Random(42); criados = 0; degraus = []
+    for alvo in sorted(args.usuarios):
+        inicio = time.perf_counter()
+        with app.app_context():
+            while criados < alvo:
+                criar_usuario(criados, args.linhas, rnd); criados += 1
+        carga = time.perf_counter() - inicio
+        # A mesma amostra em todos os degraus (os primeiros usuários), mais alguns dos recém-criados
+        fixos = list(range(min(args.amostra // 2 or 1, criados)))
+        sorteados = rnd.sample(range(criados), min(args.amostra - len(fixos), criados))
+        amostra = [f"bench{i}" for i in sorted(set(fixos + sorteados))]
+        tempos = medir(amostra, args.repeticoes)
+        tamanho = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp) if f.startswith("bench.db")) / 2 ** 20
+        degrau = {"usuarios": criados, "lancamentos": criados * args.linhas, "banco_mb": round(tamanho, 1), "carga_s": round(carga, 1), "rotas": {}}
+        for rota, valores in tempos.items():
+            degrau["rotas"][rota] = {"p50_ms": round(percentil(valores, 50), 2), "p99_ms": round(percentil(valores, 99), 2)}
+        degraus.append(degrau)
+        print(json.dumps(degrau, ensure_ascii=False), flush=True)
+
+    primeiro, ultimo = degraus[0], degraus[-1]
+    print(json.dumps({"variacao_p50": {rota: round(ultimo["rotas"][rota]["p50_ms"] / primeiro["rotas"][rota]["p50_ms"], 2) for rota in ROTAS},
+                      "de": primeiro["usuarios"], "ate": ultimo["usuarios"]}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
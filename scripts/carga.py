@@ -0,0 +1,90 @@
+"""Teste de carga simples contra um servidor já em execução.
+
+Uso:
+  python scripts/carga.py --url http://localhost:5000 --usuario admin --senha xxx \
+      --concorrencia 16 --duracao 20
+
+Cada thread faz login e repete as rotas do carregamento do dashboard. Com
+--escritas 0.2, 20% das requisições alternam o status de um lançamento do mês
+(escrita + atualização do resumo), para exercitar o lock de escrita do SQLite.
+Ao final imprime requisições por segundo e latências p50/p99 (em JSON) por rota e no total.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import date
+
+import requests
+
+ROTAS = [
+    "/api/config",
+    "/api/lancamentos?mes={mes}&limite=100",
+    "/api/resumo?mes={mes}",
+    "/api/anos_disponiveis",
+    "/api/planejamento?ano={ano}",
+]
+ROTA_ESCRITA = "/api/lancamentos/{id}/status"
+
+
+def percentil(valores, p):
+    if not valores: return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+def trabalhador(args, fim, latencias, erros, trava):
+    s = requests.Session()
+    s.post(args.url + "/login", data={"username": args.usuario, "password": args.senha})
+    hoje = date.today()
+    urls = [(r, args.url + r.format(mes=hoje.strftime("%Y-%m"), ano=hoje.year)) for r in ROTAS]
+    ids = [l["id"] for l in s.get(urls[1][1]).json()["itens"]] if args.escritas else []
+    rnd = random.Random()
+    locais = {r: [] for r in ROTAS + [ROTA_ESCRITA]}; falhas = 0; i = 0
+    while time.perf_counter() < fim:
+        if ids and rnd.random() < args.escritas:
+            rota, metodo, url = ROTA_ESCRITA, s.patch, args.url + ROTA_ESCRITA.format(id=rnd.choice(ids))
+        else:
+            (rota, url), metodo = urls[i % len(urls)], s.get; i += 1
+        inicio = time.perf_counter()
+        try:
+            ok = metodo(url, timeout=30).status_code == 200
+        except requests.RequestException:
+            ok = False
+        locais[rota].append((time.perf_counter() - inicio) * 1000)
+        if not ok: falhas += 1
+    with trava:
+        for r, v in locais.items(): latencias[r].extend(v)
+        erros[0] += falhas
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--url", default="http://localhost:5000")
+    p.add_argument("--usuario", required=True)
+    p.add_argument("--senha", required=True)
+    p.add_argument("--concorrencia", type=int, default=16)
+    p.add_argument("--duracao", type=float, default=20)
+    p.add_argument("--escritas", type=float, default=0.0, help="fração de requisições de escrita (0 a 1)")
+    args = p.parse_args()
+
+    latencias = {r: [] for r in ROTAS + [ROTA_ESCRITA]}; erros = [0]; trava = threading.Lock()
+    fim = time.perf_counter() + args.duracao
+    threads = [threading.Thread(target=trabalhador, args=(args, fim, latencias, erros, trava)) for _ in range(args.concorrencia)]
+    inicio = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    decorrido = time.perf_counter() - inicio
+
+    todas = [v for vs in latencias.values() for v in vs]
+    resultado = {
+        "concorrencia": args.concorrencia, "duracao_s": round(decorrido, 1), "requisicoes": len(todas), "erros": erros[0],
+        "rps": round(len(todas) / decorrido, 1), "p50_ms": round(percentil(todas, 50), 1), "p99_ms": round(percentil(todas, 99), 1),
+        "rotas": {r: {"n": len(v), "p50_ms": round(percentil(v, 50), 1), "p99_ms": round(percentil(v, 99), 1)} for r, v in latencias.items()},
+    }
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Gerador de dados sintéticos, reproduzível pela semente, para benchmarks e testes manuais.
+
+Uso: python scripts/dados_sinteticos.py --lancamentos 100000 [--seed 42] [--banco dados/sintetico.db] [--usuario demo --senha demo]
+
+Preenche o schema do app para um usuário: contas (banco, cartão, investimento), subtipos e
+categorias de Entrada e Saída, vencimentos (fixos e variáveis, parte recorrentes) e
+lançamentos espalhados pelos últimos --anos anos, com alguns pendentes no futuro. Os
+lançamentos são gerados em blocos de BLOCO linhas, cada um com o seu próprio Random
+(semente, bloco): a linha i é sempre a mesma, e um banco de 10 mil linhas são as
+primeiras 10 mil de um de 1 milhão. Crescer um banco (popular_lancamentos com `inicio`)
+dá o mesmo resultado que gerá-lo de uma vez.
+
+As datas são relativas a `hoje`: a distribuição pelo mês atual, pelos anos anteriores e
+pelo futuro é a mesma em qualquer dia. Importa o app só dentro das funções, para quem
+importar este módulo poder definir DATABASE_URL antes.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+BLOCO = 10000
+# (nome, tipo_id, categorias, descrições, faixa de valor em reais)
+SUBTIPOS = [
+    ("Salário", 1, ["Mensal", "13º", "Férias"], ["Salário", "Adiantamento salarial", "Bônus"], (3000, 12000)),
+    ("Rendimentos", 1, ["Poupança", "CDB", "Dividendos"], ["Rendimento poupança", "Juros CDB", "Dividendos ações"], (5, 800)),
+    ("Reembolsos", 1, ["Saúde", "Trabalho"], ["Reembolso plano de saúde", "Reembolso despesas", "Pix recebido"], (20, 1500)),
+    ("Moradia", 2, ["Aluguel", "Condomínio", "Energia", "Água", "Internet"],
+     ["Aluguel apartamento", "Condomínio", "Conta de luz", "Conta de água", "Internet fibra", "IPTU"], (80, 3500)),
+    ("Alimentação", 2, ["Supermercado", "Restaurante", "Delivery", "Padaria"],
+     ["Supermercado Pão de Açúcar", "Mercado Extra", "Padaria São José", "Restaurante japonês", "iFood pedido", "Açougue"], (8, 900)),
+    ("Transporte", 2, ["Combustível", "Aplicativo", "Manutenção", "Estacionamento"],
+     ["Posto Shell", "Posto Ipiranga", "Uber viagem", "99 corrida", "Manutenção carro", "Estacionamento"], (10, 1200)),
+    ("Saúde", 2, ["Farmácia", "Consultas", "Plano"], ["Farmácia Drogasil", "Consulta médica", "Plano de saúde", "Exame laboratorial"], (15, 1800)),
+    ("Lazer", 2, ["Streaming", "Cinema", "Viagens"], ["Netflix", "Spotify", "Cinema", "Passagem aérea", "Hotel"], (15, 4000)),
+    ("Educação", 2, ["Escola", "Cursos", "Livros"], ["Mensalidade escola", "Curso online", "Livraria Cultura"], (30, 2500)),
+    ("Compras", 2, ["Roupas", "Casa", "Eletrônicos"], ["Loja de roupas", "Magazine Luiza", "Amazon pedido", "Pet shop"], (20, 3000)),
+]
+CONTAS = [("Conta Corrente", "banco", None, 6), ("Cartão de Crédito", "cartao_credito", 5, 3), ("Investimentos", "investimento", None, 1)]
+# Peso de cada subtipo no sorteio: saídas do dia a dia são a maioria das linhas
+PESOS = [2, 1, 1, 4, 10, 6, 3, 3, 1, 3]
+FUTURO_DIAS = 90  # Até quanto à frente vão os pendentes
+
+
+def popular_dimensoes(usuario_id, seed=42, vencimentos=20, hoje=None):
+    """Contas, subtipos, categorias e vencimentos do usuário. Devolve o catálogo usado pelos lançamentos."""
+    from app import db, Conta, Subtipo, Categoria, Vencimento, preparar_usuario, projetar_vencimentos, como_usuario
+    hoje = hoje or date.today(); rnd = random.Random(f"{seed}:dimensoes")
+    preparar_usuario(usuario_id)
+    with como_usuario(usuario_id):
+        contas = [Conta(nome=nome, tipo=tipo, dia_fechamento=fechamento) for nome, tipo, fechamento, _ in CONTAS]
+        subtipos = [Subtipo(nome=nome, tipo_id=tipo_id) for nome, tipo_id, *_ in SUBTIPOS]
+        db.session.add_all(contas + subtipos); db.session.flush()
+        categorias = [[Categoria(nome=nome, subtipo_id=s.id) for nome in cats] for s, (_, _, cats, *_) in zip(subtipos, SUBTIPOS)]
+        db.session.add_all([c for cats in categorias for c in cats]); db.session.flush()
+        for i in range(vencimentos):
+            j = rnd.choices(range(len(SUBTIPOS)), PESOS)[0]; s = subtipos[j]; _, _, _, descricoes, (minimo, maximo) = SUBTIPOS[j]
+            fixo = i % 4 != 3; recorrente = i % 2 == 0
+            db.session.add(Vencimento(
+                descricao=rnd.choice(descricoes), tipo='fixo' if fixo else 'variavel', dia=rnd.randint(1, 31) if fixo else None,
+                data_vencimento=None if fixo else hoje + timedelta(days=rnd.randint(0, 180)), ativo=i % 5 != 4,
+                valor_centavos=rnd.randint(minimo * 100, maximo * 100) if recorrente else None, tipo_id=s.tipo_id,
+                subtipo_id=s.id if recorrente else None, conta_id=contas[0].id))
+        db.session.commit()
+        # Os pendentes dos recorrentes antes dos lançamentos gerados: os ids não dependem de como o banco cresceu
+        projetar_vencimentos(hoje)
+        return {"contas": [c.id for c in contas], "subtipos": [(s.id, s.tipo_id) for s in subtipos],
+                "categorias": [[c.id for c in cats] for cats in categorias]}
+
+
+def linhas_bloco(bloco, catalogo, usuario_id, seed, hoje, anos):
+    """As BLOCO linhas do bloco, sempre as mesmas para a mesma semente."""
+    rnd = random.Random(f"{seed}:{bloco}")
+    dias = int(anos * 365.25); contas = catalogo["contas"]; pesos_contas = [peso for *_, peso in CONTAS]
+    linhas = []
+    for _ in range(BLOCO):
+        j = rnd.choices(range(len(SUBTIPOS)), PESOS)[0]; subtipo_id, tipo_id = catalogo["subtipos"][j]
+        _, _, _, descricoes, (minimo, maximo) = SUBTIPOS[j]
+        # 2% no futuro (pendentes); o resto nos últimos `anos`, mais denso perto de hoje
+        futuro = rnd.random() < 0.02
+        data = hoje + timedelta(days=rnd.randint(1, FUTURO_DIAS)) if futuro else hoje - timedelta(days=int(dias * rnd.random() ** 1.3))
+        # Valores em log: muitos pequenos, poucos grandes
+        valor = int(minimo * 100 * (maximo / minimo) ** rnd.random())
+        linhas.append(dict(
+            usuario_id=usuario_id, data=data, descricao=rnd.choice(descricoes), tipo_id=tipo_id, subtipo_id=subtipo_id,
+            categoria_id=rnd.choice(catalogo["categorias"][j]) if rnd.random() < 0.8 else None,
+            conta_id=contas[0] if tipo_id == 1 else rnd.choices(contas, pesos_contas)[0], valor_centavos=valor,
+            efetivado=not futuro and rnd.random() < 0.97, comprovante=None))
+    return linhas
+
+
+def popular_lancamentos(usuario_id, catalogo, total, inicio=0, seed=42, hoje=None, anos=5):
+    """Insere as linhas [inicio, total) e refaz os agregados do usuário. Devolve os segundos gastos."""
+    from app import db, Lancamento, reconstruir_resumo, como_usuario
+    hoje = hoje or date.today(); comeco = time.perf_counter()
+    with como_usuario(usuario_id):
+        for bloco in range(inicio // BLOCO, -(-total // BLOCO)):
+            primeira = bloco * BLOCO
+            linhas = linhas_bloco(bloco, catalogo, usuario_id, seed, hoje, anos)[max(inicio - primeira, 0):total - primeira]
+            # INSERT direto na tabela: os gatilhos da busca textual rodam, o resumo é refeito no fim
+            db.session.execute(Lancamento.__table__.insert(), linhas)
+        reconstruir_resumo(usuario_id)
+        db.session.commit()
+    return time.perf_counter() - comeco
+
+
+def criar_usuario(username, senha="demo"):
+    from werkzeug.security import generate_password_hash
+    from app import db, User
+    user = User(username=username, password_hash=generate_password_hash(senha)); db.session.add(user); db.session.commit()
+    return user.id
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lancamentos", type=int, default=10000)
+    parser.add_argument("--vencimentos", type=int, default=20)
+    parser.add_argument("--anos", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--banco", default=os.path.join("dados", "sintetico.db"), help="arquivo SQLite a criar (não pode existir)")
+    parser.add_argument("--usuario", default="demo")
+    parser.add_argument("--senha", default="demo")
+    args = parser.parse_args()
+
+    banco = os.path.abspath(args.banco)
+    if os.path.exists(banco): parser.error(f"{args.banco} já existe")
+    os.makedirs(os.path.dirname(banco), exist_ok=True)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + banco
+    os.environ.setdefault('TELEGRAM_TOKEN', '0:sintetico')
+    from app import app, inicializar_banco
+
+    inicializar_banco()
+    with app.app_context():
+        uid = criar_usuario(args.usuario, args.senha)
+        catalogo = popular_dimensoes(uid, args.seed, args.vencimentos)
+        segundos = popular_lancamentos(uid, catalogo, args.lancamentos, seed=args.seed, anos=args.anos)
+    print(f"{args.lancamentos} lançamentos em {segundos:.1f}s: DATABASE_URL=sqlite:///{banco} (login {args.usuario}/{args.senha})")
+
+
+if __name__ == "__main__":
+    main()
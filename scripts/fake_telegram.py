@@ -0,0 +1,91 @@
+"""Servidor local que imita a API de bots do Telegram, para testar o worker sem rede.
+
+Uso:
+  python scripts/fake_telegram.py --porta 8081
+  TELEGRAM_API_URL=http://localhost:8081 TELEGRAM_TOKEN=1:teste python worker.py
+
+Controle (JSON):
+  POST /_enviar     {"chat_id": 1, "text": "🔥 Vencendo Hoje"}  -> entrega a mensagem ao bot
+  GET  /_mensagens                                           -> mensagens que o bot enviou
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+estado = {"update_id": 0, "message_id": 0, "pendentes": [], "enviadas": []}
+trava = threading.Condition()
+
+
+def mensagem(chat_id, texto, de_bot=False):
+    estado["message_id"] += 1
+    return {
+        "message_id": estado["message_id"], "date": int(time.time()), "text": texto,
+        "chat": {"id": int(chat_id), "type": "private"},
+        "from": {"id": 0 if de_bot else int(chat_id), "is_bot": de_bot, "first_name": "bot" if de_bot else "usuario"},
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    def _json(self, corpo, status=200):
+        dados = json.dumps(corpo).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _params(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        if tamanho:
+            corpo = self.rfile.read(tamanho).decode()
+            params.update(json.loads(corpo) if corpo.startswith("{") else {k: v[0] for k, v in parse_qs(corpo).items()})
+        return url.path, params
+
+    def do_GET(self): self.tratar()
+    def do_POST(self): self.tratar()
+
+    def tratar(self):
+        caminho, p = self._params()
+        if caminho == "/_enviar":
+            with trava:
+                estado["update_id"] += 1
+                estado["pendentes"].append({"update_id": estado["update_id"], "message": mensagem(p["chat_id"], p["text"])})
+                trava.notify_all()
+            return self._json({"ok": True})
+        if caminho == "/_mensagens":
+            return self._json(estado["enviadas"])
+
+        metodo = caminho.rsplit("/", 1)[-1]
+        if metodo == "getMe":
+            return self._json({"ok": True, "result": {"id": 0, "is_bot": True, "first_name": "bot", "username": "fake_bot"}})
+        if metodo == "getUpdates":
+            offset = int(p.get("offset", 0)); espera = min(float(p.get("timeout", 0)), 5)
+            with trava:
+                estado["pendentes"] = [u for u in estado["pendentes"] if u["update_id"] >= offset]
+                if not estado["pendentes"]: trava.wait(espera)
+                return self._json({"ok": True, "result": list(estado["pendentes"])})
+        if metodo == "sendMessage":
+            msg = mensagem(p["chat_id"], p.get("text", ""), de_bot=True)
+            estado["enviadas"].append({"chat_id": int(p["chat_id"]), "text": msg["text"]})
+            print(f"-> {p['chat_id']}: {msg['text']}", flush=True)
+            return self._json({"ok": True, "result": msg})
+        return self._json({"ok": True, "result": True})
+
+    def log_message(self, *args): pass
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--porta", type=int, default=8081)
+    args = ap.parse_args()
+    print(f"API fake do Telegram em http://localhost:{args.porta}", flush=True)
+    ThreadingHTTPServer(("", args.porta), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+"""Parâmetros do servidor web comuns ao gunicorn.conf.py e ao app.py.
+
+Ficam num módulo à parte, sem dependências, para os dois lerem o mesmo padrão: o pool de
+conexões do app é dimensionado pelo número de threads de cada worker do gunicorn.
+"""
+import os
+
+# Conexões além de uma por thread: a requisição que ainda tem a da sessão quando abre outra
+# (exportações em streaming, o SSE) não espera por uma conexão de outra thread
+FOLGA_CONEXOES = 4
+
+
+def threads_web():
+    """Threads por worker (gthread), de WEB_THREADS. Lido na chamada: o app carrega o .env depois dos imports."""
+    return int(os.getenv("WEB_THREADS", 8))
+
+
+def feeds_por_processo():
+    """Streams SSE abertos ao mesmo tempo em cada worker (WEB_FEEDS). Cada um prende uma thread
+    enquanto dura; o padrão, metade das threads, deixa a outra metade para as demais rotas."""
+    return int(os.getenv("WEB_FEEDS", max(1, threads_web() // 2)))
@@ -6,6 +6,7 @@ let selConfig = { tipo: null, subtipo: null };
 let confirmCallback = null;
 
 async function init() {
+  abrirFeed();
   await carregarTudo();
 
   const hoje = new Date();
@@ -106,22 +107,27 @@ async function carregarSeletorAnos() {
 
 async function carregarTudo() {
   try {
-    const [l, t, s, c, cont] = await Promise.all([
-      fetch("/api/lancamentos").then((r) => r.json()),
-      fetch("/api/config/tipos").then((r) => r.json()),
-      fetch("/api/config/subtipos").then((r) => r.json()),
-      fetch("/api/config/categorias").then((r) => r.json()),
-      fetch("/api/config/contas").then((r) => r.json()) 
-    ]);
-    dados.lancamentos = l; dados.tipos = t; dados.subtipos = s; dados.categorias = c; dados.contas = cont;
+    // Endpoint único com ETag: sem mudanças, o navegador revalida e recebe 304 sem corpo
+    const cfg = await fetch("/api/config").then((r) => r.json());
+    dados.tipos = cfg.tipos; dados.subtipos = cfg.subtipos; dados.categorias = cfg.categorias; dados.contas = cfg.contas;
 
     renderConfigLists();
     renderContaSelector();
+    carregarSaldos();
     atualizarInterface();
     carregarSeletorAnos();
   } catch (e) { console.error(e); }
 }
 
+// Saldo atual de cada conta (e fatura aberta dos cartões), exibido na lista de contas
+async function carregarSaldos() {
+  try {
+    const r = await fetch("/api/contas/saldos?meses=1&faturas=1").then((r) => r.json());
+    dados.saldos = {}; r.contas.forEach(c => { dados.saldos[c.id] = c; });
+    renderConfigLists();
+  } catch (e) { console.error(e); }
+}
+
 function renderContaSelector() {
     const sel = document.getElementById("filtro-conta");
     if(!sel) return;
@@ -129,6 +135,8 @@ function renderContaSelector() {
     sel.innerHTML = '<option value="">Todas as Contas</option>';
     dados.contas.forEach(c => { sel.innerHTML += `<option value="${c.id}">${c.nome}</option>`; });
     sel.value = valorAtual;
+    const selImp = document.getElementById("importar-conta");
+    if(selImp) { selImp.innerHTML = '<option value="">Conta do arquivo / sem conta</option>'; dados.contas.forEach(c => { selImp.innerHTML += `<option value="${c.id}">${c.nome}</option>`; }); }
 }
 
 function renderConfigLists() {
@@ -157,7 +165,10 @@ function renderConfigLists() {
       dados.contas.forEach(c => {
           let icone = "💰";
           if(c.tipo === 'cartao_credito') icone = "💳"; if(c.tipo === 'investimento') icone = "📈"; if(c.tipo === 'vale') icone = "🍽️"; if(c.tipo === 'carteira') icone = "💵";
-          divContas.innerHTML += `<div class="list-group-item d-flex justify-content-between align-items-center"><span>${icone} <strong>${c.nome}</strong> <small class="text-muted">(${fmtTipoConta(c.tipo)})</small></span><span class="btn-excluir" onclick="prepararExclusao(this, 'contas', ${c.id}, event)">🗑️</span></div>`;
+          const sc = dados.saldos && dados.saldos[c.id];
+          let saldoHtml = "";
+          if (sc) saldoHtml = sc.faturas ? `<br><small class="text-warning-emphasis">Fatura aberta: ${fmtMoeda(sc.faturas[0].total)} (fecha ${sc.faturas[0].fechamento.split("-").reverse().join("/")})</small>` : `<br><small class="${sc.saldo < 0 ? "text-danger" : "text-success"}">Saldo: ${fmtMoeda(sc.saldo)}</small>`;
+          divContas.innerHTML += `<div class="list-group-item d-flex justify-content-between align-items-center"><span>${icone} <strong>${c.nome}</strong> <small class="text-muted">(${fmtTipoConta(c.tipo)})</small>${saldoHtml}</span><span class="btn-excluir" onclick="prepararExclusao(this, 'contas', ${c.id}, event)">🗑️</span></div>`;
       });
   }
   const tSel = dados.tipos.find((t) => t.id === selConfig.tipo); const sSel = dados.subtipos.find((s) => s.id === selConfig.subtipo);
@@ -183,7 +194,7 @@ function prepararExclusao(el, endpoint, id, event) {
 
 async function confirmarExclusao(endpoint, id) { 
     await fetch(`/api/config/${endpoint}?id=${id}`, { method: "DELETE" }); 
-    carregarTudo(); 
+    recarregarSemFeed(); 
 }
 
 // FORMULÁRIOS DE CONFIGURAÇÃO
@@ -194,7 +205,7 @@ if(formSubtipo) {
         if (!selConfig.tipo) return mostrarAviso("Selecione um Tipo primeiro.", "erro"); 
         await fetch("/api/config/subtipos", { method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify({ nome: document.getElementById("novo-subtipo-nome").value, tipo_id: selConfig.tipo }), }); 
         document.getElementById("novo-subtipo-nome").value = ""; 
-        carregarTudo(); 
+        recarregarSemFeed(); 
     }; 
 }
 const formCategoria = document.getElementById("form-categoria");
@@ -204,11 +215,13 @@ if(formCategoria) {
         if (!selConfig.subtipo) return mostrarAviso("Selecione um Subtipo primeiro.", "erro"); 
         await fetch("/api/config/categorias", { method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify({ nome: document.getElementById("novo-categoria-nome").value, subtipo_id: selConfig.subtipo }), }); 
         document.getElementById("novo-categoria-nome").value = ""; 
-        carregarTudo(); 
+        recarregarSemFeed(); 
     }; 
 }
 const formConta = document.getElementById("form-conta");
-if(formConta) { formConta.onsubmit = async (e) => { e.preventDefault(); await fetch("/api/config/contas", { method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify({ nome: document.getElementById("nova-conta-nome").value, tipo: document.getElementById("nova-conta-tipo").value }), }); document.getElementById("nova-conta-nome").value = ""; carregarTudo(); }; }
+if(formConta) { formConta.onsubmit = async (e) => { e.preventDefault(); const res = await fetch("/api/config/contas", { method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify({ nome: document.getElementById("nova-conta-nome").value, tipo: document.getElementById("nova-conta-tipo").value, dia_fechamento: document.getElementById("nova-conta-fechamento").value }), }); if (!res.ok) { mostrarAviso((await res.json()).erro, "erro"); return; } document.getElementById("nova-conta-nome").value = ""; document.getElementById("nova-conta-fechamento").value = ""; recarregarSemFeed(); }; }
+const selTipoConta = document.getElementById("nova-conta-tipo");
+if(selTipoConta) { selTipoConta.onchange = () => document.getElementById("nova-conta-fechamento").classList.toggle("d-none", selTipoConta.value !== "cartao_credito"); }
 
 window.prepararModal = () => {
   const inpData = document.getElementById("input-data"); if(inpData) inpData.value = new Date().toISOString().split("T")[0];
@@ -249,7 +262,7 @@ if(formLanc) {
       const res = await fetch("/api/lancamentos", { method: "POST", body: fd });
       if (res.ok) { 
           bootstrap.Modal.getInstance(document.getElementById("modalLancamento")).hide(); 
-          carregarTudo(); 
+          recarregarSemFeed(); 
       } else { 
           mostrarAviso("Erro ao salvar lançamento.", "erro"); 
       }
@@ -315,7 +328,7 @@ if(formPag) {
 
         bootstrap.Modal.getInstance(document.getElementById("modalPagamentoFatura")).hide();
         formPag.reset();
-        carregarTudo();
+        recarregarSemFeed();
         mostrarAviso("Pagamento registrado com sucesso!", "sucesso");
     };
 }
@@ -323,55 +336,139 @@ if(formPag) {
 // =========================================================
 // ATUALIZAÇÃO DA INTERFACE (TABELA RESPONSIVA)
 // =========================================================
-function atualizarInterface() {
-  const filtroMes = document.getElementById("filtro-mes"); const filtroConta = document.getElementById("filtro-conta"); if(!filtroMes) return;
-  const mes = filtroMes.value; const contaId = filtroConta ? filtroConta.value : ""; 
-  const lista = dados.lancamentos.filter((l) => { const mesmoMes = l.data.startsWith(mes); const mesmaConta = contaId === "" || String(l.conta_id) === contaId; return mesmoMes && mesmaConta; });
+// Busca no servidor apenas os lançamentos do mês/conta filtrados, seguindo o cursor de paginação
+async function carregarLancamentos(mes, contaId) {
+  const params = new URLSearchParams({ mes: mes, limite: 500 });
+  if (contaId) params.set("conta_id", contaId);
+  let itens = [];
+  let cursor = null;
+  do {
+    if (cursor) params.set("cursor", cursor);
+    const pagina = await fetch(`/api/lancamentos?${params}`).then((r) => r.json());
+    itens = itens.concat(pagina.itens || []);
+    cursor = pagina.proximo_cursor;
+  } while (cursor);
+  return itens;
+}
+
+// Busca textual em todos os meses (respeita o filtro de conta), dos mais relevantes para os menos
+async function buscarLancamentos(termo, contaId) {
+  const params = new URLSearchParams({ q: termo, limite: 200 });
+  if (contaId) params.set("conta_id", contaId);
+  const res = await fetch(`/api/lancamentos/search?${params}`);
+  return res.ok ? (await res.json()).itens : [];
+}
+function termoBusca() { const el = document.getElementById("busca-lancamentos"); const t = el ? el.value.trim() : ""; return t.length >= 2 ? t : ""; }
+
+async function atualizarInterface() {
+  const filtroMes = document.getElementById("filtro-mes"); const filtroConta = document.getElementById("filtro-conta"); if(!filtroMes || !filtroMes.value) return;
+  const mes = filtroMes.value; const contaId = filtroConta ? filtroConta.value : ""; const termo = termoBusca();
+  let resumo;
+  try {
+    [dados.lancamentos, resumo] = await Promise.all([termo ? buscarLancamentos(termo, contaId) : carregarLancamentos(mes, contaId), buscarResumo()]);
+  } catch (e) { console.error(e); return; }
   const tbody = document.getElementById("tabela-lancamentos-body");
   if(tbody) {
-      tbody.innerHTML = "";
-      let totalEntradas = 0; let totalSaidas = 0; let saldoDisponivel = 0; let faturaCartao = 0;
-      lista.sort((a, b) => new Date(b.data) - new Date(a.data));
-      lista.forEach((l) => {
-        const conta = dados.contas.find(c => c.id === l.conta_id); const ehCredito = conta && conta.tipo === 'cartao_credito';
-        if (l.efetivado) {
-            if (l.tipo === "Entrada") totalEntradas += l.valor; else totalSaidas += l.valor;
-            if (ehCredito) { if (l.tipo === 'Saída') faturaCartao += l.valor; else faturaCartao -= l.valor; } 
-            else { if (l.tipo === 'Entrada') saldoDisponivel += l.valor; else saldoDisponivel -= l.valor; }
-        }
-        const cor = l.tipo === "Entrada" ? "text-success" : "text-danger"; 
-        const anexoHtml = l.comprovante ? `<a href="/uploads/${l.comprovante}" target="_blank" class="text-decoration-none ms-2" title="Abrir Anexo">📎</a>` : ""; 
-        let iconConta = ehCredito ? '💳' : '🏦';
-        
-        // GERAÇÃO DAS LINHAS DA TABELA (RESPONSIVA)
-        // Note as classes 'd-none d-md-table-cell' para esconder colunas no mobile
-        tbody.innerHTML += `
-        <tr>
-            <td><input type="checkbox" class="form-check-input" onchange="toggleStatus(${l.id})" ${l.efetivado ? "checked" : ""}></td>
-            <td class="text-nowrap">${l.data.split("-").reverse().join("/")}</td>
-            <td><span class="badge bg-light text-dark border text-truncate" style="max-width: 90px; display: inline-block; vertical-align: middle;">${iconConta} ${l.conta || 'Geral'}</span></td>
-            <td class="text-truncate" style="max-width: 140px;" title="${l.descricao}">${l.descricao} ${anexoHtml}</td>
-            <td class="d-none d-md-table-cell">${l.tipo}</td>
-            <td class="d-none d-md-table-cell">${l.subtipo}</td>
-            <td class="d-none d-sm-table-cell text-truncate" style="max-width: 100px;">${l.categoria}</td>
-            <td class="${cor} fw-bold text-nowrap">${fmtMoeda(l.valor)}</td>
-            <td><button class="btn btn-sm btn-outline-danger border-0 py-0" onclick="delLanc(${l.id})"><i class="fa-solid fa-trash"></i></button></td>
-        </tr>`;
-      });
-      
-      const setTxt = (id, val) => { const el = document.getElementById(id); if(el) el.innerText = fmtMoeda(val); };
-      setTxt("card-saldo-disp", saldoDisponivel); setTxt("card-fatura", faturaCartao); setTxt("card-ent-geral", totalEntradas); setTxt("card-sai-geral", totalSaidas); setTxt("card-saldo-final", saldoDisponivel - faturaCartao);
-      
-      // Gráficos
-      drawChartBalanco(totalEntradas, totalSaidas); 
-      const ef = lista.filter((l) => l.efetivado); 
-      drawChart("chartEntSub", ef, "Entrada", "subtipo"); 
-      drawChart("chartEntCat", ef, "Entrada", "categoria"); 
-      drawChart("chartSaiSub", ef, "Saída", "subtipo"); 
-      drawChart("chartSaiCat", ef, "Saída", "categoria");
+      tbody.innerHTML = dados.lancamentos.map(linhaLancamento).join("");
+      desenharResumo(resumo);
   }
 }
 
+function linhaLancamento(l) {
+  const conta = dados.contas.find(c => c.id === l.conta_id); const ehCredito = conta && conta.tipo === 'cartao_credito';
+  const cor = l.tipo === "Entrada" ? "text-success" : "text-danger"; 
+  // Imagens abrem a prévia reduzida (gerada no servidor) e mostram a miniatura no lugar do clipe
+  const ehImagem = l.comprovante && /\.(jpe?g|png|webp|gif|bmp)$/i.test(l.comprovante);
+  const anexoHtml = !l.comprovante ? "" : ehImagem
+      ? `<a href="/uploads/${l.comprovante}?variante=previa" target="_blank" class="text-decoration-none ms-2" title="Abrir Anexo"><img src="/uploads/${l.comprovante}?variante=miniatura" loading="lazy" class="rounded border" style="height: 24px;" alt="📎"></a>`
+      : `<a href="/uploads/${l.comprovante}" target="_blank" class="text-decoration-none ms-2" title="Abrir Anexo">📎</a>`; 
+  let iconConta = ehCredito ? '💳' : '🏦';
+  
+  // GERAÇÃO DAS LINHAS DA TABELA (RESPONSIVA)
+  // Note as classes 'd-none d-md-table-cell' para esconder colunas no mobile
+  return `
+  <tr data-id="${l.id}">
+      <td><input type="checkbox" class="form-check-input" onchange="toggleStatus(${l.id})" ${l.efetivado ? "checked" : ""}></td>
+      <td class="text-nowrap">${l.data.split("-").reverse().join("/")}</td>
+      <td><span class="badge bg-light text-dark border text-truncate" style="max-width: 90px; display: inline-block; vertical-align: middle;">${iconConta} ${l.conta || 'Geral'}</span></td>
+      <td class="text-truncate" style="max-width: 140px;" title="${l.descricao}">${l.descricao} ${anexoHtml}</td>
+      <td class="d-none d-md-table-cell">${l.tipo}</td>
+      <td class="d-none d-md-table-cell">${l.subtipo}</td>
+      <td class="d-none d-sm-table-cell text-truncate" style="max-width: 100px;">${l.categoria}</td>
+      <td class="${cor} fw-bold text-nowrap">${fmtMoeda(l.valor)}</td>
+      <td><button class="btn btn-sm btn-outline-danger border-0 py-0" onclick="delLanc(${l.id})"><i class="fa-solid fa-trash"></i></button></td>
+  </tr>`;
+}
+
+function buscarResumo() {
+  const paramsResumo = new URLSearchParams({ mes: document.getElementById("filtro-mes").value }); const contaId = document.getElementById("filtro-conta").value; if (contaId) paramsResumo.set("conta_id", contaId);
+  return fetch(`/api/resumo?${paramsResumo}`).then((r) => r.json());
+}
+
+function desenharResumo(resumo) {
+  // Totais e gráficos já vêm agregados do servidor (/api/resumo)
+  const setTxt = (id, val) => { const el = document.getElementById(id); if(el) el.innerText = fmtMoeda(val); };
+  setTxt("card-saldo-disp", resumo.saldo_disponivel); setTxt("card-fatura", resumo.fatura); setTxt("card-ent-geral", resumo.entradas); setTxt("card-sai-geral", resumo.saidas); setTxt("card-saldo-final", resumo.saldo_disponivel - resumo.fatura);
+  
+  // Gráficos
+  drawChartBalanco(resumo.entradas, resumo.saidas); 
+  const graf = (tipo, nivel) => (resumo.graficos[tipo] || {})[nivel] || {};
+  drawChart("chartEntSub", graf("Entrada", "subtipo")); 
+  drawChart("chartEntCat", graf("Entrada", "categoria")); 
+  drawChart("chartSaiSub", graf("Saída", "subtipo")); 
+  drawChart("chartSaiCat", graf("Saída", "categoria"));
+}
+
+// =========================================================
+// FEED DE ALTERAÇÕES (SSE)
+// =========================================================
+// Cada escrita (desta aba, de outra ou de outro dispositivo) chega como um evento com a
+// linha alterada e é aplicada no lugar. Sem o feed conectado, volta ao carregarTudo().
+let feed = null;
+const timers = {};
+function abrirFeed() {
+  if (!window.EventSource) return;
+  feed = new EventSource("/api/eventos");
+  feed.addEventListener("lancamento", (e) => aplicarLancamento(JSON.parse(e.data)));
+  feed.addEventListener("lancamentos", (e) => { if (JSON.parse(e.data).meses.includes(document.getElementById("filtro-mes").value)) adiar("interface", atualizarInterface); adiar("saldos", carregarSaldos); });
+  feed.addEventListener("dimensao", (e) => aplicarDimensao(JSON.parse(e.data)));
+  feed.addEventListener("vencimentos", () => adiar("vencimentos", carregarVencimentos));
+  feed.addEventListener("recarregar", () => { carregarTudo(); carregarVencimentos(); });
+  // Um 503 (servidor sem vaga para mais streams) fecha o EventSource de vez: reabre mais tarde
+  feed.onerror = () => { if (feed.readyState === EventSource.CLOSED) setTimeout(abrirFeed, 10000 + Math.random() * 5000); };
+}
+function feedAtivo() { return feed && feed.readyState === EventSource.OPEN; }
+function recarregarSemFeed() { if (!feedAtivo()) carregarTudo(); }
+// Junta rajadas de eventos (ex.: os dois lançamentos do pagamento de fatura) numa só busca
+function adiar(chave, fn) { clearTimeout(timers[chave]); timers[chave] = setTimeout(fn, 150); }
+
+function aplicarLancamento({ acao, item }) {
+  const tbody = document.getElementById("tabela-lancamentos-body"); if (!tbody) return;
+  // Com uma busca na tela a posição do item depende da relevância: refaz a busca
+  if (termoBusca()) { adiar("interface", atualizarInterface); adiar("saldos", carregarSaldos); return; }
+  const conta = document.getElementById("filtro-conta").value;
+  const visivel = item.data.slice(0, 7) === document.getElementById("filtro-mes").value && (!conta || String(item.conta_id) === conta);
+  const i = dados.lancamentos.findIndex((l) => l.id === item.id); if (i >= 0) dados.lancamentos.splice(i, 1);
+  const tr = tbody.querySelector(`tr[data-id="${item.id}"]`); if (tr) tr.remove();
+  if (visivel && acao !== "excluido") {
+    // Mesma ordem da API: data e id decrescentes
+    let j = dados.lancamentos.findIndex((l) => l.data < item.data || (l.data === item.data && l.id < item.id)); if (j < 0) j = dados.lancamentos.length;
+    dados.lancamentos.splice(j, 0, item);
+    const proxima = dados.lancamentos[j + 1] && tbody.querySelector(`tr[data-id="${dados.lancamentos[j + 1].id}"]`);
+    if (proxima) proxima.insertAdjacentHTML("beforebegin", linhaLancamento(item)); else tbody.insertAdjacentHTML("beforeend", linhaLancamento(item));
+  }
+  // Pendentes não entram nos totais nem nos saldos: criar um não busca nada além do evento
+  if (acao === "alterado" || item.efetivado) { if (visivel) adiar("resumo", async () => desenharResumo(await buscarResumo())); adiar("saldos", carregarSaldos); }
+}
+
+function aplicarDimensao({ dim, acao, item }) {
+  const lista = dados[dim]; const i = lista.findIndex((x) => x.id === item.id); if (i >= 0) lista.splice(i, 1);
+  if (acao === "criado") lista.push(item);
+  if (dim === "subtipos" && acao === "excluido") { dados.categorias = dados.categorias.filter((c) => c.subtipo_id !== item.id); if (selConfig.subtipo === item.id) selConfig.subtipo = null; }
+  renderConfigLists(); renderContaSelector();
+  if (dim === "contas") adiar("saldos", carregarSaldos);
+}
+
 const chartOptionsMoeda = {
     responsive: true,
     maintainAspectRatio: false,
@@ -403,12 +500,9 @@ function drawChartBalanco(e, s) {
     }); 
 }
 
-function drawChart(id, d, f, c) { 
+function drawChart(id, g) { 
     const ctx = document.getElementById(id); 
     if (!ctx) return; 
-    const i = d.filter((l) => l.tipo === f); 
-    const g = {}; 
-    i.forEach((x) => { const k = x[c] || "Outros"; g[k] = (g[k] || 0) + x.valor; }); 
     if (charts[id]) charts[id].destroy(); 
     charts[id] = new Chart(ctx, { 
         type: "doughnut", 
@@ -417,7 +511,7 @@ function drawChart(id, d, f, c) {
     }); 
 }
 
-async function toggleStatus(id) { await fetch(`/api/lancamentos/${id}/status`, { method: "PATCH" }); carregarTudo(); }
+async function toggleStatus(id) { await fetch(`/api/lancamentos/${id}/status`, { method: "PATCH" }); recarregarSemFeed(); }
 
 // Exclusão de Lançamento usando o novo Modal
 async function delLanc(id) { 
@@ -426,14 +520,22 @@ async function delLanc(id) {
         "Essa ação remove o registro permanentemente. Tem certeza?", 
         async () => {
             await fetch(`/api/lancamentos/${id}`, { method: "DELETE" }); 
-            carregarTudo();
+            recarregarSemFeed();
         },
         "btn-danger"
     );
 }
 
-async function carregarVencimentos() { try { const l = await fetch("/api/vencimentos").then((r) => r.json()); const tb = document.getElementById("tabela-vencimentos-body"); if(tb) { tb.innerHTML = ""; l.forEach((v) => { const sw = `<div class="form-check form-switch"><input class="form-check-input" type="checkbox" role="switch" onchange="toggleVencimento(${v.id})" ${v.ativo ? "checked" : ""}></div>`; const dt = v.tipo === "fixo" ? `Todo dia ${v.dia}` : (v.data_vencimento ? v.data_vencimento.split("-").reverse().join("/") : "-"); tb.innerHTML += `<tr><td>${v.descricao}</td><td>${v.tipo}</td><td>${dt}</td><td>${sw}</td><td><button class="btn btn-sm btn-outline-danger border-0" onclick="delVenc(${v.id})">🗑️</button></td></tr>`; }); } } catch (e) { console.error(e); } }
-async function toggleVencimento(id) { await fetch(`/api/vencimentos/${id}/toggle`, { method: "PATCH" }); carregarVencimentos(); }
+async function carregarVencimentos() { try { const l = await fetch("/api/vencimentos").then((r) => r.json()); const tb = document.getElementById("tabela-vencimentos-body"); if(tb) { tb.innerHTML = ""; l.forEach((v) => { const sw = `<div class="form-check form-switch"><input class="form-check-input" type="checkbox" role="switch" onchange="toggleVencimento(${v.id})" ${v.ativo ? "checked" : ""}></div>`; const dt = v.tipo === "fixo" ? `Todo dia ${v.dia}` : (v.data_vencimento ? v.data_vencimento.split("-").reverse().join("/") : "-"); const vl = v.valor !== null ? `<span class="${v.tipo_id === 1 ? "text-success" : "text-danger"}">${fmtMoeda(v.valor)}</span> 🔁` : "-"; tb.innerHTML += `<tr><td>${v.descricao}</td><td>${v.tipo}</td><td>${dt}</td><td>${vl}</td><td>${sw}</td><td><button class="btn btn-sm btn-outline-danger border-0" onclick="delVenc(${v.id})">🗑️</button></td></tr>`; }); } carregarPrevisao(); } catch (e) { console.error(e); } }
+async function toggleVencimento(id) { await fetch(`/api/vencimentos/${id}/toggle`, { method: "PATCH" }); if (!feedAtivo()) { carregarVencimentos(); atualizarInterface(); } }
+async function gerarRecorrencias() { const r = await fetch("/api/vencimentos/gerar", { method: "POST" }).then((r) => r.json()); mostrarAviso(`${r.criados} lançamento(s) pendente(s) gerado(s).`, "sucesso"); carregarPrevisao(); if (!feedAtivo()) atualizarInterface(); }
+async function carregarPrevisao() { const tb = document.getElementById("tabela-previsao-body"); if (!tb) return; try { const meses = document.getElementById("previsao-meses").value; const r = await fetch(`/api/previsao?meses=${meses}`).then((r) => r.json()); tb.innerHTML = ""; r.meses.forEach((m) => { const cor = (v) => (v < 0 ? "text-danger" : ""); const dia = m.dia_saldo_minimo.split("-").reverse().join("/"); tb.innerHTML += `<tr><td class="text-start">${m.mes.split("-").reverse().join("/")}</td><td class="text-success">${fmtMoedaSimples(m.entradas)}</td><td class="text-danger">${fmtMoedaSimples(m.saidas)}</td><td class="fw-bold ${cor(m.saldo)}">${fmtMoedaSimples(m.saldo)}</td><td class="${cor(m.saldo_minimo)}" title="em ${dia}">${fmtMoedaSimples(m.saldo_minimo)} <small class="text-muted">(${dia.slice(0, 5)})</small></td></tr>`; }); } catch (e) { console.error(e); } }
+
+// Selects do modal de vencimento (tipo -> subtipo -> categoria, conta)
+const modalVenc = document.getElementById("modalVencimento");
+if (modalVenc) modalVenc.addEventListener("show.bs.modal", () => { const selT = document.getElementById("venc-tipo-lanc"); selT.innerHTML = ""; dados.tipos.forEach((t) => (selT.innerHTML += `<option value="${t.id}" ${t.nome === "Saída" ? "selected" : ""}>${t.nome}</option>`)); const selC = document.getElementById("venc-conta"); selC.innerHTML = '<option value="">Sem conta</option>'; dados.contas.forEach((c) => (selC.innerHTML += `<option value="${c.id}">${c.nome}</option>`)); atualizarSubtiposVencimento(); });
+window.atualizarSubtiposVencimento = () => { const tid = parseInt(document.getElementById("venc-tipo-lanc").value); const sel = document.getElementById("venc-subtipo"); sel.innerHTML = '<option value="">Selecione...</option>'; dados.subtipos.filter((s) => s.tipo_id === tid).forEach((s) => (sel.innerHTML += `<option value="${s.id}">${s.nome}</option>`)); atualizarCategoriasVencimento(); };
+window.atualizarCategoriasVencimento = () => { const sid = parseInt(document.getElementById("venc-subtipo").value); const sel = document.getElementById("venc-categoria"); sel.innerHTML = '<option value="">-</option>'; if (sid) dados.categorias.filter((c) => c.subtipo_id === sid).forEach((c) => (sel.innerHTML += `<option value="${c.id}">${c.nome}</option>`)); };
 
 // Exclusão de Vencimento usando o novo Modal
 async function delVenc(id) { 
@@ -442,17 +544,20 @@ async function delVenc(id) {
         "Você deixará de receber notificações para esta conta.", 
         async () => {
             await fetch(`/api/vencimentos/${id}`, { method: "DELETE" }); 
-            carregarVencimentos();
+            if (!feedAtivo()) carregarVencimentos();
         },
         "btn-danger"
     );
 }
 
-const fV = document.getElementById("form-vencimento"); if (fV) fV.addEventListener("submit", async (e) => { e.preventDefault(); const d = { descricao: document.getElementById("venc-descricao").value, tipo: document.getElementById("venc-tipo").value, dia: document.getElementById("venc-tipo").value === "fixo" ? parseInt(document.getElementById("venc-dia").value) : null, data_vencimento: document.getElementById("venc-tipo").value === "variavel" ? document.getElementById("venc-data").value : null, }; if ((await fetch("/api/vencimentos", { method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify(d) })).ok) { fV.reset(); bootstrap.Modal.getInstance(document.getElementById("modalVencimento")).hide(); carregarVencimentos(); } });
+const fV = document.getElementById("form-vencimento"); if (fV) fV.addEventListener("submit", async (e) => { e.preventDefault(); const d = { descricao: document.getElementById("venc-descricao").value, tipo: document.getElementById("venc-tipo").value, dia: document.getElementById("venc-tipo").value === "fixo" ? parseInt(document.getElementById("venc-dia").value) : null, data_vencimento: document.getElementById("venc-tipo").value === "variavel" ? document.getElementById("venc-data").value : null, valor: document.getElementById("venc-valor").value || null, subtipo_id: document.getElementById("venc-subtipo").value || null, categoria_id: document.getElementById("venc-categoria").value || null, conta_id: document.getElementById("venc-conta").value || null, }; const res = await fetch("/api/vencimentos", { method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify(d) }); if (!res.ok) { mostrarAviso((await res.json()).erro, "erro"); return; } { fV.reset(); bootstrap.Modal.getInstance(document.getElementById("modalVencimento")).hide(); if (!feedAtivo()) carregarVencimentos(); } });
 window.alternarCamposVencimento = () => { const t = document.getElementById("venc-tipo").value; document.getElementById("div-dia-fixo").classList.toggle("d-none", t !== "fixo"); document.getElementById("div-data-variavel").classList.toggle("d-none", t !== "variavel"); };
 async function carregarPlanejamento() { const elAno = document.getElementById("filtro-ano-plan"); const ano = elAno ? elAno.value : new Date().getFullYear(); const res = await fetch(`/api/planejamento?ano=${ano}`); const plan = await res.json(); const tbody = document.getElementById("tbody-planejamento"); if(!tbody) return; tbody.innerHTML = ""; const desenharSecao = (nomeTipo, corHeader) => { if (!plan[nomeTipo]) return; tbody.innerHTML += `<tr class="table-${corHeader}"><td colspan="14" class="fw-bold text-start text-uppercase">${nomeTipo}</td></tr>`; for (const [subtipo, categorias] of Object.entries(plan[nomeTipo])) { tbody.innerHTML += `<tr><td colspan="14" class="fw-bold text-start bg-light ps-4 text-muted small">${subtipo.toUpperCase()}</td></tr>`; for (const [cat, valores] of Object.entries(categorias)) { let linhaHtml = `<td class="text-start ps-5">${cat}</td>`; let totalCat = 0; valores.forEach((v) => { linhaHtml += `<td>${v > 0 ? fmtMoedaSimples(v) : "-"}</td>`; totalCat += v; }); linhaHtml += `<td class="fw-bold bg-light">${fmtMoedaSimples(totalCat)}</td>`; tbody.innerHTML += `<tr>${linhaHtml}</tr>`; } } }; desenharSecao("Entrada", "success"); desenharSecao("Saída", "danger"); }
 
 window.fmtMoeda = (v) => v.toLocaleString("pt-BR", { style: "currency", currency: "BRL" });
+function exportarLancamentos(formato) { const params = new URLSearchParams({ formato, mes: document.getElementById("filtro-mes").value }); const conta = document.getElementById("filtro-conta").value; if (conta) params.append("conta_id", conta); window.location = `/api/export/lancamentos?${params}`; }
+function exportarPlanejamento() { const elAno = document.getElementById("filtro-ano-plan"); const ano = elAno ? elAno.value : new Date().getFullYear(); window.location = `/api/export/planejamento?ano=${ano}&formato=xlsx`; }
+
 function fmtMoedaSimples(v) { return v.toLocaleString("pt-BR", { minimumFractionDigits: 2, maximumFractionDigits: 2 }); }
 
 // Lógica de Manutenção (Restore/Reset)
@@ -489,6 +594,49 @@ if(formRestore) {
     };
 }
 
+const formTelegram = document.getElementById("form-telegram");
+if(formTelegram) {
+    document.getElementById("modalManutencao").addEventListener("show.bs.modal", async () => {
+        const res = await fetch("/api/usuario");
+        if (res.ok) document.getElementById("telegram-chat-id").value = (await res.json()).telegram_chat_id || "";
+    });
+    formTelegram.onsubmit = async (e) => {
+        e.preventDefault();
+        const res = await fetch("/api/usuario", { method: "PUT", headers: { "Content-Type": "application/json" }, body: JSON.stringify({ telegram_chat_id: document.getElementById("telegram-chat-id").value }) });
+        const json = await res.json();
+        if (res.ok) mostrarAviso(json.telegram_chat_id ? "Chat do Telegram vinculado." : "Telegram desvinculado.", "sucesso");
+        else mostrarAviso(json.erro, "erro");
+    };
+}
+
+const formImportar = document.getElementById("form-importar");
+if(formImportar) {
+    formImportar.onsubmit = async (e) => {
+        e.preventDefault();
+        const btn = formImportar.querySelector("button");
+        const fd = new FormData();
+        fd.append("arquivo", document.getElementById("arquivo-importar").files[0]);
+        fd.append("conta_id", document.getElementById("importar-conta").value);
+        btn.disabled = true;
+        try {
+            const res = await fetch("/api/lancamentos/import", { method: "POST", body: fd });
+            const json = await res.json();
+            if (res.ok) {
+                let msg = `${json.importados} lançamentos importados, ${json.duplicados} já existiam.`;
+                if (json.total_erros) msg += ` ${json.total_erros} linhas com erro (ex.: ${json.erros[0]}).`;
+                mostrarAviso(msg, "sucesso");
+                formImportar.reset();
+                carregarTudo();
+            } else {
+                mostrarAviso(json.erro, "erro");
+            }
+        } catch (e) {
+            console.error(e);
+            mostrarAviso("Erro ao conectar com o servidor.", "erro");
+        } finally { btn.disabled = false; }
+    };
+}
+
 window.confirmarReset = async () => { 
     // Primeira Confirmação
     mostrarConfirmacao(
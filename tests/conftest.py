@@ -0,0 +1,106 @@
+"""Fixtures dos testes: banco, métricas e backups numa pasta temporária, definidos antes do import do app.
+
+Cada teste ganha um usuário novo (fixture `usuario`): os dados são separados por dono, então
+os testes compartilham o banco sem se enxergar.
+"""
+import os
+import sys
+import shutil
+import itertools
+import tempfile
+
+import pytest
+
+PASTA = tempfile.mkdtemp(prefix="financeiro-testes-")
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(PASTA, 'testes.db')
+os.environ['METRICAS_DIR'] = os.path.join(PASTA, 'metricas')
+os.environ['BACKUP_DIR'] = os.path.join(PASTA, 'backups')
+os.environ.pop('TELEGRAM_TOKEN', None)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+import app as modulo_app  # noqa: E402
+
+# Custo mínimo: os testes exercitam as rotas, não o hash
+SENHA_HASH = generate_password_hash("teste", method="pbkdf2:sha256:1")
+_numeros = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def app():
+    modulo_app.inicializar_banco()
+    yield modulo_app.app
+    with modulo_app.app.app_context(): modulo_app.db.engine.dispose()
+    shutil.rmtree(PASTA, ignore_errors=True)
+
+
+def _criar_usuario(app, admin=False):
+    """(id, username) de um dono novo, já com a conta e os subtipos iniciais."""
+    with app.app_context():
+        user = modulo_app.User(username=f"teste{next(_numeros)}", password_hash=SENHA_HASH, is_admin=admin)
+        modulo_app.db.session.add(user); modulo_app.db.session.commit()
+        modulo_app.preparar_usuario(user.id)
+        return user.id, user.username
+
+
+def _entrar(app, username):
+    c = app.test_client()
+    assert c.post('/login', data={'username': username, 'password': 'teste'}).status_code == 302
+    return c
+
+
+@pytest.fixture
+def criar_usuario(app):
+    """criar_usuario(admin=False) -> (id, username) de mais um dono."""
+    return lambda admin=False: _criar_usuario(app, admin)
+
+
+@pytest.fixture
+def entrar(app):
+    """entrar(username) -> cliente de teste logado."""
+    return lambda username: _entrar(app, username)
+
+
+@pytest.fixture
+def usuario(app):
+    return _criar_usuario(app)
+
+
+@pytest.fixture
+def cliente(app, usuario):
+    return _entrar(app, usuario[1])
+
+
+@pytest.fixture
+def novo_cliente(app):
+    """Cliente logado como mais um dono, para os testes de isolamento."""
+    return lambda: _entrar(app, _criar_usuario(app)[1])
+
+
+@pytest.fixture
+def admin(app):
+    return _entrar(app, _criar_usuario(app, admin=True)[1])
+
+
+# --- CADASTROS PELA API ---
+def _criar_subtipo(cliente, nome, tipo_id=2):
+    assert cliente.post('/api/config/subtipos', json={'nome': nome, 'tipo_id': tipo_id}).status_code == 200
+    return next(s for s in cliente.get('/api/config/subtipos').json if s['nome'] == nome)
+
+
+def _criar_lancamento(cliente, descricao, subtipo_id, data='2026-01-10', valor='12.50', tipo_id=2, **extra):
+    r = cliente.post('/api/lancamentos', data={'data': data, 'descricao': descricao, 'tipo_id': tipo_id, 'subtipo_id': subtipo_id, 'valor': valor, **extra})
+    assert r.status_code == 201, r.json
+
+
+@pytest.fixture
+def criar_subtipo():
+    """criar_subtipo(cliente, nome, tipo_id=2) -> o subtipo como a API o lista."""
+    return _criar_subtipo
+
+
+@pytest.fixture
+def criar_lancamento():
+    """criar_lancamento(cliente, descricao, subtipo_id, data=..., valor=..., **campos do formulário)."""
+    return _criar_lancamento
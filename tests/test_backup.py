@@ -0,0 +1,122 @@
+"""Download de backups (cópia do banco em uso, arquivo temporário) e restauração de
+backups de versões anteriores do schema."""
+import io
+import os
+import gzip
+import sqlite3
+
+import pytest
+
+import app as modulo_app
+import backup
+
+
+def backup_versao_anterior(cliente, caminho):
+    """Baixa o backup e o devolve ao schema 5 (sem a busca textual), como um .db em `caminho`."""
+    resp = cliente.get('/api/manutencao/backup')
+    assert resp.status_code == 200
+    with open(caminho, 'wb') as f: f.write(gzip.decompress(resp.get_data()))
+    conn = sqlite3.connect(caminho)
+    for (gatilho,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'lancamento_busca%'").fetchall():
+        conn.execute(f'DROP TRIGGER {gatilho}')
+    conn.execute('DROP TABLE lancamento_busca'); conn.execute('PRAGMA user_version = 5')
+    conn.commit(); conn.close()
+    with open(caminho, 'rb') as f: return f.read()
+
+
+def restaurar(cliente, conteudo):
+    return cliente.post('/api/manutencao/restore', data={'arquivo': (io.BytesIO(conteudo), 'backup.db')}, content_type='multipart/form-data')
+
+
+def versao_em_uso(app):
+    with app.app_context(), modulo_app.db.engine.connect() as conn:
+        return conn.exec_driver_sql('PRAGMA user_version').scalar()
+
+
+def test_backup_antigo_chega_migrado(app, admin, tmp_path, criar_subtipo, criar_lancamento):
+    criar_lancamento(admin, "Farmácia do bairro", criar_subtipo(admin, "Saúde")['id'])
+    conteudo = backup_versao_anterior(admin, tmp_path / 'antigo.db')
+
+    resp = restaurar(admin, conteudo)
+    assert resp.status_code == 200, resp.json
+    assert versao_em_uso(app) == modulo_app.SCHEMA_VERSAO
+    # O índice de busca, que não existia no schema 5, foi recriado com os lançamentos do backup
+    assert [i['descricao'] for i in admin.get('/api/lancamentos/search?q=farmacia').json['itens']] == ["Farmácia do bairro"]
+
+
+def test_falha_na_migracao_nao_toca_o_banco_em_uso(app, admin, tmp_path, monkeypatch, criar_subtipo, criar_lancamento):
+    sub = criar_subtipo(admin, "Casa")
+    conteudo = backup_versao_anterior(admin, tmp_path / 'antigo.db')
+    criar_lancamento(admin, "Depois do backup", sub['id'])
+
+    def falhar(conn): raise RuntimeError("migração interrompida")
+    monkeypatch.setattr(modulo_app, 'migrar_schema', falhar)
+    assert restaurar(admin, conteudo).status_code == 500
+
+    assert versao_em_uso(app) == modulo_app.SCHEMA_VERSAO
+    assert [i['descricao'] for i in admin.get('/api/lancamentos?mes=2026-01').json['itens']] == ["Depois do backup"]
+
+
+# --- DOWNLOAD ---
+class GravaACadaPasso(sqlite3.Connection):
+    """Conexão de origem em que outra conexão grava entre um passo e outro da cópia."""
+    passos = []
+
+    def backup(self, alvo, *, progress=None, **opcoes):
+        def gravar(status, restantes, total):
+            GravaACadaPasso.passos.append(restantes)
+            if len(GravaACadaPasso.passos) > 1000: raise RuntimeError("a cópia não termina")
+            with sqlite3.connect(self.caminho) as escritor: escritor.execute("INSERT INTO t VALUES (randomblob(100))")
+            if progress: progress(status, restantes, total)
+        return super().backup(alvo, progress=gravar, **opcoes)
+
+
+def test_copia_sob_gravacao_continua_termina(tmp_path, monkeypatch):
+    origem, destino = str(tmp_path / 'origem.db'), str(tmp_path / 'copia.db')
+    with sqlite3.connect(origem) as conn:
+        conn.execute('PRAGMA journal_mode=WAL'); conn.execute('CREATE TABLE t (x)')
+        conn.executemany('INSERT INTO t VALUES (randomblob(1000))', [()] * 200)
+    conectar = sqlite3.connect
+    def conectar_origem(caminho, *args, **kwargs):
+        if caminho != origem: return conectar(caminho, *args, **kwargs)
+        conn = conectar(caminho, *args, factory=GravaACadaPasso, **kwargs); conn.caminho = caminho
+        return conn
+    monkeypatch.setattr(backup.sqlite3, 'connect', conectar_origem)
+    GravaACadaPasso.passos = []
+
+    backup.copiar_banco(origem, destino, paginas=10)
+
+    # Três recomeços e então um passo só; a cópia é um retrato íntegro da origem
+    assert len(GravaACadaPasso.passos) < 4 * 30
+    copia = conectar(destino)
+    assert copia.execute('PRAGMA integrity_check').fetchone() == ('ok',)
+    assert 200 < copia.execute('SELECT COUNT(*) FROM t').fetchone()[0] <= 200 + len(GravaACadaPasso.passos)
+    copia.close()
+
+
+@pytest.fixture
+def pasta_backup(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'BACKUP_FOLDER', str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.parametrize("consulta", ['', '?uploads=1'])
+def test_download_apaga_a_copia_temporaria(admin, pasta_backup, consulta):
+    resp = admin.get('/api/manutencao/backup' + consulta)
+    assert resp.status_code == 200 and gzip.decompress(resp.get_data())
+    assert os.listdir(pasta_backup) == []
+
+
+def test_erro_no_meio_do_download_apaga_a_copia(admin, pasta_backup, monkeypatch):
+    def quebrar(caminho):
+        yield b"\x1f\x8b"
+        raise OSError("disco cheio")
+    monkeypatch.setattr(backup, 'stream_gzip', quebrar)
+
+    resp = admin.get('/api/manutencao/backup', buffered=False)
+    pedacos = iter(resp.response)
+    assert next(pedacos) == b"\x1f\x8b" and len(os.listdir(pasta_backup)) == 1
+    with pytest.raises(OSError): next(pedacos)
+    # Sem depender do close da resposta
+    assert os.listdir(pasta_backup) == []
+    resp.close()
@@ -0,0 +1,89 @@
+"""Busca textual (/api/lancamentos/search): índice FTS5 mantido por gatilhos, prefixos,
+acentos, escopo do dono e o limite de candidatos ordenados por relevância."""
+import pytest
+from sqlalchemy import text
+
+import app as modulo_app
+
+
+def buscar(cliente, q, **filtros):
+    resp = cliente.get('/api/lancamentos/search', query_string={'q': q, **filtros})
+    assert resp.status_code == 200, resp.json
+    return [i['descricao'] for i in resp.json['itens']]
+
+
+def executar(app, sql, **params):
+    with app.app_context():
+        modulo_app.db.session.execute(text(sql), params); modulo_app.db.session.commit()
+
+
+def id_de(cliente, descricao):
+    return next(i['id'] for i in cliente.get('/api/lancamentos?mes=2026-01').json['itens'] if i['descricao'] == descricao)
+
+
+def test_prefixos_acentos_e_todas_as_palavras(cliente, criar_subtipo, criar_lancamento):
+    sub = criar_subtipo(cliente, "Casa")['id']
+    criar_lancamento(cliente, "Aluguel apartamento", sub)
+    criar_lancamento(cliente, "Farmácia São João", sub)
+    criar_lancamento(cliente, "ALUGUEL garagem", sub)
+
+    assert buscar(cliente, "alug") == ["ALUGUEL garagem", "Aluguel apartamento"]
+    assert buscar(cliente, "alug apto") == [] and buscar(cliente, "alug apart") == ["Aluguel apartamento"]
+    # Sem diferença de maiúsculas e acentos, nos dois sentidos
+    assert buscar(cliente, "farmacia sao") == buscar(cliente, "FARMÁCIA joão") == ["Farmácia São João"]
+    # Aspas e operadores do FTS5 digitados viram texto
+    assert buscar(cliente, 'alug" (gar* -') == ["ALUGUEL garagem"]
+
+
+def test_palavra_curta_demais_responde_400(cliente):
+    resp = cliente.get('/api/lancamentos/search?q=a')
+    assert resp.status_code == 400 and resp.json['erro'].startswith("Informe ao menos uma palavra")
+
+
+def test_indice_acompanha_edicao_e_exclusao(app, cliente, criar_subtipo, criar_lancamento):
+    sub = criar_subtipo(cliente, "Lazer")['id']
+    criar_lancamento(cliente, "Cinema shopping", sub)
+    id_ = id_de(cliente, "Cinema shopping")
+
+    # O gatilho de UPDATE vale também para o SQL puro
+    executar(app, "UPDATE lancamento SET descricao = 'Teatro municipal' WHERE id = :id", id=id_)
+    assert buscar(cliente, "cinema") == [] and buscar(cliente, "teatro") == ["Teatro municipal"]
+
+    # Renomear o subtipo reindexa a classificação dos lançamentos dele
+    assert buscar(cliente, "lazer") == ["Teatro municipal"]
+    executar(app, "UPDATE subtipo SET nome = 'Diversão' WHERE id = :id", id=sub)
+    assert buscar(cliente, "lazer") == [] and buscar(cliente, "diversao") == ["Teatro municipal"]
+
+    assert cliente.delete(f'/api/lancamentos/{id_}').status_code == 200
+    assert buscar(cliente, "teatro") == []
+    with app.app_context():
+        assert modulo_app.db.session.execute(text('SELECT COUNT(*) FROM lancamento_busca WHERE rowid = :id'), {"id": id_}).scalar() == 0
+
+
+def test_so_encontra_os_lancamentos_do_dono(cliente, novo_cliente, criar_subtipo, criar_lancamento):
+    outro = novo_cliente()
+    criar_lancamento(cliente, "Padaria do bairro", criar_subtipo(cliente, "Comida")['id'])
+    criar_lancamento(outro, "Padaria do centro", criar_subtipo(outro, "Comida")['id'])
+
+    assert buscar(cliente, "padaria") == ["Padaria do bairro"]
+    assert buscar(outro, "padaria") == ["Padaria do centro"]
+    assert buscar(outro, "bairro") == []
+
+
+def test_descricao_pesa_mais_que_a_classificacao(cliente, criar_subtipo, criar_lancamento):
+    mercado = criar_subtipo(cliente, "Mercado")['id']; outros = criar_subtipo(cliente, "Outros")['id']
+    criar_lancamento(cliente, "Compra do mês", mercado, data='2026-01-20')
+    criar_lancamento(cliente, "Mercado da esquina", outros, data='2026-01-05')
+    assert buscar(cliente, "mercado") == ["Mercado da esquina", "Compra do mês"]
+
+
+def test_so_os_candidatos_mais_recentes_entram_na_ordenacao(cliente, criar_subtipo, criar_lancamento, monkeypatch):
+    mercado = criar_subtipo(cliente, "Mercado")['id']; outros = criar_subtipo(cliente, "Outros")['id']
+    criar_lancamento(cliente, "Mercado da esquina", outros, data='2026-01-05')
+    for n in range(3): criar_lancamento(cliente, f"Compra {n}", mercado, data='2026-02-10')
+
+    monkeypatch.setattr(modulo_app, 'BUSCA_CANDIDATOS', 2)
+    # O mais relevante foi cadastrado antes dos dois últimos: fica de fora da ordenação
+    assert buscar(cliente, "mercado") == ["Compra 2", "Compra 1"]
+    # Um filtro que tire os concorrentes o traz de volta
+    assert buscar(cliente, "mercado", mes='2026-01') == ["Mercado da esquina"]
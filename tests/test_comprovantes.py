@@ -0,0 +1,102 @@
+"""Comprovantes por sha256: um arquivo por conteúdo, contagem de referências e a remoção
+concorrente com um upload do mesmo arquivo."""
+import io
+import os
+import uuid
+import hashlib
+import threading
+
+import pytest
+
+import app as modulo_app
+from comprovantes import ArmazemComprovantes
+
+
+@pytest.fixture
+def armazem(app, tmp_path, monkeypatch):
+    """Uploads numa pasta só do teste."""
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    armazem = ArmazemComprovantes(str(tmp_path))
+    monkeypatch.setattr(modulo_app, 'armazem', armazem)
+    return armazem
+
+
+@pytest.fixture
+def conteudo():
+    """Um PDF diferente por teste: a contagem de referências vale para o banco todo."""
+    return f"%PDF-1.4 nota {uuid.uuid4()}".encode()
+
+
+def endereco_de(conteudo):
+    sha = hashlib.sha256(conteudo).hexdigest()
+    return f"{sha[:2]}/{sha[2:4]}/{sha}.pdf"
+
+
+def com_comprovante(cliente, sub, descricao, conteudo):
+    """Cria o lançamento com o arquivo anexado; devolve (id, comprovante)."""
+    resp = cliente.post('/api/lancamentos', data={'data': '2026-01-10', 'descricao': descricao, 'tipo_id': 2, 'subtipo_id': sub, 'valor': '10',
+                                                  'arquivo': (io.BytesIO(conteudo), 'nota.pdf')}, content_type='multipart/form-data')
+    assert resp.status_code == 201, resp.json
+    item = next(i for i in cliente.get('/api/lancamentos?mes=2026-01').json['itens'] if i['descricao'] == descricao)
+    return item['id'], item['comprovante']
+
+
+def test_mesmo_conteudo_e_um_arquivo_so(armazem, cliente, criar_subtipo, conteudo):
+    sub = criar_subtipo(cliente, "Notas")['id']
+    _, primeiro = com_comprovante(cliente, sub, "Primeira", conteudo)
+    _, segundo = com_comprovante(cliente, sub, "Segunda", conteudo)
+
+    assert primeiro == segundo == endereco_de(conteudo)
+    assert [n for _, _, nomes in os.walk(armazem.pasta) for n in nomes] == [os.path.basename(primeiro)]
+    assert os.listdir(armazem.temporaria) == []
+
+
+def test_arquivo_so_sai_com_a_ultima_referencia(armazem, cliente, novo_cliente, criar_subtipo, conteudo):
+    outro = novo_cliente()
+    sub, sub_outro = criar_subtipo(cliente, "Notas")['id'], criar_subtipo(outro, "Notas")['id']
+    meu, relativo = com_comprovante(cliente, sub, "Minha", conteudo)
+    do_outro, _ = com_comprovante(outro, sub_outro, "Do outro", conteudo)
+
+    # A contagem vale entre usuários: o do outro dono ainda usa o arquivo
+    assert cliente.delete(f'/api/lancamentos/{meu}').status_code == 200
+    assert os.path.exists(armazem.caminho(relativo))
+    assert outro.delete(f'/api/lancamentos/{do_outro}').status_code == 200
+    assert not os.path.exists(armazem.caminho(relativo))
+    assert os.listdir(armazem.temporaria) == []
+
+
+def test_upload_entre_a_contagem_e_a_remocao_mantem_o_arquivo(armazem, cliente, novo_cliente, criar_subtipo, conteudo, monkeypatch):
+    outro = novo_cliente()
+    sub, sub_outro = criar_subtipo(cliente, "Notas")['id'], criar_subtipo(outro, "Notas")['id']
+    id_, relativo = com_comprovante(cliente, sub, "Apagado", conteudo)
+    contar = modulo_app.comprovante_referenciado
+    chamadas = []
+
+    def contar_com_upload_no_meio(relativo):
+        chamadas.append(relativo)
+        usado = contar(relativo)
+        # Logo depois da primeira contagem (nenhuma referência), outro dono envia o mesmo arquivo:
+        # commit e promover() acontecem antes de a exclusão remover o arquivo
+        if len(chamadas) == 1:
+            envio = threading.Thread(target=com_comprovante, args=(outro, sub_outro, "Enviado no meio", conteudo))
+            envio.start(); envio.join()
+        return usado
+
+    monkeypatch.setattr(modulo_app, 'comprovante_referenciado', contar_com_upload_no_meio)
+    assert cliente.delete(f'/api/lancamentos/{id_}').status_code == 200
+
+    assert os.path.exists(armazem.caminho(relativo))
+    assert len(chamadas) == 2
+    assert outro.get('/uploads/' + relativo).get_data() == conteudo
+    assert os.listdir(armazem.temporaria) == []
+
+
+def test_remover_sem_referencia_apaga_as_variantes(armazem, conteudo):
+    relativo = endereco_de(conteudo)
+    os.makedirs(os.path.dirname(armazem.caminho(relativo)))
+    for caminho in [armazem.caminho(relativo)] + [armazem.caminho_variante(relativo, v) for v in ('miniatura', 'previa')]:
+        with open(caminho, 'wb') as f: f.write(conteudo)
+
+    assert armazem.remover(relativo, lambda _: False)
+    assert [n for _, _, nomes in os.walk(armazem.pasta) for n in nomes] == []
+    assert not armazem.remover(relativo, lambda _: False)
@@ -0,0 +1,134 @@
+"""Feed de alterações: descarte dos eventos antigos por dono, 'recarregar' de quem os perdeu e
+as vagas de stream de cada worker do gunicorn."""
+import os
+import sys
+import time
+import signal
+import socket
+import subprocess
+
+import pytest
+from sqlalchemy import event, text
+
+import app as modulo_app
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def publicar(app, usuario_id, quantos):
+    """Ids dos `quantos` eventos publicados para o dono, cada um na sua transação."""
+    ids = []
+    with app.app_context():
+        for n in range(quantos):
+            modulo_app.publicar('teste', usuario_id, n=n); modulo_app.db.session.commit()
+            ids.append(modulo_app.db.session.execute(text('SELECT MAX(id) FROM evento')).scalar())
+    return ids
+
+
+def eventos_do_dono(app, usuario_id):
+    with app.app_context():
+        return [i for (i,) in modulo_app.db.session.execute(text('SELECT id FROM evento WHERE usuario_id = :uid ORDER BY id'), {"uid": usuario_id})]
+
+
+def primeiro_evento(cliente, ultimo):
+    """(id, tipo) do primeiro evento que o stream entrega a partir de `ultimo`."""
+    resp = cliente.get('/api/eventos', headers={'Last-Event-ID': str(ultimo)})
+    try:
+        for pedaco in resp.response:
+            campos = dict(linha.split(': ', 1) for linha in pedaco.decode().splitlines() if ': ' in linha)
+            if 'event' in campos: return int(campos['id']), campos['event']
+    finally:
+        resp.close()
+
+
+def test_descarte_por_dono(app, monkeypatch, criar_usuario):
+    monkeypatch.setattr(modulo_app, 'MANTER_EVENTOS', 3)
+    quieto, movimentado = criar_usuario()[0], criar_usuario()[0]
+    do_quieto = publicar(app, quieto, 2)
+    do_movimentado = publicar(app, movimentado, 5)
+
+    assert eventos_do_dono(app, quieto) == do_quieto
+    assert eventos_do_dono(app, movimentado) == do_movimentado[-3:]
+
+
+def test_stream_manda_recarregar_so_quem_perdeu_eventos(app, monkeypatch, criar_usuario, entrar):
+    monkeypatch.setattr(modulo_app, 'MANTER_EVENTOS', 3)
+    uid, username = criar_usuario()
+    cliente = entrar(username)
+    ids = publicar(app, uid, 5)
+
+    # Os dois primeiros foram descartados: quem parou antes do segundo perdeu eventos
+    assert primeiro_evento(cliente, ids[0])[1] == 'recarregar'
+    assert primeiro_evento(cliente, ids[1]) == (ids[2], 'teste')
+    # Outro dono descartando os seus não afeta este
+    publicar(app, criar_usuario()[0], 5)
+    assert primeiro_evento(cliente, ids[1]) == (ids[2], 'teste')
+
+
+def test_dono_sem_eventos_nao_rele_os_dos_outros(app, cliente, usuario, monkeypatch, criar_usuario):
+    monkeypatch.setattr(modulo_app, 'DURACAO_FEED', 0.3); monkeypatch.setattr(modulo_app, 'INTERVALO_FEED', 0.05)
+    ids = publicar(app, criar_usuario()[0], 3)
+    consultados = []
+    def anotar(conn, cursor, sql, parametros, *_):
+        if 'FROM evento WHERE id >' in sql: consultados.append(parametros[0])
+    with app.app_context(): engine = modulo_app.db.engine
+    event.listen(engine, 'before_cursor_execute', anotar)
+    try:
+        with cliente.get('/api/eventos', headers={'Last-Event-ID': str(ids[0] - 1)}) as resp:
+            corpo = resp.get_data(as_text=True)
+    finally:
+        event.remove(engine, 'before_cursor_execute', anotar)
+
+    # A primeira consulta passa pelos eventos do outro dono; as seguintes partem do maior id
+    assert consultados[0] == ids[0] - 1 and len(consultados) > 1
+    assert set(consultados[1:]) == {ids[-1]}
+    assert 'event:' not in corpo and corpo.endswith(f"id: {ids[-1]}\n\n")
+
+
+def test_stream_devolve_a_vaga_ao_fechar(cliente, monkeypatch):
+    monkeypatch.setenv("WEB_FEEDS", "1")
+    resp = cliente.get('/api/eventos')
+    assert resp.status_code == 200 and modulo_app.vagas_feed.abertos == 1
+    assert cliente.get('/api/eventos').status_code == 503
+    resp.close()
+    assert modulo_app.vagas_feed.abertos == 0
+    with cliente.get('/api/eventos') as resp: assert resp.status_code == 200
+
+
+@pytest.fixture
+def gunicorn(app):
+    """URL de um worker gthread com 2 threads (gunicorn.conf.py) sobre o banco dos testes."""
+    pytest.importorskip("gunicorn")
+    with socket.socket() as s: s.bind(("127.0.0.1", 0)); porta = s.getsockname()[1]
+    env = {**os.environ, "WEB_BIND": f"127.0.0.1:{porta}", "WEB_WORKERS": "1", "WEB_THREADS": "2"}
+    env.pop("WEB_FEEDS", None)
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"], cwd=RAIZ, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    limite = time.monotonic() + 20
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", porta), timeout=1).close(); break
+        except OSError:
+            assert proc.poll() is None and time.monotonic() < limite, "o gunicorn não subiu"
+            time.sleep(0.1)
+    try:
+        yield f"http://127.0.0.1:{porta}"
+    finally:
+        # O worker só notaria os streams fechados no próximo batimento: encerra o grupo todo
+        os.killpg(proc.pid, signal.SIGKILL); proc.wait(10)
+
+
+def test_streams_alem_das_vagas_nao_prendem_as_outras_rotas(gunicorn, usuario):
+    import requests
+    sessao = requests.Session()
+    assert sessao.post(gunicorn + '/login', data={'username': usuario[1], 'password': 'teste'}, allow_redirects=False).status_code == 302
+
+    # Mais abas que threads: só uma (metade das 2 threads) ganha o stream
+    streams = [sessao.get(gunicorn + '/api/eventos', stream=True, timeout=5) for _ in range(4)]
+    try:
+        assert [r.status_code for r in streams] == [200, 503, 503, 503]
+        assert streams[1].headers['Retry-After'] == str(modulo_app.ESPERA_FEED_LOTADO)
+        assert streams[1].text == f"retry: {modulo_app.ESPERA_FEED_LOTADO * 1000}\n\n"
+        assert sessao.get(gunicorn + '/api/lancamentos', timeout=5).status_code == 200
+    finally:
+        for r in streams: r.close()
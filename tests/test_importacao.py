@@ -0,0 +1,180 @@
+"""Importação de extratos: leitores CSV/XLSX/OFX (importacao.py) e /api/lancamentos/import."""
+import io
+from datetime import date, datetime
+
+import pytest
+
+from importacao import ErroImportacao, ler_csv, ler_xlsx, ler_ofx, ler_extrato
+
+CSV = """Data;Histórico;Valor (R$);Categoria
+05/03/2026;Padaria Pão Quente;-12,50;
+06/03/2026;Salário;1.234,56;
+31/02/2026;Data impossível;-1,00;
+07/03/2026;Sem valor;;
+
+08/03/2026;Mercado;-R$ 80,10;
+"""
+
+OFX = """OFXHEADER:100
+DATA:OFXSGML
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20260310120000[-3:BRT]
+<TRNAMT>-45.90
+<FITID>A1
+<MEMO>Farmácia
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20260311
+<TRNAMT>abc
+<FITID>A2
+<NAME>Valor quebrado
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20260312
+<TRNAMT>300.00
+<FITID>A3
+<NAME>Pix recebido
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+def planilha(linhas):
+    """XLSX em memória com as `linhas` (a primeira é o cabeçalho)."""
+    from openpyxl import Workbook
+    wb = Workbook(); ws = wb.active
+    for linha in linhas: ws.append(linha)
+    arquivo = io.BytesIO(); wb.save(arquivo); arquivo.seek(0)
+    return arquivo
+
+
+def ler(leitor, conteudo, tamanho=5000):
+    erros = []
+    lotes = list(leitor(io.BytesIO(conteudo) if isinstance(conteudo, bytes) else conteudo, erros, tamanho))
+    return lotes, erros
+
+
+# --- LEITORES ---
+def test_csv_formato_brasileiro_e_linhas_com_erro():
+    lotes, erros = ler(ler_csv, CSV.encode('latin-1'), tamanho=2)
+
+    registros = [r for lote in lotes for r in lote]
+    assert [len(l) for l in lotes] == [2, 1]
+    assert [(r["data"], r["descricao"], r["valor_centavos"]) for r in registros] == [
+        (date(2026, 3, 5), "Padaria Pão Quente", -1250), (date(2026, 3, 6), "Salário", 123456), (date(2026, 3, 8), "Mercado", -8010)]
+    assert registros[0]["categoria"] is None and registros[0]["id_externo"] is None
+    # Número da linha no arquivo (o cabeçalho é a 1); a linha em branco é ignorada sem erro
+    assert erros == ["linha 4: data inválida: '31/02/2026'", "linha 5: valor vazio"]
+
+
+def test_csv_com_virgula_e_colunas_de_classificacao():
+    conteudo = "date,description,amount,tipo,subtipo,conta\n2026-03-01,Aluguel,1500.00,saida,Moradia,Banco\n"
+    [[r]], erros = ler(ler_csv, conteudo.encode())
+    assert erros == []
+    assert (r["valor_centavos"], r["tipo"], r["subtipo"], r["conta"]) == (150000, "saida", "Moradia", "Banco")
+
+
+def test_csv_sem_coluna_obrigatoria():
+    with pytest.raises(ErroImportacao, match="colunas obrigatórias ausentes: valor"):
+        ler(ler_csv, b"data;descricao\n01/03/2026;Sem valor\n")
+
+
+def test_xlsx_com_datas_e_numeros_das_celulas():
+    arquivo = planilha([["Data", "Descrição", "Valor", "Categoria"],
+                        [datetime(2026, 3, 2), "Luz", -150.3, "Contas"],
+                        [None, None, None, None],
+                        ["02/03/2026", "Texto", "1.000,00", None],
+                        ["ontem", "Data ruim", 10, None]])
+    lotes, erros = ler(ler_xlsx, arquivo)
+    assert [(r["data"], r["descricao"], r["valor_centavos"], r["categoria"]) for r in lotes[0]] == [
+        (date(2026, 3, 2), "Luz", -15030, "Contas"), (date(2026, 3, 2), "Texto", 100000, None)]
+    assert erros == ["linha 5: data inválida: 'ontem'"]
+
+
+def test_ofx_sgml_com_fitid():
+    lotes, erros = ler(ler_ofx, OFX.encode())
+    assert [(r["data"], r["descricao"], r["valor_centavos"], r["id_externo"]) for r in lotes[0]] == [
+        (date(2026, 3, 10), "Farmácia", -4590, "A1"), (date(2026, 3, 12), "Pix recebido", 30000, "A3")]
+    assert erros == ["transação 2: valor inválido: 'abc'"]
+
+
+def test_extensao_nao_suportada():
+    with pytest.raises(ErroImportacao, match="formato não suportado: .pdf"):
+        ler_extrato(io.BytesIO(b""), "extrato.pdf", [])
+
+
+# --- ROTA ---
+def importar(cliente, conteudo, nome, **campos):
+    return cliente.post('/api/lancamentos/import', data={'arquivo': (io.BytesIO(conteudo), nome), **campos}, content_type='multipart/form-data')
+
+
+def do_mes(cliente, mes='2026-03'):
+    return [(i['data'], i['descricao'], i['valor'], i['tipo'], i['subtipo'], i['efetivado']) for i in cliente.get(f'/api/lancamentos?mes={mes}').json['itens']]
+
+
+def test_importa_e_reimportar_nao_duplica(cliente):
+    resp = importar(cliente, CSV.encode(), 'extrato.csv')
+    assert resp.status_code == 200
+    assert {k: resp.json[k] for k in ('lidos', 'importados', 'duplicados', 'total_erros')} == {'lidos': 3, 'importados': 3, 'duplicados': 0, 'total_erros': 2}
+    assert resp.json['erros'] == ["linha 4: data inválida: '31/02/2026'", "linha 5: valor vazio"]
+    # Tipo pelo sinal do valor; sem subtipo conhecido, vai para "Importados"
+    assert do_mes(cliente) == [("2026-03-08", "Mercado", 80.1, "Saída", "Importados", True),
+                               ("2026-03-06", "Salário", 1234.56, "Entrada", "Importados", True),
+                               ("2026-03-05", "Padaria Pão Quente", 12.5, "Saída", "Importados", True)]
+
+    resp = importar(cliente, CSV.encode(), 'extrato.csv')
+    assert (resp.json['lidos'], resp.json['importados'], resp.json['duplicados']) == (3, 0, 3)
+    assert len(do_mes(cliente)) == 3
+
+
+def test_linhas_iguais_no_mesmo_arquivo_sao_lancamentos_diferentes(cliente):
+    conteudo = "data;descricao;valor\n09/03/2026;Café;-5,00\n09/03/2026;Café;-5,00\n".encode()
+    assert importar(cliente, conteudo, 'cafe.csv').json['importados'] == 2
+    # Reimportado: as duas (1ª e 2ª ocorrência) já existem
+    assert importar(cliente, conteudo, 'cafe.csv').json['duplicados'] == 2
+    # Um extrato maior com uma terceira ocorrência traz só ela
+    maior = conteudo + "09/03/2026;Café;-5,00\n".encode()
+    assert importar(cliente, maior, 'cafe.csv').json['importados'] == 1
+
+
+def test_ofx_deduplica_pelo_fitid_e_respeita_pendente(cliente):
+    resp = importar(cliente, OFX.encode(), 'banco.ofx', efetivado='0')
+    assert (resp.json['importados'], resp.json['total_erros']) == (2, 1)
+    assert {(d, desc, ef) for d, desc, _, _, _, ef in do_mes(cliente)} == {("2026-03-10", "Farmácia", False), ("2026-03-12", "Pix recebido", False)}
+    # O mesmo FITID com outra descrição continua sendo a mesma transação
+    assert importar(cliente, OFX.replace("Farmácia", "FARMACIA CENTRO").encode(), 'banco.ofx').json['duplicados'] == 2
+
+
+def test_deduplicacao_e_por_dono(cliente, novo_cliente):
+    conteudo = OFX.encode()
+    assert importar(cliente, conteudo, 'banco.ofx').json['importados'] == 2
+    outro = novo_cliente()
+    assert importar(outro, conteudo, 'banco.ofx').json['importados'] == 2
+    assert len(do_mes(outro)) == 2
+
+
+def test_xlsx_pela_rota(cliente):
+    arquivo = planilha([["Data", "Histórico", "Valor"], [datetime(2026, 3, 15), "Internet", -99.9]])
+    resp = importar(cliente, arquivo.getvalue(), 'planilha.xlsx')
+    assert resp.status_code == 200 and resp.json['importados'] == 1
+    assert do_mes(cliente) == [("2026-03-15", "Internet", 99.9, "Saída", "Importados", True)]
+
+
+@pytest.mark.parametrize("nome, conteudo, campos, erro", [
+    (None, None, {}, "Nenhum arquivo enviado"),
+    ('extrato.pdf', b"%PDF", {}, "formato não suportado: .pdf (use CSV, XLSX ou OFX)"),
+    ('extrato.csv', b"data;historico\n01/03/2026;x\n", {}, "colunas obrigatórias ausentes: valor"),
+    ('extrato.csv', CSV.encode(), {'conta_id': '999999'}, "Conta não encontrada"),
+])
+def test_erros_respondem_400(cliente, nome, conteudo, campos, erro):
+    if nome is None:
+        resp = cliente.post('/api/lancamentos/import', data={}, content_type='multipart/form-data')
+    else:
+        resp = importar(cliente, conteudo, nome, **campos)
+    assert resp.status_code == 400
+    assert resp.json == {"erro": erro}
+    assert do_mes(cliente) == []
@@ -0,0 +1,63 @@
+"""Listagem de /api/lancamentos: paginação por cursor (data, id) e validação do cursor."""
+import base64
+
+import pytest
+
+
+def paginas(cliente, consulta):
+    """Percorre as páginas seguindo proximo_cursor; devolve as descrições de cada página."""
+    resultado, cursor = [], None
+    while True:
+        resp = cliente.get(f"/api/lancamentos?{consulta}" + (f"&cursor={cursor}" if cursor else ""))
+        assert resp.status_code == 200, resp.json
+        resultado.append([i['descricao'] for i in resp.json['itens']])
+        cursor = resp.json['proximo_cursor']
+        if not cursor: return resultado
+
+
+def test_paginas_com_datas_iguais_nao_repetem_nem_pulam(cliente, criar_subtipo, criar_lancamento):
+    sub = criar_subtipo(cliente, "Mercado")['id']
+    for n in range(5): criar_lancamento(cliente, f"dia 10 #{n}", sub, data='2026-02-10')
+    criar_lancamento(cliente, "dia 20", sub, data='2026-02-20')
+    criar_lancamento(cliente, "dia 01", sub, data='2026-02-01')
+
+    # O desempate por id segura a fronteira entre páginas no meio das datas iguais
+    assert paginas(cliente, "mes=2026-02&limite=2") == [
+        ["dia 20", "dia 10 #4"], ["dia 10 #3", "dia 10 #2"], ["dia 10 #1", "dia 10 #0"], ["dia 01"]]
+
+
+def test_cursor_combinado_com_filtros(cliente, criar_subtipo, criar_lancamento):
+    despesa = criar_subtipo(cliente, "Farmácia")['id']
+    receita = criar_subtipo(cliente, "Salário", tipo_id=1)['id']
+    for dia in (3, 6, 9, 12): criar_lancamento(cliente, f"despesa {dia}", despesa, data=f'2026-03-{dia:02d}')
+    for dia in (4, 8): criar_lancamento(cliente, f"receita {dia}", receita, data=f'2026-03-{dia:02d}', tipo_id=1)
+    criar_lancamento(cliente, "fora do período", despesa, data='2026-04-01')
+
+    assert paginas(cliente, "mes=2026-03&tipo_id=2&limite=3") == [["despesa 12", "despesa 9", "despesa 6"], ["despesa 3"]]
+    assert paginas(cliente, "inicio=2026-03-05&fim=2026-03-31&limite=2") == [["despesa 12", "despesa 9"], ["receita 8", "despesa 6"]]
+
+
+def cursor_de(texto):
+    return base64.urlsafe_b64encode(texto.encode()).decode()
+
+
+@pytest.mark.parametrize("cursor", [
+    "abc",                              # base64 com padding errado
+    cursor_de("sem separador"),
+    cursor_de("2026-02-30|1"),          # data inexistente
+    cursor_de("2026-02-10|um"),
+    cursor_de("2026-02-10|1|2"),
+    base64.urlsafe_b64encode(b"\xff\xfe|1").decode(),  # não é UTF-8
+])
+def test_cursor_adulterado_responde_400(cliente, cursor):
+    resp = cliente.get(f"/api/lancamentos?cursor={cursor}")
+    assert resp.status_code == 400
+    assert resp.json['erro'].startswith("Parâmetro inválido")
+
+
+@pytest.mark.parametrize("valor", ["10,5", "abc", "", "nan", "inf"])
+def test_valor_invalido_responde_a_mensagem_do_usuario(cliente, criar_subtipo, valor):
+    sub = criar_subtipo(cliente, "Padaria")['id']
+    resp = cliente.post('/api/lancamentos', data={'data': '2026-01-10', 'descricao': "Pão", 'tipo_id': 2, 'subtipo_id': sub, 'valor': valor})
+    assert resp.status_code == 400
+    assert resp.json['erro'] == f"could not convert string to float: {valor!r}"
@@ -0,0 +1,33 @@
+"""Métricas por requisição: o SQL do corpo das respostas em streaming entra na conta da rota."""
+from sqlalchemy import event
+
+import app as modulo_app
+
+ROTA = '/api/export/lancamentos'
+
+
+def consultas_da_rota():
+    """(requisições, comandos SQL) já registrados para ROTA."""
+    serie = modulo_app.registro.metricas['financeiro_requisicao_consultas_sql'].valores.get((ROTA,))
+    return (serie[-1], serie[-2]) if serie else (0, 0)
+
+
+def test_sql_do_streaming_conta_na_requisicao(app, cliente, criar_subtipo, criar_lancamento):
+    criar_lancamento(cliente, "Mercado", criar_subtipo(cliente, "Casa")['id'])
+    antes = consultas_da_rota()
+    comandos = []
+    contar = lambda *_: comandos.append(1)
+    with app.app_context(): engine = modulo_app.db.engine
+
+    with cliente.get(ROTA + '?formato=csv&mes=2026-01') as resp:
+        assert resp.status_code == 200
+        event.listen(engine, 'after_cursor_execute', contar)
+        try: assert "Mercado" in resp.get_data(as_text=True)
+        finally: event.remove(engine, 'after_cursor_execute', contar)
+        # Enquanto o corpo não foi fechado, a requisição ainda não terminou
+        assert consultas_da_rota() == antes
+
+    requisicoes, total = consultas_da_rota()
+    assert comandos, "o SELECT da exportação deveria rodar no gerador"
+    assert requisicoes == antes[0] + 1
+    assert total - antes[1] >= len(comandos)
@@ -0,0 +1,113 @@
+"""Migração de um banco do schema 0 (datas em texto, dinheiro em float) pelo `flask inicializar-banco`."""
+import os
+import sys
+import sqlite3
+import subprocess
+
+import pytest
+
+import app as modulo_app
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Tabelas como o app as criava antes das migrações (PRAGMA user_version = 0)
+SCHEMA_0 = """
+CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(100) NOT NULL UNIQUE, password_hash VARCHAR(200) NOT NULL,
+                   email VARCHAR(100), is_admin BOOLEAN, totp_secret VARCHAR(32));
+CREATE TABLE conta (id INTEGER PRIMARY KEY, nome VARCHAR(50) NOT NULL, tipo VARCHAR(20), saldo_inicial FLOAT);
+CREATE TABLE tipo (id INTEGER PRIMARY KEY, nome VARCHAR(50) NOT NULL);
+CREATE TABLE subtipo (id INTEGER PRIMARY KEY, nome VARCHAR(50) NOT NULL, tipo_id INTEGER NOT NULL REFERENCES tipo (id));
+CREATE TABLE categoria (id INTEGER PRIMARY KEY, nome VARCHAR(50) NOT NULL, subtipo_id INTEGER NOT NULL REFERENCES subtipo (id));
+CREATE TABLE lancamento (id INTEGER PRIMARY KEY, data VARCHAR(10) NOT NULL, descricao VARCHAR(100) NOT NULL,
+                         tipo_id INTEGER NOT NULL REFERENCES tipo (id), subtipo_id INTEGER NOT NULL REFERENCES subtipo (id),
+                         categoria_id INTEGER REFERENCES categoria (id), conta_id INTEGER REFERENCES conta (id),
+                         valor FLOAT NOT NULL, efetivado BOOLEAN, comprovante VARCHAR(200));
+CREATE TABLE vencimento (id INTEGER PRIMARY KEY, descricao VARCHAR(100) NOT NULL, tipo VARCHAR(50) NOT NULL, dia INTEGER,
+                         data_vencimento VARCHAR(10), ativo BOOLEAN);
+INSERT INTO user VALUES (1, 'antigo', 'x', NULL, 0, NULL), (2, 'segundo', 'x', NULL, 0, NULL);
+INSERT INTO conta VALUES (1, 'Banco', 'banco', 100.1), (2, 'Carteira', 'carteira', NULL);
+INSERT INTO tipo VALUES (1, 'Entrada'), (2, 'Saída');
+INSERT INTO subtipo VALUES (1, 'Casa', 2), (2, 'Salário', 1);
+INSERT INTO categoria VALUES (1, 'Mercado', 1);
+"""
+
+# id, data no schema 0, valor float -> data ISO, centavos
+LANCAMENTOS = [
+    (1, '2024-01-05', 0.1 + 0.2, '2024-01-05', 30),
+    (2, '05/01/2024', 1.15, '2024-01-05', 115),
+    (3, '2024-01-31 10:30:00', 4.35, '2024-01-31', 435),
+    (4, '2024-02-29', 19.99, '2024-02-29', 1999),
+    (5, '2024-02-10', 1234.5, '2024-02-10', 123450),
+]
+
+
+def criar_banco_0(caminho, lancamentos=LANCAMENTOS):
+    conn = sqlite3.connect(caminho)
+    conn.executescript(SCHEMA_0)
+    conn.executemany("INSERT INTO lancamento VALUES (?, ?, 'Compra', 2, 1, 1, 1, ?, 1, NULL)", [(i, d, v) for i, d, v, *_ in lancamentos])
+    conn.executemany("INSERT INTO vencimento VALUES (?, ?, ?, ?, ?, 1)",
+                     [(1, 'Aluguel', 'fixo', 10, ''), (2, 'IPVA', 'variavel', None, '10/02/2024'), (3, 'Seguro', 'variavel', None, '2024-03-15')])
+    conn.commit(); conn.close()
+
+
+@pytest.fixture
+def banco_0(app, tmp_path):
+    caminho = str(tmp_path / 'antigo.db')
+    criar_banco_0(caminho)
+    return caminho
+
+
+def inicializar_banco(caminho):
+    """Roda `flask --app app inicializar-banco` num processo à parte, sobre `caminho`."""
+    pasta = os.path.dirname(caminho)
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + caminho, METRICAS_DIR=os.path.join(pasta, 'metricas'), BACKUP_DIR=os.path.join(pasta, 'backups'))
+    return subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'inicializar-banco'], cwd=RAIZ, env=env, capture_output=True, text=True)
+
+
+def consultar(caminho, sql):
+    conn = sqlite3.connect(caminho)
+    try: return conn.execute(sql).fetchall()
+    finally: conn.close()
+
+
+def test_schema_0_chega_na_versao_atual(banco_0):
+    saida = inicializar_banco(banco_0)
+    assert saida.returncode == 0, saida.stderr
+
+    assert consultar(banco_0, 'PRAGMA user_version') == [(modulo_app.SCHEMA_VERSAO,)]
+    assert consultar(banco_0, 'SELECT id, data, valor_centavos, usuario_id FROM lancamento ORDER BY id') == \
+        [(i, data, cents, 1) for i, _, _, data, cents in LANCAMENTOS]
+    assert consultar(banco_0, 'SELECT id, saldo_inicial_centavos FROM conta ORDER BY id') == [(1, 10010), (2, 0)]
+    assert consultar(banco_0, 'SELECT id, data_vencimento FROM vencimento ORDER BY id') == [(1, None), (2, '2024-02-10'), (3, '2024-03-15')]
+    # O primeiro usuário fica com os dados e vira administrador
+    assert consultar(banco_0, 'SELECT id, is_admin FROM user ORDER BY id') == [(1, 1), (2, 0)]
+    # Derivados recarregados: resumo mensal e busca textual
+    assert consultar(banco_0, "SELECT ano, mes, SUM(total_centavos), SUM(quantidade) FROM resumo_mensal GROUP BY ano, mes ORDER BY ano, mes") == \
+        [(2024, 1, 30 + 115 + 435, 3), (2024, 2, 1999 + 123450, 2)]
+    assert consultar(banco_0, "SELECT COUNT(*) FROM lancamento_busca WHERE lancamento_busca MATCH 'mercado'") == [(5,)]
+    assert consultar(banco_0, 'PRAGMA foreign_key_check') == []
+
+
+def test_rodar_de_novo_nao_muda_nada(banco_0):
+    assert inicializar_banco(banco_0).returncode == 0
+    tabelas = ('lancamento', 'conta', 'vencimento', 'resumo_mensal', 'subtipo', 'categoria')
+    antes = {t: consultar(banco_0, f'SELECT * FROM {t} ORDER BY id') for t in tabelas}
+
+    saida = inicializar_banco(banco_0)
+    assert saida.returncode == 0, saida.stderr
+    assert {t: consultar(banco_0, f'SELECT * FROM {t} ORDER BY id') for t in tabelas} == antes
+    assert consultar(banco_0, 'PRAGMA user_version') == [(modulo_app.SCHEMA_VERSAO,)]
+
+
+@pytest.mark.parametrize("data", ['2024-02-30', '2023-02-29', '2024-1-5', '31/04/2024', 'ontem', ''])
+def test_data_invalida_interrompe_sem_tocar_no_banco(app, tmp_path, data):
+    caminho = str(tmp_path / 'antigo.db')
+    criar_banco_0(caminho, LANCAMENTOS + [(9, data, 1.0, None, None)])
+
+    saida = inicializar_banco(caminho)
+    assert saida.returncode != 0
+    assert "Datas inválidas em lancamento.data" in saida.stderr and f"id 9 ({data!r})" in saida.stderr
+    # A transação foi desfeita: o banco continua no schema 0, com as colunas antigas
+    assert consultar(caminho, 'PRAGMA user_version') == [(0,)]
+    assert 'valor' in {c[1] for c in consultar(caminho, 'PRAGMA table_info(lancamento)')}
+    assert consultar(caminho, 'SELECT COUNT(*) FROM lancamento') == [(len(LANCAMENTOS) + 1,)]
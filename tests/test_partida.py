@@ -0,0 +1,32 @@
+"""Import do app sem efeitos colaterais: pastas e threads só nas chamadas explícitas."""
+import os
+import sys
+import json
+import subprocess
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Importados só nas rotas e comandos que os usam
+SOB_DEMANDA = ['importacao', 'exportacao', 'backup', 'recorrencia', 'numpy', 'pyotp', 'qrcode', 'cProfile']
+
+FILHO = """
+import os, sys, json, threading
+import app
+pastas = [os.environ['BACKUP_DIR'], os.environ['METRICAS_DIR']]
+antes = {"pastas": [os.path.exists(p) for p in pastas], "threads": [t.name for t in threading.enumerate()],
+         "modulos": [m for m in %r if m in sys.modules]}
+app.preparar_pastas()
+print(json.dumps({**antes, "depois": [os.path.exists(p) for p in pastas]}))
+"""
+
+
+def test_import_nao_cria_pastas_nem_threads(tmp_path):
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + str(tmp_path / 'partida.db'),
+               BACKUP_DIR=str(tmp_path / 'backups'), METRICAS_DIR=str(tmp_path / 'metricas'))
+    saida = subprocess.run([sys.executable, '-c', FILHO % SOB_DEMANDA], cwd=RAIZ, env=env, capture_output=True, text=True, check=True)
+    resultado = json.loads(saida.stdout.strip().splitlines()[-1])
+    assert resultado["pastas"] == [False, False]
+    assert resultado["threads"] == ["MainThread"]
+    assert resultado["modulos"] == []
+    assert resultado["depois"] == [True, True]
+    assert not (tmp_path / 'partida.db').exists()
@@ -0,0 +1,18 @@
+"""Planejamento anual: validação do ?ano= na consulta e na exportação."""
+import pytest
+
+
+
+@pytest.mark.parametrize('url', ['/api/planejamento', '/api/export/planejamento?formato=csv'])
+@pytest.mark.parametrize('ano', ['abc', '', '2026.5', '99999999999999999999', '0'])
+def test_ano_invalido_responde_400(cliente, url, ano):
+    resp = cliente.get(f"{url}{'&' if '?' in url else '?'}ano={ano}")
+    assert resp.status_code == 400
+    assert 'erro' in resp.json
+
+
+def test_planejamento_do_ano(cliente, criar_subtipo, criar_lancamento):
+    criar_lancamento(cliente, "Aluguel", criar_subtipo(cliente, "Moradia")['id'], data='2026-03-10')
+    arvore = cliente.get('/api/planejamento?ano=2026').json
+    assert arvore['Saída']['Moradia']['Outros'][2] == 12.5
+    assert cliente.get('/api/planejamento?ano=2025').json == {}
@@ -0,0 +1,138 @@
+"""Recorrências: datas dos vencimentos fixos (recorrencia.py) e os lançamentos pendentes gerados."""
+from datetime import date
+
+import numpy as np
+import pytest
+from sqlalchemy import text
+
+import app as modulo_app
+from recorrencia import datas_fixas, ocorrencias_fixas, serie_meses
+
+
+def meses(*textos):
+    return np.array(textos, dtype='datetime64[M]')
+
+
+# --- DATAS ---
+def test_dia_31_cai_no_ultimo_dia_dos_meses_curtos():
+    datas = datas_fixas([31, 30, 29, 15], meses('2026-11', '2026-12', '2027-02', '2028-02', '2100-02', '2000-02'))
+    assert datas.astype(str).tolist() == [
+        ['2026-11-30', '2026-12-31', '2027-02-28', '2028-02-29', '2100-02-28', '2000-02-29'],
+        ['2026-11-30', '2026-12-30', '2027-02-28', '2028-02-29', '2100-02-28', '2000-02-29'],
+        ['2026-11-29', '2026-12-29', '2027-02-28', '2028-02-29', '2100-02-28', '2000-02-29'],
+        ['2026-11-15', '2026-12-15', '2027-02-15', '2028-02-15', '2100-02-15', '2000-02-15'],
+    ]
+
+
+def test_ocorrencias_pulam_o_passado_e_o_ja_gerado():
+    serie = serie_meses(date(2027, 1, 20), 3)
+    datas, mascara = ocorrencias_fixas([10, 31, 31], ['NaT', 'NaT', '2027-02'], date(2027, 1, 20), serie, date(2027, 1, 20))
+    assert datas[mascara].astype(str).tolist() == [
+        '2027-02-10', '2027-03-10',                 # 10/01 já passou
+        '2027-01-31', '2027-02-28', '2027-03-31',
+        '2027-03-31']                                # gerado até fevereiro
+
+
+# --- GERAÇÃO ---
+@pytest.fixture
+def recorrente(cliente, usuario, criar_subtipo):
+    """recorrente(descricao, dia) -> id do vencimento fixo, com valor e subtipo, ainda inativo."""
+    sub = criar_subtipo(cliente, "Moradia")['id']
+    def criar(descricao, dia=31):
+        assert cliente.post('/api/vencimentos', json={'descricao': descricao, 'tipo': 'fixo', 'dia': dia, 'valor': '1500', 'subtipo_id': sub}).status_code == 200
+        return next(v['id'] for v in cliente.get('/api/vencimentos').json if v['descricao'] == descricao)
+    return criar
+
+
+def gerados(app, usuario_id, vencimento_id):
+    """[(data, efetivado)] dos lançamentos ligados ao vencimento."""
+    with app.app_context():
+        return [(date.fromisoformat(d), bool(e)) for d, e in modulo_app.db.session.execute(text(
+            'SELECT data, efetivado FROM lancamento WHERE usuario_id = :uid AND vencimento_id = :v ORDER BY data'), {"uid": usuario_id, "v": vencimento_id})]
+
+
+def projetar(app, usuario_id, vencimento_id, hoje, meses=3):
+    with app.app_context(), modulo_app.como_usuario(usuario_id):
+        return modulo_app.projetar_vencimentos(hoje=hoje, meses=meses, ids=[vencimento_id])
+
+
+def resumo_confere(app, usuario_id):
+    """O resumo mensal incremental bate com os lançamentos do dono."""
+    with app.app_context():
+        resumo = modulo_app.db.session.execute(text('SELECT ano, mes, SUM(total_centavos), SUM(quantidade) FROM resumo_mensal '
+                                                    'WHERE usuario_id = :uid AND quantidade != 0 GROUP BY ano, mes ORDER BY ano, mes'), {"uid": usuario_id}).all()
+        lancamentos = modulo_app.db.session.execute(text("SELECT CAST(strftime('%Y', data) AS INTEGER), CAST(strftime('%m', data) AS INTEGER), "
+                                                         "SUM(valor_centavos), COUNT(*) FROM lancamento WHERE usuario_id = :uid GROUP BY 1, 2 ORDER BY 1, 2"), {"uid": usuario_id}).all()
+    return resumo == lancamentos
+
+
+def test_dia_31_gera_no_ultimo_dia_e_repetir_nao_duplica(app, usuario, recorrente, cliente):
+    vid = recorrente("Aluguel"); uid = usuario[0]
+    assert cliente.patch(f'/api/vencimentos/{vid}/toggle').status_code == 200
+
+    # Novembro tem 30 dias e fevereiro de 2028 tem 29
+    assert projetar(app, uid, vid, date(2027, 11, 5)) == 3
+    assert projetar(app, uid, vid, date(2028, 2, 1), meses=2) == 2
+    datas = [d for d, _ in gerados(app, uid, vid)]
+    assert [d for d in datas if d.year >= 2027 and d.month in (11, 12) or d.year == 2028] == [
+        date(2027, 11, 30), date(2027, 12, 31), date(2028, 1, 31), date(2028, 2, 29), date(2028, 3, 31)]
+
+    # De novo, e mesmo sem o gerado_ate: a chave única (vencimento_id, competencia) segura
+    assert projetar(app, uid, vid, date(2027, 11, 5)) == 0
+    with app.app_context():
+        modulo_app.db.session.get(modulo_app.Vencimento, vid).gerado_ate = None; modulo_app.db.session.commit()
+    assert projetar(app, uid, vid, date(2027, 11, 5), meses=5) == 0
+    assert [d for d, _ in gerados(app, uid, vid)] == datas
+    assert resumo_confere(app, uid)
+
+
+def test_rota_gerar_e_idempotente(app, usuario, recorrente, cliente):
+    vid = recorrente("Condomínio", dia=5)
+    assert cliente.patch(f'/api/vencimentos/{vid}/toggle').status_code == 200
+    antes = gerados(app, usuario[0], vid)
+    assert antes and all(d >= date.today() and not e for d, e in antes)
+
+    # O dia 5 do mês corrente pode já ter passado: conta-se pelo que foi gerado, não por 6
+    criados = cliente.post('/api/vencimentos/gerar?meses=6').json['criados']
+    depois = gerados(app, usuario[0], vid)
+    assert criados == len(depois) - len(antes) >= 3 and depois[:len(antes)] == antes
+    assert cliente.post('/api/vencimentos/gerar?meses=6').json == {"criados": 0}
+    assert gerados(app, usuario[0], vid) == depois
+    assert cliente.post('/api/vencimentos/gerar?meses=abc').status_code == 400
+    assert resumo_confere(app, usuario[0])
+
+
+def pagar_o_primeiro(app, cliente, usuario_id, vencimento_id):
+    with app.app_context():
+        primeiro = modulo_app.db.session.execute(text('SELECT MIN(id) FROM lancamento WHERE vencimento_id = :v'), {"v": vencimento_id}).scalar()
+    assert cliente.patch(f'/api/lancamentos/{primeiro}/status').status_code == 200
+    return gerados(app, usuario_id, vencimento_id)[0]
+
+
+def test_desativar_remove_so_os_pendentes(app, usuario, recorrente, cliente):
+    vid = recorrente("Internet", dia=20); uid = usuario[0]
+    cliente.patch(f'/api/vencimentos/{vid}/toggle')
+    pago = pagar_o_primeiro(app, cliente, uid, vid)
+    assert pago[1] and len(gerados(app, uid, vid)) == modulo_app.MESES_RECORRENCIA
+
+    cliente.patch(f'/api/vencimentos/{vid}/toggle')
+    assert gerados(app, uid, vid) == [pago]
+    assert resumo_confere(app, uid)
+
+    # Reativado, volta a gerar sem duplicar o mês já pago
+    cliente.patch(f'/api/vencimentos/{vid}/toggle')
+    assert len(gerados(app, uid, vid)) == modulo_app.MESES_RECORRENCIA and gerados(app, uid, vid)[0] == pago
+    assert resumo_confere(app, uid)
+
+
+def test_excluir_remove_os_pendentes_e_desliga_os_pagos(app, usuario, recorrente, cliente):
+    vid = recorrente("Escola", dia=10); uid = usuario[0]
+    cliente.patch(f'/api/vencimentos/{vid}/toggle')
+    pago = pagar_o_primeiro(app, cliente, uid, vid)
+
+    assert cliente.delete(f'/api/vencimentos/{vid}').status_code == 200
+    assert gerados(app, uid, vid) == []
+    with app.app_context():
+        restantes = modulo_app.db.session.execute(text("SELECT data, efetivado, vencimento_id FROM lancamento WHERE usuario_id = :uid AND descricao = 'Escola'"), {"uid": uid}).all()
+    assert [(date.fromisoformat(d), bool(e), v) for d, e, v in restantes] == [(pago[0], True, None)]
+    assert resumo_confere(app, uid)
@@ -0,0 +1,113 @@
+"""Saldos por conta: pontos de controle mensais (SaldoMensal), a invalidação em diante a cada
+alteração retroativa e os saldos de /api/contas/saldos recalculados a partir deles."""
+import pytest
+from sqlalchemy import text
+
+import app as modulo_app
+
+ATE = '2026-04-15'
+
+
+@pytest.fixture
+def conta(cliente):
+    """conta(nome) -> id de uma conta nova do usuário logado."""
+    def criar(nome):
+        assert cliente.post('/api/config/contas', json={'nome': nome, 'tipo': 'banco'}).status_code == 200
+        return next(c['id'] for c in cliente.get('/api/config/contas').json if c['nome'] == nome)
+    return criar
+
+
+@pytest.fixture
+def lancar(cliente, criar_subtipo, criar_lancamento):
+    """lancar(conta_id, data, valor, tipo_id=2, efetivar=True) -> id do lançamento."""
+    subs = {1: criar_subtipo(cliente, "Renda", tipo_id=1)['id'], 2: criar_subtipo(cliente, "Gastos")['id']}
+    contador = iter(range(1000))
+    def criar(conta_id, data, valor, tipo_id=2, efetivar=True):
+        descricao = f"mov {next(contador)}"
+        criar_lancamento(cliente, descricao, subs[tipo_id], data=data, valor=valor, tipo_id=tipo_id, conta_id=conta_id)
+        id_ = next(i['id'] for i in cliente.get(f'/api/lancamentos?mes={data[:7]}').json['itens'] if i['descricao'] == descricao)
+        if efetivar: assert cliente.patch(f'/api/lancamentos/{id_}/status').status_code == 200
+        return id_
+    return criar
+
+
+def saldos(cliente, conta_id, meses=4):
+    """(saldo atual, [saldo no fim de cada mês]) da conta em ATE."""
+    resp = cliente.get(f'/api/contas/saldos?ate={ATE}&meses={meses}')
+    assert resp.status_code == 200, resp.json
+    c = next(c for c in resp.json['contas'] if c['id'] == conta_id)
+    return c['saldo'], [(h['mes'], h['saldo']) for h in c['historico']]
+
+
+def pontos(app, conta_id):
+    with app.app_context():
+        return modulo_app.db.session.execute(text('SELECT ano, mes, acumulado_centavos FROM saldo_mensal WHERE conta_id = :c ORDER BY ano, mes'), {"c": conta_id}).all()
+
+
+def versao(app, usuario_id):
+    with app.app_context():
+        return modulo_app.ler_versao(modulo_app.chave_usuario('saldos', usuario_id))
+
+
+@pytest.fixture
+def com_movimento(cliente, conta, lancar):
+    """Conta com +1000 em jan, -200 em fev, -50 em mar e -30 em abril (até o dia 15), já consultada."""
+    cid = conta("Banco")
+    ids = {"jan": lancar(cid, '2026-01-05', '1000', tipo_id=1), "fev": lancar(cid, '2026-02-10', '200'),
+           "mar": lancar(cid, '2026-03-20', '50'), "abr": lancar(cid, '2026-04-02', '30')}
+    assert saldos(cliente, cid) == (720.0, [('2026-01', 1000.0), ('2026-02', 800.0), ('2026-03', 750.0), ('2026-04', 720.0)])
+    return cid, ids
+
+
+def test_consulta_grava_pontos_ate_o_mes_passado(app, com_movimento):
+    cid, _ = com_movimento
+    # O mês corrente (abril) é somado direto dos lançamentos; dezembro é o ponto antes da janela
+    assert pontos(app, cid) == [(2025, 12, 0), (2026, 1, 100000), (2026, 2, 80000), (2026, 3, 75000)]
+
+
+def test_lancamento_retroativo_invalida_do_mes_em_diante(app, usuario, cliente, conta, lancar, com_movimento):
+    cid, _ = com_movimento
+    intocada = conta("Outra"); lancar(intocada, '2026-01-15', '10'); saldos(cliente, intocada)
+    antes, v = pontos(app, intocada), versao(app, usuario[0])
+
+    # Pendente não entra no saldo: nada muda
+    id_ = lancar(cid, '2026-02-25', '100', efetivar=False)
+    assert pontos(app, cid)[-1] == (2026, 3, 75000) and versao(app, usuario[0]) == v
+
+    assert cliente.patch(f'/api/lancamentos/{id_}/status').status_code == 200
+    assert pontos(app, cid) == [(2025, 12, 0), (2026, 1, 100000)]
+    assert versao(app, usuario[0]) != v
+    # Só a conta alterada perde os pontos
+    assert pontos(app, intocada) == antes
+
+    assert saldos(cliente, cid) == (620.0, [('2026-01', 1000.0), ('2026-02', 700.0), ('2026-03', 650.0), ('2026-04', 620.0)])
+    assert pontos(app, cid)[-2:] == [(2026, 2, 70000), (2026, 3, 65000)]
+
+
+def test_editar_e_excluir_no_passado_recalcula_os_saldos(app, cliente, com_movimento):
+    cid, ids = com_movimento
+
+    # Voltar a entrada de janeiro para pendente invalida desde janeiro (meses sem movimento não viram ponto)
+    assert cliente.patch(f'/api/lancamentos/{ids["jan"]}/status').status_code == 200
+    assert pontos(app, cid) == [(2025, 12, 0)]
+    assert saldos(cliente, cid) == (-280.0, [('2026-01', 0.0), ('2026-02', -200.0), ('2026-03', -250.0), ('2026-04', -280.0)])
+
+    assert cliente.delete(f'/api/lancamentos/{ids["fev"]}').status_code == 200
+    assert pontos(app, cid) == [(2025, 12, 0)]
+    assert saldos(cliente, cid) == (-80.0, [('2026-01', 0.0), ('2026-02', 0.0), ('2026-03', -50.0), ('2026-04', -80.0)])
+
+    # Alterar o mês corrente não apaga os pontos dos meses anteriores
+    assert cliente.delete(f'/api/lancamentos/{ids["abr"]}').status_code == 200
+    assert pontos(app, cid) == [(2025, 12, 0), (2026, 3, -5000)]
+    assert saldos(cliente, cid)[0] == -50.0
+
+
+def test_ponto_calculado_antes_de_uma_escrita_e_descartado(app, usuario, com_movimento):
+    cid, _ = com_movimento
+    with app.app_context(), modulo_app.como_usuario(usuario[0]):
+        chave = modulo_app.chave_usuario('saldos'); lida = modulo_app.ler_versao(chave)
+        # Uma escrita concorrente troca a versão entre o cálculo e a gravação
+        modulo_app.trocar_versao(chave); modulo_app.db.session.commit()
+        modulo_app.gravar_pontos_saldo([{"conta_id": cid, "ano": 2026, "mes": 5, "acumulado_centavos": 1}], chave, lida)
+        modulo_app.gravar_pontos_saldo([{"conta_id": cid, "ano": 2026, "mes": 6, "acumulado_centavos": 2}], chave, modulo_app.ler_versao(chave))
+    assert pontos(app, cid)[-2:] == [(2026, 3, 75000), (2026, 6, 2)]
@@ -0,0 +1,15 @@
+"""Pool de conexões do app e threads do gunicorn."""
+import os
+import runpy
+
+import app as modulo_app
+from servidor import FOLGA_CONEXOES
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def test_pool_tem_uma_conexao_por_thread_do_gunicorn_e_folga(app):
+    threads = runpy.run_path(os.path.join(RAIZ, 'gunicorn.conf.py'))['threads']
+    with app.app_context(): pool = modulo_app.db.engine.pool
+    assert pool.size() == threads
+    assert pool._max_overflow == FOLGA_CONEXOES
@@ -0,0 +1,26 @@
+"""Respostas em streaming (listagem, busca, exportação) com os nomes das dimensões do dono."""
+
+
+def test_listagem_ve_subtipo_criado_depois_do_primeiro_streaming(cliente, criar_subtipo, criar_lancamento):
+    # O primeiro streaming (com uma linha a nomear) preenche o cache; o subtipo novo invalida a versão do dono
+    criar_lancamento(cliente, "Mercado", criar_subtipo(cliente, "Casa")['id'], data='2026-01-05')
+    cliente.get('/api/lancamentos?mes=2026-01').get_data()
+    sub = criar_subtipo(cliente, "Importados")
+    criar_lancamento(cliente, "Compra importada", sub['id'])
+
+    itens = cliente.get('/api/lancamentos?mes=2026-01').json['itens']
+    assert [(i['descricao'], i['subtipo']) for i in itens] == [("Compra importada", "Importados"), ("Mercado", "Casa")]
+    busca = cliente.get('/api/lancamentos/search?q=importada').json['itens']
+    assert [i['subtipo'] for i in busca] == ["Importados"]
+    csv = cliente.get('/api/export/lancamentos?formato=csv&mes=2026-01').get_data(as_text=True)
+    assert "Importados" in csv
+
+
+def test_streaming_nao_mistura_dimensoes_de_outro_dono(cliente, novo_cliente, criar_subtipo, criar_lancamento):
+    outro = novo_cliente()
+    criar_lancamento(outro, "Do vizinho", criar_subtipo(outro, "Só do vizinho")['id'])
+    outro.get('/api/lancamentos?mes=2026-01').get_data()
+
+    sub = criar_subtipo(cliente, "Meu subtipo")
+    criar_lancamento(cliente, "Minha compra", sub['id'])
+    assert [i['subtipo'] for i in cliente.get('/api/lancamentos?mes=2026-01').json['itens']] == ["Meu subtipo"]
@@ -0,0 +1,138 @@
+"""Bot do Telegram (worker.py): índice de vencimentos, agendador e o bot contra a API fake."""
+import os
+import sys
+import json
+import time
+import threading
+import urllib.request
+from datetime import date, datetime, timedelta
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import app as modulo_app
+import worker
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import fake_telegram  # noqa: E402
+
+HOJE = date(2026, 3, 10)
+
+
+def criar_vencimento(cliente, descricao, **dados):
+    """Cadastra e ativa o vencimento, como na tela de vencimentos."""
+    assert cliente.post('/api/vencimentos', json={'descricao': descricao, **dados}).status_code == 200
+    v = next(v for v in cliente.get('/api/vencimentos').json if v['descricao'] == descricao)
+    assert cliente.patch(f"/api/vencimentos/{v['id']}/toggle").status_code == 200
+
+
+@pytest.fixture
+def dono(criar_usuario, entrar):
+    uid, username = criar_usuario()
+    return uid, entrar(username)
+
+
+def test_indice_separa_fixos_e_variaveis_do_dono(dono, novo_cliente):
+    uid, cliente = dono
+    criar_vencimento(cliente, "Aluguel", tipo='fixo', dia=10)
+    criar_vencimento(cliente, "Condomínio", tipo='fixo', dia=20)
+    criar_vencimento(cliente, "IPVA", tipo='variavel', data_vencimento='2026-03-10')
+    criar_vencimento(cliente, "Seguro", tipo='variavel', data_vencimento='2026-05-02')
+    criar_vencimento(novo_cliente(), "De outro dono", tipo='fixo', dia=10)
+
+    assert worker.indice.hoje(uid, HOJE) == (["Aluguel"], ["IPVA"])
+    assert worker.indice.mes(uid, HOJE) == ([(10, "Aluguel"), (20, "Condomínio")], [(date(2026, 3, 10), "IPVA")])
+    assert worker.indice.futuro(uid, HOJE)[1] == [(date(2026, 5, 2), "Seguro")]
+    assert worker.texto_hoje(uid, HOJE) == "<b>⚠️ CONTAS PARA HOJE</b>\n\n<b>Fixas:</b>\n- Aluguel\n\n<b>Variáveis:</b>\n- IPVA"
+
+
+def test_indice_reconstroi_quando_a_api_grava_um_vencimento(dono):
+    uid, cliente = dono
+    assert worker.texto_hoje(uid, HOJE) == "✅ Nada encontrado."
+    versao = worker.indice.versao
+
+    criar_vencimento(cliente, "Internet", tipo='fixo', dia=10)
+    assert worker.indice.hoje(uid, HOJE) == (["Internet"], [])
+    assert worker.indice.versao != versao
+
+
+def test_agendador_proxima_execucao():
+    agora = datetime(2026, 3, 10, 8, 30)
+    assert worker.Agendador._proxima(9, 0, agora) == datetime(2026, 3, 10, 9, 0)
+    # Horário já passou hoje (ou é agora): fica para amanhã
+    assert worker.Agendador._proxima(8, 30, agora) == datetime(2026, 3, 11, 8, 30)
+    assert worker.Agendador._proxima(3, 0, agora) == datetime(2026, 3, 11, 3, 0)
+
+
+def test_agendador_segue_depois_de_uma_tarefa_com_erro(app):
+    executadas = threading.Event()
+    def falhar(): raise RuntimeError("tarefa com erro")
+    def tarefa(): executadas.set()
+
+    agendador = worker.Agendador()
+    agendador.diario("03:00", falhar); agendador.diario("04:00", tarefa)
+    for t in agendador.tarefas: t[0] = datetime.now() - timedelta(seconds=1)  # Vencidas: rodam já
+    agendador.start()
+    try:
+        assert executadas.wait(5)
+    finally:
+        agendador.parar.set(); agendador.join(5)
+    # Reagendadas para o próximo dia
+    assert all(t[0] > datetime.now() for t in agendador.tarefas)
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    """Bot do worker ligado a um fake_telegram numa porta livre."""
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), fake_telegram.Handler)
+    threading.Thread(target=servidor.serve_forever, args=(0.05,), daemon=True).start()
+    monkeypatch.setitem(fake_telegram.estado, "enviadas", [])
+    monkeypatch.setenv("TELEGRAM_API_URL", f"http://127.0.0.1:{servidor.server_port}")
+    import telebot
+    monkeypatch.setattr(telebot.apihelper, "API_URL", telebot.apihelper.API_URL)
+    bot = worker.criar_bot("1:teste")
+    bot.url_fake = os.environ["TELEGRAM_API_URL"]
+    try:
+        yield bot
+    finally:
+        servidor.shutdown(); servidor.server_close()
+
+
+def conversar(bot, chat_id, texto, respostas=1):
+    """Manda `texto` do chat pela API fake, entrega o update ao bot (como o polling faria) e
+    devolve as mensagens que o bot enviou a esse chat."""
+    pedido = urllib.request.Request(bot.url_fake + "/_enviar", data=json.dumps({"chat_id": chat_id, "text": texto}).encode(),
+                                    headers={"Content-Type": "application/json"})
+    urllib.request.urlopen(pedido, timeout=5).close()
+    bot.process_new_updates(bot.get_updates(offset=fake_telegram.estado["update_id"], timeout=1))
+    limite = time.monotonic() + 5
+    while time.monotonic() < limite:
+        enviadas = [m["text"] for m in fake_telegram.estado["enviadas"] if m["chat_id"] == chat_id]
+        if len(enviadas) >= respostas: return enviadas
+        time.sleep(0.01)
+    raise AssertionError(f"o bot não respondeu a {texto!r}")
+
+
+def test_bot_responde_o_menu_pelos_dados_do_chat(app, dono, bot):
+    uid, cliente = dono
+    criar_vencimento(cliente, "Luz", tipo='variavel', data_vencimento=date.today().isoformat())
+    with app.app_context():
+        modulo_app.db.session.get(modulo_app.User, uid).telegram_chat_id = "7001"; modulo_app.db.session.commit()
+
+    assert conversar(bot, 7001, "/start") == ["Menu:"]
+    assert conversar(bot, 7001, worker.BOTAO_HOJE, respostas=2)[-1] == "<b>⚠️ CONTAS PARA HOJE</b>\n\n<b>Variáveis:</b>\n- Luz"
+    assert "não está vinculado" in conversar(bot, 7002, worker.BOTAO_HOJE)[0]
+
+
+def test_resumo_diario_so_para_quem_tem_vencimento_hoje(app, dono, bot, criar_usuario):
+    uid, cliente = dono
+    criar_vencimento(cliente, "Escola", tipo='fixo', dia=date.today().day)
+    sem_nada = criar_usuario()[0]
+    with app.app_context():
+        for id_, chat in ((uid, "7101"), (sem_nada, "7102")): modulo_app.db.session.get(modulo_app.User, id_).telegram_chat_id = chat
+        modulo_app.db.session.commit()
+
+    worker.enviar_resumo_diario(bot)
+    enviadas = {m["chat_id"]: m["text"] for m in fake_telegram.estado["enviadas"]}
+    assert enviadas[7101].endswith("- Escola")
+    assert 7102 not in enviadas
@@ -0,0 +1,279 @@
+"""Worker do bot do Telegram, separado do processo web: python worker.py
+
+Responde aos botões do menu a partir de um índice de vencimentos em memória
+(reconstruído quando a API grava um vencimento) e envia um resumo diário
+dos vencimentos. Cada chat responde pelos dados do usuário a que está vinculado
+(User.telegram_chat_id, pela tela de configurações ou `flask --app app
+vincular-telegram`); os chats de TELEGRAM_CHAT_IDS, de antes do multiusuário,
+ficam com o primeiro usuário cadastrado. Também faz
+o snapshot diário do banco (BACKUP_HORA) e gera os lançamentos dos vencimentos
+recorrentes (RECORRENCIA_HORA), mesmo sem TELEGRAM_TOKEN.
+
+O tempo e os comandos SQL de cada handler e tarefa entram nas métricas do /metrics
+(o instantâneo deste processo vai para a mesma pasta do web; ver metricas.py).
+
+Para testar sem o Telegram de verdade, aponte TELEGRAM_API_URL para um
+servidor local (ver scripts/fake_telegram.py).
+"""
+import os
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from app import app, db, User, Vencimento, ler_versao, intervalo_do_mes, fazer_snapshot, projetar_vencimentos, registro, garantir_banco
+from metricas import Medicao
+
+log = logging.getLogger("worker")
+
+TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+
+# Chats antigos (separados por vírgula): respondem pelo primeiro usuário cadastrado
+CHAT_IDS = [c.strip() for c in os.getenv("TELEGRAM_CHAT_IDS", "").split(",") if c.strip()]
+HORA_RESUMO = os.getenv("BOT_HORA_RESUMO", "08:00")
+# Snapshot diário do banco; vazio desativa
+HORA_BACKUP = os.getenv("BACKUP_HORA", "03:00")
+# Geração diária dos lançamentos dos vencimentos recorrentes; vazio desativa
+HORA_RECORRENCIA = os.getenv("RECORRENCIA_HORA", "00:10")
+
+BOTAO_HOJE = '🔥 Vencendo Hoje'
+BOTAO_MES = '📅 Vencem este Mês'
+BOTAO_FUTURO = '🔮 Próximas Contas'
+
+
+# --- ÍNDICE DE VENCIMENTOS ---
+class VencimentosDono:
+    """Vencimentos ativos de um dono, por dia do mês (fixo) e por data (variável)."""
+
+    def __init__(self):
+        self.fixos = {}      # dia -> [descrições]
+        self.datas = []      # datas ordenadas dos variáveis
+        self.variaveis = {}  # data -> [descrições]
+
+    def variaveis_entre(self, inicio, fim=None):
+        i = bisect.bisect_left(self.datas, inicio)
+        j = bisect.bisect_left(self.datas, fim) if fim else len(self.datas)
+        return [(d, desc) for d in self.datas[i:j] for desc in self.variaveis[d]]
+
+
+class IndiceVencimentos:
+    """Vencimentos ativos de todos os usuários, separados por dono.
+
+    A versão gravada pela API em Metadado('vencimentos') é conferida a cada consulta
+    (uma leitura por chave primária); o índice só é reconstruído quando ela muda, com
+    uma única consulta para todos os donos. Cada consulta do bot lê só a parte do dono.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.versao = None
+        self.carregado = False
+        self.donos = {}  # usuario_id -> VencimentosDono
+
+    def atualizar(self):
+        with app.app_context():
+            versao = ler_versao("vencimentos")
+            with self._lock:
+                if self.carregado and versao == self.versao: return
+                donos = {}
+                for v in Vencimento.query.filter_by(ativo=True):
+                    d = donos.setdefault(v.usuario_id, VencimentosDono())
+                    if v.tipo == 'fixo' and v.dia: d.fixos.setdefault(v.dia, []).append(v.descricao)
+                    elif v.tipo == 'variavel' and v.data_vencimento: d.variaveis.setdefault(v.data_vencimento, []).append(v.descricao)
+                for d in donos.values(): d.datas = sorted(d.variaveis)
+                self.donos = donos
+                self.versao, self.carregado = versao, True
+                log.info("Índice de vencimentos reconstruído: %d usuários", len(donos))
+
+    def _dono(self, usuario_id):
+        self.atualizar()
+        return self.donos.get(usuario_id) or VencimentosDono()
+
+    def hoje(self, usuario_id, hoje):
+        d = self._dono(usuario_id)
+        return d.fixos.get(hoje.day, []), [desc for _, desc in d.variaveis_entre(hoje, hoje + timedelta(days=1))]
+
+    def mes(self, usuario_id, hoje):
+        d = self._dono(usuario_id)
+        _, prox_mes = intervalo_do_mes(hoje.strftime('%Y-%m'))
+        fixas = [(dia, desc) for dia in sorted(d.fixos) if dia >= hoje.day for desc in d.fixos[dia]]
+        return fixas, d.variaveis_entre(hoje, prox_mes)
+
+    def futuro(self, usuario_id, hoje):
+        d = self._dono(usuario_id)
+        _, data_corte = intervalo_do_mes(hoje.strftime('%Y-%m'))
+        fixas = [(dia, desc) for dia in sorted(d.fixos) for desc in d.fixos[dia]]
+        return fixas, d.variaveis_entre(data_corte)
+
+
+indice = IndiceVencimentos()
+
+
+# --- CHATS E USUÁRIOS ---
+def dono_do_chat(chat_id):
+    """Dono dos dados que o chat consulta, ou None se o chat não estiver vinculado."""
+    with app.app_context():
+        user = User.query.filter_by(telegram_chat_id=str(chat_id)).first()
+        if not user and str(chat_id) in CHAT_IDS: user = User.query.order_by(User.id).first()
+        return user.dono_id if user else None
+
+
+def destinatarios():
+    """[(chat_id, dono)] que recebem o resumo diário."""
+    with app.app_context():
+        chats = {u.telegram_chat_id: u.dono_id for u in User.query.filter(User.telegram_chat_id.isnot(None))}
+        primeiro = db.session.query(User.id).order_by(User.id).limit(1).scalar()
+    if primeiro is not None:
+        for chat_id in CHAT_IDS: chats.setdefault(chat_id, primeiro)
+    return list(chats.items())
+
+
+# --- MENSAGENS ---
+def montar_resp(titulo, f, v):
+    if not f and not v: return "✅ Nada encontrado."
+    resp = [f"<b>{titulo}</b>"]
+    if f: resp.append("\n<b>Fixas:</b>"); resp.extend(f)
+    if v: resp.append("\n<b>Variáveis:</b>"); resp.extend(v)
+    return "\n".join(resp)
+
+def texto_hoje(usuario_id, hoje):
+    fixas, variaveis = indice.hoje(usuario_id, hoje)
+    return montar_resp("⚠️ CONTAS PARA HOJE", [f"- {d}" for d in fixas], [f"- {d}" for d in variaveis])
+
+def texto_mes(usuario_id, hoje):
+    fixas, variaveis = indice.mes(usuario_id, hoje)
+    return montar_resp("📅 VENCEM ESTE MÊS", [f"- {d} (Dia {dia})" for dia, d in fixas], [f"- {d} (Dia {dt.day})" for dt, d in variaveis])
+
+def texto_futuro(usuario_id, hoje):
+    fixas, variaveis = indice.futuro(usuario_id, hoje)
+    return montar_resp("🔮 PRÓXIMAS CONTAS", [f"- {d} (Dia {dia})" for dia, d in fixas], [f"- {d} ({dt.strftime('%d/%m/%Y')})" for dt, d in variaveis])
+
+
+# --- MÉTRICAS ---
+@contextmanager
+def medir(handler):
+    """Tempo total (inclusive o envio ao Telegram) e comandos SQL de um handler ou tarefa."""
+    medicao = Medicao()
+    try:
+        yield
+    finally:
+        registro.observar("financeiro_bot_segundos", medicao.encerrar(), handler=handler)
+        registro.observar("financeiro_bot_consultas_sql", medicao.consultas, handler=handler)
+
+
+def criar_bot(token):
+    # Importado só com TELEGRAM_TOKEN: sem ele o worker faz só as tarefas agendadas
+    import telebot
+    from telebot import types
+    if os.getenv("TELEGRAM_API_URL"):
+        telebot.apihelper.API_URL = os.getenv("TELEGRAM_API_URL").rstrip("/") + "/bot{0}/{1}"
+    bot = telebot.TeleBot(token, parse_mode="HTML")
+
+    def responder(gerar_texto):
+        def handler(message):
+            try:
+                with medir(gerar_texto.__name__):
+                    dono = dono_do_chat(message.chat.id)
+                    if dono is None:
+                        bot.reply_to(message, f"Este chat não está vinculado a nenhum usuário. Informe o código <code>{message.chat.id}</code> nas configurações do sistema.")
+                    else:
+                        bot.reply_to(message, gerar_texto(dono, date.today()))
+            except Exception: log.exception("Erro ao responder %r", message.text)
+        return handler
+
+    @bot.message_handler(commands=['start'])
+    def send_welcome(message):
+        with medir("start"):
+            markup = types.ReplyKeyboardMarkup(row_width=1, resize_keyboard=True)
+            markup.add(types.KeyboardButton(BOTAO_HOJE), types.KeyboardButton(BOTAO_MES), types.KeyboardButton(BOTAO_FUTURO))
+            bot.reply_to(message, "Menu:", reply_markup=markup)
+
+    bot.register_message_handler(responder(texto_hoje), func=lambda m: m.text == BOTAO_HOJE)
+    bot.register_message_handler(responder(texto_mes), func=lambda m: m.text == BOTAO_MES)
+    bot.register_message_handler(responder(texto_futuro), func=lambda m: m.text == BOTAO_FUTURO)
+    return bot
+
+
+# --- AGENDADOR ---
+class Agendador(threading.Thread):
+    """Executa tarefas diárias (hora fixa) numa thread; erros são registrados e a thread segue."""
+
+    def __init__(self):
+        super().__init__(daemon=True, name="agendador")
+        self.tarefas = []  # [proxima_execucao, hora, minuto, funcao]
+        self.parar = threading.Event()
+
+    def diario(self, hora_minuto, funcao):
+        hora, minuto = (int(p) for p in hora_minuto.split(':'))
+        self.tarefas.append([self._proxima(hora, minuto), hora, minuto, funcao])
+
+    @staticmethod
+    def _proxima(hora, minuto, agora=None):
+        agora = agora or datetime.now()
+        alvo = agora.replace(hour=hora, minute=minuto, second=0, microsecond=0)
+        return alvo if alvo > agora else alvo + timedelta(days=1)
+
+    def run(self):
+        while self.tarefas and not self.parar.is_set():
+            tarefa = min(self.tarefas, key=lambda t: t[0])
+            if self.parar.wait(max(0, (tarefa[0] - datetime.now()).total_seconds())): break
+            try:
+                with medir(tarefa[3].__name__): tarefa[3]()
+            except Exception: log.exception("Erro na tarefa agendada %s", tarefa[3].__name__)
+            tarefa[0] = self._proxima(tarefa[1], tarefa[2])
+
+
+def enviar_resumo_diario(bot):
+    """Avisa cada chat vinculado sobre o que vence hoje para o dono dele (nada é enviado se não houver)."""
+    hoje = date.today()
+    for chat_id, dono in destinatarios():
+        fixas, variaveis = indice.hoje(dono, hoje)
+        if not fixas and not variaveis: continue
+        try: bot.send_message(chat_id, texto_hoje(dono, hoje))
+        except Exception: log.exception("Erro ao enviar resumo para %s", chat_id)
+
+
+def snapshot_diario():
+    nome = fazer_snapshot()
+    log.info("Snapshot do banco: %s", nome or "sem alterações desde o último")
+
+
+def recorrencias_diarias():
+    with app.app_context():
+        log.info("Recorrências: %d lançamentos gerados", projetar_vencimentos())
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    # Instantâneo próprio na pasta de métricas, recomeçando do zero a cada partida
+    registro.papel = "bot"; registro.limpar()
+    if not TELEGRAM_TOKEN and not HORA_BACKUP and not HORA_RECORRENCIA:
+        raise SystemExit("Defina TELEGRAM_TOKEN (bot), BACKUP_HORA (snapshots) ou RECORRENCIA_HORA no .env.")
+    # O bot pode subir antes do web num banco novo
+    garantir_banco()
+
+    agendador = Agendador()
+    if HORA_BACKUP:
+        agendador.diario(HORA_BACKUP, snapshot_diario)
+    if HORA_RECORRENCIA:
+        agendador.diario(HORA_RECORRENCIA, recorrencias_diarias)
+    if not TELEGRAM_TOKEN:
+        log.warning("TELEGRAM_TOKEN não definido: só as tarefas agendadas serão executadas")
+        agendador.start(); agendador.join()
+        return
+
+    bot = criar_bot(TELEGRAM_TOKEN)
+    indice.atualizar()
+    # Os chats podem ser vinculados com o worker rodando: o resumo é sempre agendado
+    def resumo_diario(): enviar_resumo_diario(bot)
+    agendador.diario(HORA_RESUMO, resumo_diario)
+    agendador.start()
+
+    log.info("Bot iniciado")
+    # infinity_polling já refaz a conexão em caso de erro de rede
+    bot.infinity_polling(logger_level=logging.INFO)
+
+
+if __name__ == "__main__":
+    main()
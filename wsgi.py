@@ -0,0 +1,2 @@
+"""Ponto de entrada WSGI para produção: gunicorn -c gunicorn.conf.py wsgi:app"""
+from app import app